@@ -58,8 +58,18 @@ def create_app():
         from app.models.video import Video  # 视频信息表
         from app.models.collect_source import CollectSource  # 采集源表
         from app.models.system_log import SystemLog  # 系统日志表
+        from app.models.collect_task import CollectTask  # 采集任务断点表
         
         # 根据模型定义创建所有表（如果表不存在）
         db.create_all()
+        
+        # create_all不会为已存在的表补建字段和索引，这里补齐字段已存在的索引（如采集去重键vod_name）；
+        # 旧数据库缺少的字段需要执行 python3 db_manager.py upgrade 添加
+        from app.models.schema import create_indexes, missing_columns
+        create_indexes(db.engine)
+        missing = missing_columns(db.engine)
+        if missing:
+            print(f"[警告] 数据库缺少 {len(missing)} 个新字段（如 {missing[0][0]}.{missing[0][1]}），"
+                  f"请执行 python3 db_manager.py upgrade")
     
     return app
@@ -6,7 +6,10 @@ from app.models.system_log import SystemLog
 from app import db
 from app.collectors.maccms_collector import MacCMSCollector
 from app.collectors.maccms_manager import maccms_manager
-from app.downloaders import download_manager
+from app.collectors.rate_limiter import rate_limiter
+from app.collectors.mirrors import mirror_registry
+from app.collectors.circuit_breaker import breakers
+from app.downloaders import download_manager, poster_store
 from functools import wraps
 import requests
 import json
@@ -220,16 +223,13 @@ def delete_video(id):
 def clear_all_videos():
     """清空所有视频"""
     try:
-        # 获取所有视频并删除本地图片
-        videos = Video.query.all()
-        deleted_images = 0
-        for video in videos:
-            if video.delete_local_image():
-                deleted_images += 1
+        # 记录所有本地图片，删除视频后清理
+        local_pics = [pic for (pic,) in Video.query.filter_by(is_localized=True).with_entities(Video.local_pic) if pic]
         
         count = Video.query.count()
         Video.query.delete()
         db.session.commit()
+        deleted_images = poster_store().remove_local_pics(local_pics)
         
         # 记录日志
         SystemLog.log(
@@ -257,16 +257,14 @@ def clear_category_videos():
         return redirect(url_for('admin.dashboard'))
     
     try:
-        # 获取该分类的所有视频并删除本地图片
+        # 记录该分类的本地图片，删除视频后清理（其他视频仍在使用的图片保留）
         videos = Video.query.filter_by(type_name=category).all()
-        deleted_images = 0
-        for video in videos:
-            if video.delete_local_image():
-                deleted_images += 1
+        local_pics = [video.local_pic for video in videos if video.is_localized and video.local_pic]
         
         count = len(videos)
         Video.query.filter_by(type_name=category).delete()
         db.session.commit()
+        deleted_images = poster_store().remove_local_pics(local_pics)
         
         # 记录日志
         SystemLog.log(
@@ -290,13 +288,41 @@ def collect():
     # 获取所有任务状态
     all_status = maccms_manager.get_all_status()
     
+    # 获取可从断点继续的任务（进程重启、手动停止或异常中断）
+    resumable_tasks = maccms_manager.get_resumable_tasks()
+    
     # 获取所有启用的采集源
     sources = CollectSource.query.filter_by(is_active=True).order_by(CollectSource.name).all()
     
     return render_template('admin/collect.html', 
                          all_status=all_status,
+                         resumable_tasks=resumable_tasks,
                          sources=sources)
 
+def _collect_params_from_form():
+    """从采集表单读取采集参数（单源和多源采集共用，不含 source_id）"""
+    type_id = request.form.get('type_id', '').strip()
+    end_page = request.form.get('end_page', '').strip()
+    concurrency = request.form.get('concurrency', '').strip()
+    return {
+        'ac': request.form.get('ac', 'videolist'),
+        'at': request.form.get('at', 'json'),
+        't': type_id,
+        'start': int(request.form.get('start_page', 1)),
+        'end': int(end_page) if end_page else None,
+        'ids': request.form.get('ids', '').strip(),
+        'wd': request.form.get('wd', '').strip(),
+        'h': request.form.get('hours', '').strip(),
+        'update_existing': request.form.get('update_existing') == 'on',
+        'batch': request.form.get('batch') == 'on',
+        'adaptive': request.form.get('adaptive') == 'on',
+        'hedge': request.form.get('hedge') == 'on',
+        'spool': request.form.get('spool') == 'on',
+        'engine': request.form.get('engine', 'thread'),
+        'mode': request.form.get('mode', 'full'),
+        'concurrency': int(concurrency) if concurrency else None
+    }
+
 @admin_bp.route('/collect/start', methods=['POST'])
 @login_required
 def start_collect():
@@ -304,15 +330,6 @@ def start_collect():
     try:
         # 获取表单数据
         source_id = request.form.get('source_id')
-        ac = request.form.get('ac', 'videolist')
-        at = request.form.get('at', 'json')
-        type_id = request.form.get('type_id', '').strip()
-        start_page = int(request.form.get('start_page', 1))
-        end_page = request.form.get('end_page', '').strip()
-        ids = request.form.get('ids', '').strip()
-        wd = request.form.get('wd', '').strip()
-        hours = request.form.get('hours', '').strip()
-        update_existing = request.form.get('update_existing') == 'on'
         max_workers = int(request.form.get('max_workers', 3))
         
         if not source_id:
@@ -329,20 +346,12 @@ def start_collect():
         url = source.url
         
         # 构建采集参数
-        params = {
-            'ac': ac,
-            'at': at,
-            't': type_id,
-            'start': start_page,
-            'end': int(end_page) if end_page else None,
-            'ids': ids,
-            'wd': wd,
-            'h': hours,
-            'update_existing': update_existing
-        }
-        
-        # 启动采集任务
-        task_id = maccms_manager.start_collect(
+        params = _collect_params_from_form()
+        params['source_id'] = source.id
+        
+        # 启动采集任务（按分类分片时，分类ID可填逗号分隔的多个分类，为空则采集全部分类）
+        start = maccms_manager.start_collect_sharded if request.form.get('sharded') == 'on' else maccms_manager.start_collect
+        task_id = start(
             url=url,
             params=params,
             max_workers=max_workers,
@@ -375,6 +384,93 @@ def start_collect():
             'message': f'启动失败: {str(e)}'
         })
 
+@admin_bp.route('/collect/start_all', methods=['POST'])
+@login_required
+def start_collect_all():
+    """同时从多个启用的采集源采集（未选择时为全部启用的采集源）"""
+    try:
+        source_ids = [int(i) for i in request.form.getlist('source_ids') if i.strip()]
+        global_workers = int(request.form.get('global_workers') or 12)
+        
+        query = CollectSource.query.filter_by(is_active=True)
+        if source_ids:
+            query = query.filter(CollectSource.id.in_(source_ids))
+        sources = query.order_by(CollectSource.id).all()
+        # 跳过熔断冷却期内的采集源，避免整组任务一开始就带着注定失败的分片
+        cooldown = current_app.config.get('COLLECTOR_BREAKER_COOLDOWN', 300)
+        skipped = [source.name for source in sources if source.is_circuit_open(cooldown)]
+        sources = [source for source in sources if not source.is_circuit_open(cooldown)]
+        if not sources:
+            message = '没有可采集的启用采集源'
+            if skipped:
+                message += f'（熔断中: {", ".join(skipped)}）'
+            return jsonify({'success': False, 'message': message})
+        
+        # 分类ID是单个采集源的远程分类，多源采集时不适用
+        params = _collect_params_from_form()
+        params['t'] = ''
+        
+        task_id = maccms_manager.start_collect_all(
+            sources=sources,
+            params=params,
+            total_workers=global_workers,
+            timeout=30,
+            max_retries=3
+        )
+        
+        SystemLog.log(
+            log_type='collect',
+            level='info',
+            module='admin',
+            message=f'启动多源采集任务 #{task_id} - {len(sources)} 个采集源',
+            details=json.dumps({
+                'sources': [source.name for source in sources],
+                'skipped': skipped,
+                'params': params,
+                'global_workers': global_workers
+            }, ensure_ascii=False)
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'多源采集任务已启动，任务ID: {task_id}' + (
+                f'，已跳过熔断中的采集源: {", ".join(skipped)}' if skipped else ''
+            ),
+            'task_id': task_id
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'启动失败: {str(e)}'
+        })
+
+@admin_bp.route('/collect/resume/<int:task_id>', methods=['POST'])
+@login_required
+def resume_collect(task_id):
+    """从断点继续MacCMS10采集任务"""
+    try:
+        maccms_manager.resume_collect(task_id)
+        
+        SystemLog.log(
+            log_type='collect',
+            level='info',
+            module='admin',
+            message=f'继续MacCMS10采集任务 #{task_id}'
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'采集任务已继续，任务ID: {task_id}',
+            'task_id': task_id
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'继续失败: {str(e)}'
+        })
+
 @admin_bp.route('/collect/stop/<int:task_id>', methods=['POST'])
 @login_required
 def stop_collect(task_id):
@@ -416,9 +512,11 @@ def test_collect():
             timeout=15,
             max_retries=2
         )
+        # 与采集任务共用该主机的限速，只测试输入的地址，不分配到镜像也不受熔断影响
+        collector.apply_source_settings(direct=True)
         
-        # 获取第一页数据
-        result = collector.fetch_data(pg=1)
+        # 获取第一页数据（分类列表在缓存有效期内不重复请求）
+        result = collector.fetch_data(pg=1, max_age=collector.category_cache_ttl)
         
         if result['code'] == 1:
             # 获取分类列表
@@ -470,9 +568,10 @@ def get_categories():
             timeout=15,
             max_retries=2
         )
+        collector.apply_source_settings()
         
         # 获取第一页数据（包含分类和视频列表）
-        result = collector.fetch_data(ac='list', pg=1)
+        result = collector.fetch_data(ac='list', pg=1, max_age=collector.category_cache_ttl)
         
         if result['code'] == 1:
             categories = result.get('class', [])
@@ -530,6 +629,9 @@ def source_add():
                 api_type=request.form.get('api_type', 'json'),
                 is_active=request.form.get('is_active') == 'on',
                 sort_order=int(request.form.get('sort_order', 0)),
+                rate_limit=float(request.form.get('rate_limit') or 0),
+                rate_burst=int(request.form.get('rate_burst') or 0),
+                mirrors=request.form.get('mirrors', '').strip(),
                 note=request.form.get('note', '')
             )
             db.session.add(source)
@@ -556,9 +658,21 @@ def source_edit(id):
             source.api_type = request.form.get('api_type', 'json')
             source.is_active = request.form.get('is_active') == 'on'
             source.sort_order = int(request.form.get('sort_order', 0))
+            source.rate_limit = float(request.form.get('rate_limit') or 0)
+            source.rate_burst = int(request.form.get('rate_burst') or 0)
+            source.mirrors = request.form.get('mirrors', '').strip()
             source.note = request.form.get('note', '')
+            if request.form.get('reset_circuit') == 'on':
+                source.reset_circuit()
             
             db.session.commit()
+            if request.form.get('reset_circuit') == 'on':
+                breakers.reset(source.id)
+            # 立即更新进程内的主机限速和镜像列表（已配置镜像的运行中任务按新列表选择镜像）
+            urls = source.get_mirror_urls()
+            for url in urls:
+                rate_limiter.configure(url, source.rate_limit, source.rate_burst)
+            mirror_registry.configure(urls[0], urls)
             flash('采集源更新成功', 'success')
             return redirect(url_for('admin.sources_list'))
         except Exception as e:
@@ -608,7 +722,8 @@ def images_download():
 @login_required
 def images_download_start():
     """启动图片下载任务"""
-    success, message = download_manager.start_download(app=current_app._get_current_object())
+    mode = request.form.get('mode', 'all')
+    success, message = download_manager.start_download(app=current_app._get_current_object(), mode=mode)
     
     if not success:
         flash(message, 'error')
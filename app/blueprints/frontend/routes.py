@@ -1,9 +1,16 @@
-from flask import render_template, request, redirect, url_for
+import os
+from flask import render_template, request, redirect, url_for, abort, send_file
+from werkzeug.security import safe_join
 from app.blueprints.frontend import frontend_bp
 from app.models.video import Video
+from app.downloaders.poster_store import is_blob_path, poster_folder
+from app.downloaders.poster_variants import VARIANTS, FORMATS, pick_formats, variant_path
 from app import db
 from sqlalchemy import func
 
+# 派生图按内容寻址，生成后不再变化，浏览器缓存一年
+POSTER_MAX_AGE = 365 * 24 * 3600
+
 @frontend_bp.route('/')
 def index():
     page = request.args.get('page', 1, type=int)
@@ -67,3 +74,26 @@ def category(category):
                          videos=videos, 
                          pagination=pagination,
                          category=category)
+
+@frontend_bp.route('/poster/<variant>/<path:blob>')
+def poster(variant, blob):
+    """
+    按 Accept 请求头返回封面派生图
+
+    依次尝试浏览器明确支持的 AVIF、WebP，最后使用 JPEG；
+    派生图尚未生成时重定向到原图
+    """
+    root = poster_folder()
+    if variant not in VARIANTS or not is_blob_path(blob) or safe_join(root, blob) is None:
+        abort(404)
+
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    mimetypes = {ext: mimetype for ext, mimetype, _ in FORMATS}
+    for ext in pick_formats(accepted):
+        path = variant_path(root, blob, variant, ext)
+        if os.path.exists(path):
+            response = send_file(path, mimetype=mimetypes[ext], max_age=POSTER_MAX_AGE, conditional=True)
+            # 同一地址按 Accept 返回不同格式，缓存需要区分
+            response.vary.add('Accept')
+            return response
+    return redirect(url_for('static', filename='uploads/posters/' + blob))
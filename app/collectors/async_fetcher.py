@@ -0,0 +1,219 @@
+"""
+异步采集引擎
+
+基于 asyncio + aiohttp 的分页请求引擎，单个事件循环即可同时保持数百个请求，
+适合高延迟的海外资源站。aiohttp 为可选依赖（pip install aiohttp），
+未安装时采集器自动退回线程池模式
+"""
+
+import asyncio
+import time
+from app.collectors.concurrency import classify_error
+from app.collectors.circuit_breaker import CircuitOpenError
+from app.collectors.rate_limiter import rate_limiter
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖
+    aiohttp = None
+
+
+def is_available():
+    """异步引擎是否可用（是否已安装aiohttp）"""
+    return aiohttp is not None
+
+
+class AsyncPageFetcher:
+    """
+    异步分页请求器
+
+    - concurrency: 同时在途的请求总数
+    - per_host: 单个主机的最大连接数
+    - 请求结果交给采集器的解析方法标准化，再通过回调交给入库线程
+    - 采集器启用自适应并发时，实际在途请求数由其控制器限制
+    """
+
+    def __init__(self, collector, concurrency=100, per_host=20):
+        """
+        初始化异步请求器
+
+        Args:
+            collector: MacCMSCollector实例（提供URL构建、解析与停止状态）
+            concurrency: 同时在途的请求总数
+            per_host: 单个主机的最大连接数
+        """
+        if aiohttp is None:
+            raise RuntimeError('异步采集需要安装 aiohttp')
+        self.collector = collector
+        self.concurrency = max(1, int(concurrency))
+        self.per_host = max(1, int(per_host))
+        self.in_flight = 0
+
+    def run(self, jobs, on_result, window=None, committed=None):
+        """
+        在新的事件循环中执行所有请求（阻塞直到完成或停止）
+
+        Args:
+            jobs: [(key, url_kwargs), ...]，url_kwargs 传给 collector.build_url
+            on_result: 回调 on_result(key, result)，可能阻塞（在线程中调用）
+            window: 滑动窗口大小，只请求序号小于 committed() + window 的任务
+            committed: 返回已按顺序入库的任务数，None表示不限制
+        """
+        asyncio.run(self._run(list(jobs), on_result, window, committed))
+
+    async def _run(self, jobs, on_result, window=None, committed=None):
+        collector = self.collector
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host,
+            ssl=False
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=collector.timeout,
+            sock_connect=collector.connect_timeout
+        )
+        pending = enumerate(jobs)
+
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers=dict(collector.session.headers)
+        ) as session:
+            async def worker():
+                for index, (key, url_kwargs) in pending:
+                    # 等待前面的页按顺序入库后窗口向后滑动
+                    while committed is not None and index >= committed() + window:
+                        if collector.should_stop:
+                            return
+                        await asyncio.sleep(0.05)
+                    if collector.should_stop:
+                        return
+                    result = await self._fetch(session, collector.build_url(**url_kwargs))
+                    result = collector._defer_if_failed(key, url_kwargs, result)
+                    # 入库队列满时会阻塞，放到线程中等待以免卡住事件循环
+                    await asyncio.to_thread(on_result, key, result)
+
+            workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(jobs)))]
+            await asyncio.gather(*workers)
+
+    async def _fetch(self, session, url):
+        """
+        请求并解析单个URL（只请求一次）
+
+        失败的页由采集器放入稍后重试列表，按统一的重试策略在本轮结束后重试
+        """
+        collector = self.collector
+        if collector.should_stop:
+            return {'code': 0, 'msg': '采集已停止'}
+        cache = collector.http_cache
+        entry = cache.get(url) if cache is not None else None
+        headers = cache.conditional_headers(entry) if entry is not None else None
+        targets = collector._mirror_targets()
+        breaker = collector.breaker
+        if breaker is not None:
+            # 熔断中直接结束；半开状态下等待探测请求的结果
+            try:
+                while not breaker.allow():
+                    if collector.should_stop:
+                        return {'code': 0, 'msg': '采集已停止'}
+                    await asyncio.sleep(0.1)
+            except CircuitOpenError as e:
+                return collector._circuit_opened(e)
+        # 与线程池模式共用按主机限速
+        delay = rate_limiter.reserve(collector._mirror_url(url, targets[0]))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        controller = collector.controller
+        if controller is not None:
+            while not controller.try_acquire():
+                await asyncio.sleep(0.02)
+        collector.retry_policy.record_request()
+        self.in_flight += 1
+        start = time.time()
+        outcome = 'error'
+        try:
+            status, response_headers, text = await self._request(session, url, targets, headers)
+            outcome = 'ok'
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure(e)
+            outcome = classify_error(e)
+            last_error = str(e) or e.__class__.__name__
+            print(f"请求失败: {url} {last_error}")
+            collector.errors.append(f"请求失败: {url}, 错误: {last_error}")
+            return {'code': 0, 'msg': last_error}
+        finally:
+            self.in_flight -= 1
+            if controller is not None:
+                controller.release(time.time() - start, outcome)
+        if breaker is not None:
+            breaker.record_success()
+        if cache is not None:
+            if status == 304 and entry is not None:
+                cache.hit(url, entry, revalidated=True)
+                text = entry['text']
+            else:
+                cache.store(url, response_headers, text)
+        return collector._parse_response(text, url)
+
+    async def _request(self, session, url, targets, headers=None):
+        """向最优镜像请求；有两个目标时，主请求超过近期p95延迟未返回再对冲请求次优镜像"""
+        mirrors = self.collector.mirrors
+        first = asyncio.ensure_future(self._request_mirror(session, url, targets[0], headers))
+        if len(targets) == 1:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=mirrors.hedge_delay())
+        if done and first.exception() is None:
+            return first.result()
+        delay = rate_limiter.reserve(self.collector._mirror_url(url, targets[1]))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        mirrors.record_hedge()
+        second = asyncio.ensure_future(self._request_mirror(session, url, targets[1], headers))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is second:
+                        mirrors.record_hedge(won=True)
+                    return task.result()
+            raise error
+        finally:
+            # 取消落后的请求
+            for task in pending:
+                task.cancel()
+
+    async def _request_mirror(self, session, url, mirror, headers=None):
+        """
+        向指定镜像发送请求，并记录该镜像的延迟和健康状况
+
+        Returns:
+            tuple: (状态码, 响应头, 响应文本)
+        """
+        collector = self.collector
+        start = time.time()
+        try:
+            async with session.get(collector._mirror_url(url, mirror), headers=headers) as response:
+                response.raise_for_status()
+                text = await response.text(encoding='utf-8', errors='replace')
+                result = (response.status, dict(response.headers), text)
+        except Exception:
+            if collector.mirrors is not None:
+                collector.mirrors.record(mirror, ok=False)
+            raise
+        if collector.mirrors is not None:
+            collector.mirrors.record(mirror, time.time() - start)
+        return result
+
+    def get_stats(self):
+        """获取异步引擎统计"""
+        return {
+            'engine': 'async',
+            'in_flight': self.in_flight,
+            'concurrency': self.concurrency,
+        }
@@ -0,0 +1,207 @@
+"""
+采集源熔断
+
+资源站整体故障时，连续失败达到阈值后熔断该采集源：后续请求不再发送，
+采集任务立即结束，而不是每页都跑满重试、把相同的失败写满错误列表和系统日志。
+冷却时间过后只放行一个探测请求，成功则恢复，失败则重新熔断
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class CircuitOpenError(Exception):
+    """采集源熔断中，请求未发送"""
+
+
+class CollectStopped(Exception):
+    """等待探测结果时采集任务被停止，请求未发送（不是熔断，不计入熔断次数）"""
+
+
+class CircuitBreaker:
+    """
+    单个采集源的熔断器（线程安全）
+
+    - closed: 正常请求，连续失败 threshold 次后转为 open
+    - open: 拒绝所有请求，cooldown 秒后转为 half_open
+    - half_open: 只放行一个探测请求，其他请求等待探测结果；探测成功转为 closed，失败重新 open
+    - health_score: 请求成功率的指数加权平均（0~1），与熔断状态一起保存到采集源
+    """
+
+    def __init__(self, threshold=10, cooldown=300.0):
+        """
+        初始化熔断器
+
+        Args:
+            threshold: 触发熔断的连续失败次数
+            cooldown: 熔断后到放行探测请求的冷却时间（秒）
+        """
+        self.threshold = max(1, int(threshold))
+        self.cooldown = float(cooldown)
+        self.source_id = None
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.health_score = 1.0
+        self.last_failure = ''
+        self.last_failure_at = None
+        self.rejected = 0
+        self.cond = threading.Condition()
+
+    def load(self, source):
+        """从采集源恢复熔断状态（进程重启后熔断仍然有效）"""
+        with self.cond:
+            self.state = source.circuit_state or 'closed'
+            self.failures = source.consecutive_failures or 0
+            self.opened_at = source.circuit_opened_at.timestamp() if source.circuit_opened_at else 0.0
+            self.health_score = source.health_score if source.health_score is not None else 1.0
+            self.last_failure = source.last_failure or ''
+            self.last_failure_at = source.last_failure_at
+            if self.state == 'half_open':
+                # 上次探测没有结果（进程中断），重新探测
+                self.probing = False
+
+    def save(self, source):
+        """把熔断状态写入采集源（调用方负责提交）"""
+        with self.cond:
+            source.circuit_state = self.state
+            source.consecutive_failures = self.failures
+            source.circuit_opened_at = datetime.fromtimestamp(self.opened_at) if self.opened_at else None
+            source.health_score = round(self.health_score, 4)
+            source.last_failure = self.last_failure
+            source.last_failure_at = self.last_failure_at
+
+    def allow(self):
+        """
+        非阻塞判断能否发送请求
+
+        Returns:
+            bool: True 可以发送；False 探测请求进行中，稍后再试
+
+        Raises:
+            CircuitOpenError: 熔断中
+        """
+        with self.cond:
+            return self._allow()
+
+    def _allow(self):
+        if self.state == 'closed':
+            return True
+        if self.state == 'open':
+            remaining = self.cooldown - (time.time() - self.opened_at)
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(f'采集源已熔断，{int(remaining) + 1} 秒后重新探测（{self.last_failure}）')
+            self.state = 'half_open'
+            self.probing = False
+        if not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def before_request(self, should_stop=None):
+        """
+        发送请求前调用，探测请求进行中时阻塞等待其结果
+
+        Args:
+            should_stop: 可选回调，返回True时不再等待
+
+        Raises:
+            CircuitOpenError: 熔断中
+            CollectStopped: 等待期间采集任务被停止
+        """
+        with self.cond:
+            while not self._allow():
+                if should_stop and should_stop():
+                    raise CollectStopped('采集已停止')
+                self.cond.wait(0.5)
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self.cond:
+            self.failures = 0
+            self.health_score = self.health_score * 0.9 + 0.1
+            if self.state != 'closed':
+                self.state = 'closed'
+                self.opened_at = 0.0
+            self.probing = False
+            self.cond.notify_all()
+
+    def record_failure(self, error):
+        """
+        记录一次失败请求
+
+        Args:
+            error: 异常或错误信息
+        """
+        with self.cond:
+            self.failures += 1
+            self.health_score *= 0.9
+            self.last_failure = (str(error) or error.__class__.__name__)[:500]
+            self.last_failure_at = datetime.now()
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.time()
+            self.probing = False
+            self.cond.notify_all()
+
+    def is_open(self):
+        """是否处于熔断冷却期内"""
+        with self.cond:
+            return self.state == 'open' and time.time() - self.opened_at < self.cooldown
+
+    def get_stats(self):
+        """获取熔断统计"""
+        with self.cond:
+            return {
+                'circuit_state': self.state,
+                'consecutive_failures': self.failures,
+                'health_score': round(self.health_score, 3),
+                'circuit_rejected': self.rejected,
+            }
+
+
+class BreakerRegistry:
+    """
+    进程级熔断器注册表
+
+    按采集源ID保存熔断器，同一采集源的所有任务共享熔断状态
+    """
+
+    def __init__(self):
+        self.breakers = {}  # {source_id: CircuitBreaker}
+        self.lock = threading.Lock()
+
+    def get(self, source, threshold=10, cooldown=300.0):
+        """
+        获取采集源的熔断器，首次获取时从采集源恢复状态
+
+        Args:
+            source: CollectSource实例
+            threshold: 触发熔断的连续失败次数
+            cooldown: 冷却时间（秒）
+
+        Returns:
+            CircuitBreaker: 熔断器
+        """
+        with self.lock:
+            breaker = self.breakers.get(source.id)
+            if breaker is None:
+                breaker = self.breakers[source.id] = CircuitBreaker(threshold, cooldown)
+                breaker.source_id = source.id
+                breaker.load(source)
+            else:
+                breaker.threshold = max(1, int(threshold))
+                breaker.cooldown = float(cooldown)
+            return breaker
+
+    def reset(self, source_id):
+        """清除采集源的熔断器（修改采集源配置后重新从数据库加载）"""
+        with self.lock:
+            self.breakers.pop(source_id, None)
+
+
+# 进程内共享的熔断器注册表
+breakers = BreakerRegistry()
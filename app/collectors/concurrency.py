@@ -0,0 +1,308 @@
+"""
+自适应并发控制
+
+按 AIMD（加性增、乘性减）调整同时在途的请求数：
+资源站响应健康时逐步加大并发，出现 429/5xx/超时时立即减半，
+在不被限流的前提下尽量提高吞吐
+"""
+
+import asyncio
+import threading
+import time
+import requests
+
+# 视为"资源站过载/限流"的HTTP状态码
+THROTTLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+def classify_error(error):
+    """
+    判断请求异常是否属于过载信号
+
+    Returns:
+        str: 'throttled'（429/5xx/超时/连接失败）| 'error'（其他错误，不调整并发）
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, requests.Timeout,
+                          requests.ConnectionError, requests.exceptions.RetryError)):
+        return 'throttled'
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in THROTTLE_STATUS:
+        return 'throttled'
+    # aiohttp 的连接异常（未安装aiohttp时不会出现）
+    if error.__class__.__name__ in ('ClientConnectorError', 'ServerDisconnectedError', 'ServerTimeoutError'):
+        return 'throttled'
+    return 'error'
+
+
+class AIMDController:
+    """
+    AIMD 并发控制器（线程安全）
+
+    - acquire()/release(): 每个请求占用一个并发额度，超过当前上限时等待
+    - 每连续完成"当前上限"个健康请求，上限 +1（延迟超过基线的 latency_factor 倍时不增加）
+    - 出现过载信号时上限减半，同一冷却期内只减一次，避免一批在途请求连续减半
+    - ceiling: 最近一次退避之后健康运行过的最高并发，保存到采集源作为下次的起点
+    """
+
+    def __init__(self, initial=3, minimum=1, maximum=32, latency_factor=3.0, cooldown=2.0):
+        """
+        初始化并发控制器
+
+        Args:
+            initial: 初始并发数
+            minimum: 最小并发数
+            maximum: 最大并发数（线程池大小/异步协程数）
+            latency_factor: 延迟超过基线的倍数时停止增加并发
+            cooldown: 两次减半之间的最短间隔（秒）
+        """
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = min(self.maximum, max(self.minimum, int(initial)))
+        self.ceiling = self.limit
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.healthy = 0  # 当前窗口内连续健康的请求数
+        self.base_latency = None  # 观测到的最低延迟
+        self.latency = None  # 延迟的指数加权平均
+        self.last_decrease = 0.0
+        self.throttled_count = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, should_stop=None):
+        """
+        占用一个并发额度，超过上限时阻塞等待
+
+        Args:
+            should_stop: 可选回调，返回True时不再等待（停止采集时尽快返回）
+        """
+        with self.cond:
+            while self.in_flight >= self.limit and not (should_stop and should_stop()):
+                self.cond.wait(0.5)
+            self.in_flight += 1
+
+    def try_acquire(self):
+        """非阻塞占用并发额度（异步引擎在事件循环中轮询使用）"""
+        with self.cond:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, outcome='ok'):
+        """
+        释放并发额度并反馈请求结果
+
+        Args:
+            latency: 请求耗时（秒）
+            outcome: 'ok' | 'throttled' | 'error'
+        """
+        with self.cond:
+            self.in_flight -= 1
+            if outcome == 'throttled':
+                self._decrease()
+            elif outcome == 'ok' and latency is not None:
+                self._observe(latency)
+            self.cond.notify_all()
+
+    def _observe(self, latency):
+        """记录一次健康请求，满一个窗口后加性增加"""
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+        self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+        if self.latency > self.base_latency * self.latency_factor + 0.05:
+            # 延迟明显上升说明接近资源站承载能力，保持当前并发
+            self.healthy = 0
+            return
+        self.healthy += 1
+        if self.healthy >= self.limit:
+            self.healthy = 0
+            self.ceiling = max(self.ceiling, self.limit)
+            if self.limit < self.maximum:
+                self.limit += 1
+
+    def _decrease(self):
+        """过载时乘性减少"""
+        self.throttled_count += 1
+        self.healthy = 0
+        now = time.time()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit // 2)
+        self.ceiling = self.limit
+
+    def get_stats(self):
+        """获取并发控制统计"""
+        with self.cond:
+            return {
+                'concurrency_limit': self.limit,
+                'concurrency_in_flight': self.in_flight,
+                'concurrency_ceiling': self.ceiling,
+                'concurrency_max': self.maximum,
+                'latency_ms': round(self.latency * 1000) if self.latency is not None else None,
+                'throttled_count': self.throttled_count,
+            }
+
+
+class WorkerBudget:
+    """
+    多采集源共享的全局并发预算（线程安全）
+
+    - 所有采集源同时在途的请求数不超过 total
+    - 每个采集源的公平份额为 ceil(total / 运行中的采集源数)，
+      某个采集源结束后份额自动分给其他采集源
+    - 没有其他采集源在等待时，允许超出公平份额借用空闲额度，避免预算闲置
+    """
+
+    # 异步引擎轮询 try_acquire 失败后，在该时间内视为仍在等待（秒）
+    PENDING_TTL = 0.2
+
+    def __init__(self, total):
+        """
+        初始化全局并发预算
+
+        Args:
+            total: 全局最大在途请求数
+        """
+        self.total = max(1, int(total))
+        self.in_use = {}  # {key: 在途请求数}
+        self.waiting = {}  # {key: 阻塞等待的请求数}
+        self.pending = {}  # {key: 最近一次 try_acquire 失败的时间}
+        self.cond = threading.Condition()
+
+    def register(self, key, inner=None):
+        """
+        登记采集源并返回其并发额度对象
+
+        Args:
+            key: 采集源标识
+            inner: 可选的该采集源自身的并发控制器（如AIMDController）
+
+        Returns:
+            BudgetSlot: 与 AIMDController 接口一致，可直接作为采集器的 controller
+        """
+        with self.cond:
+            self.in_use.setdefault(key, 0)
+            self.waiting.setdefault(key, 0)
+        return BudgetSlot(self, key, inner)
+
+    def unregister(self, key):
+        """采集源结束后注销，释放其公平份额"""
+        with self.cond:
+            self.in_use.pop(key, None)
+            self.waiting.pop(key, None)
+            self.pending.pop(key, None)
+            self.cond.notify_all()
+
+    def fair_share(self):
+        """每个运行中采集源的公平份额"""
+        return -(-self.total // max(1, len(self.in_use)))
+
+    def _can_take(self, key):
+        """在锁内判断该采集源能否再占用一个额度"""
+        if sum(self.in_use.values()) >= self.total:
+            return False
+        if self.in_use.get(key, 0) < self.fair_share():
+            return True
+        # 超出公平份额时，只有其他采集源都不在等待才借用空闲额度
+        now = time.monotonic()
+        return not any(
+            self.waiting.get(other) or now - self.pending.get(other, 0) < self.PENDING_TTL
+            for other in self.in_use if other != key
+        )
+
+    def acquire(self, key, should_stop=None):
+        """占用一个额度，超过份额时阻塞等待"""
+        with self.cond:
+            self.waiting[key] = self.waiting.get(key, 0) + 1
+            try:
+                while not self._can_take(key) and not (should_stop and should_stop()):
+                    self.cond.wait(0.5)
+            finally:
+                self.waiting[key] -= 1
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+
+    def try_acquire(self, key):
+        """非阻塞占用额度"""
+        with self.cond:
+            if not self._can_take(key):
+                self.pending[key] = time.monotonic()
+                return False
+            self.pending.pop(key, None)
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+            return True
+
+    def release(self, key):
+        """释放一个额度"""
+        with self.cond:
+            if key in self.in_use:
+                self.in_use[key] = max(0, self.in_use[key] - 1)
+            self.cond.notify_all()
+
+    def get_stats(self):
+        """获取全局预算统计"""
+        with self.cond:
+            return {
+                'budget_total': self.total,
+                'budget_in_use': sum(self.in_use.values()),
+                'budget_fair_share': self.fair_share(),
+            }
+
+
+class BudgetSlot:
+    """
+    单个采集源在全局预算中的并发额度
+
+    接口与 AIMDController 一致；同时启用自适应并发时先占用采集源自身的额度，
+    再占用全局额度，结果只反馈给采集源自身的控制器
+    """
+
+    def __init__(self, budget, key, inner=None):
+        self.budget = budget
+        self.key = key
+        self.inner = inner
+
+    @property
+    def maximum(self):
+        """单个采集源最多能用到的并发数（线程池大小）"""
+        return min(self.inner.maximum, self.budget.total) if self.inner is not None else self.budget.total
+
+    @property
+    def ceiling(self):
+        """自适应并发学到的并发数（未启用自适应并发时为None）"""
+        return self.inner.ceiling if self.inner is not None else None
+
+    def acquire(self, should_stop=None):
+        """占用一个并发额度，超过上限时阻塞等待"""
+        if self.inner is not None:
+            self.inner.acquire(should_stop)
+        self.budget.acquire(self.key, should_stop)
+
+    def try_acquire(self):
+        """非阻塞占用并发额度"""
+        if self.inner is not None and not self.inner.try_acquire():
+            return False
+        if self.budget.try_acquire(self.key):
+            return True
+        if self.inner is not None:
+            # 未发出请求，只归还额度，不反馈结果
+            self.inner.release()
+        return False
+
+    def release(self, latency=None, outcome='ok'):
+        """释放并发额度，并把请求结果反馈给采集源自身的控制器"""
+        self.budget.release(self.key)
+        if self.inner is not None:
+            self.inner.release(latency, outcome)
+
+    def get_stats(self):
+        """获取并发统计（含全局预算）"""
+        stats = self.inner.get_stats() if self.inner is not None else {}
+        with self.budget.cond:
+            stats['budget_in_flight'] = self.budget.in_use.get(self.key, 0)
+        stats.update(self.budget.get_stats())
+        return stats
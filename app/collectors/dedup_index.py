@@ -0,0 +1,184 @@
+"""
+采集去重索引
+
+在采集任务开始时一次性加载视频库的去重键，
+之后整页数据的新增/更新判断都在内存中完成，不再逐条查询数据库
+"""
+
+import threading
+from app import db
+from app.models.video import Video
+
+
+class DedupIndex:
+    """
+    视频去重索引
+
+    - by_identity: {(source_id, remote_vod_id): vod_id}，按采集身份判断视频是否已存在
+    - by_title: {title_key: vod_id}，按标准化名称跨采集源判断视频是否已存在
+    - by_vod_id: 已占用的vod_id集合，检测新视频的vod_id是否已被占用（只判断是否存在，不保存名称）
+    - anonymous: 没有采集身份的vod_id（升级前入库或手动添加），差异采集时按vod_id比对
+    - vod_times: {vod_id: vod_time}，差异采集时判断远程数据是否有更新
+    - content_hashes: {vod_id: content_hash}，更新前判断采集数据是否有变化
+
+    vod_id 是 upsert 的冲突键，所以各表都映射到 vod_id，
+    入库时无需再通过数据库主键回查。
+    """
+
+    # 流式加载时每批读取的行数
+    LOAD_BATCH_SIZE = 10000
+
+    def __init__(self):
+        self.by_identity = {}
+        self.by_title = {}
+        self.by_vod_id = set()
+        self.anonymous = set()
+        self.vod_times = {}
+        self.content_hashes = {}
+        self.max_vod_id = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        从数据库加载去重键（需在应用上下文中调用）
+
+        Returns:
+            int: 加载的视频数量
+        """
+        by_identity = {}
+        by_title = {}
+        by_vod_id = set()
+        anonymous = set()
+        vod_times = {}
+        content_hashes = {}
+        max_vod_id = 0
+        query = db.session.query(
+            Video.vod_name, Video.vod_id, Video.vod_time, Video.content_hash,
+            Video.source_id, Video.remote_vod_id, Video.title_key
+        ).order_by(Video.id).execution_options(yield_per=self.LOAD_BATCH_SIZE)
+        for vod_name, vod_id, vod_time, content_hash, source_id, remote_vod_id, title_key in query:
+            # 同名视频以最早入库的一条为准；升级前入库的视频按名称现算标准化名称
+            by_title.setdefault(title_key or Video.make_title_key(vod_name), vod_id)
+            if source_id is not None and remote_vod_id:
+                by_identity[(source_id, remote_vod_id)] = vod_id
+            else:
+                anonymous.add(vod_id)
+            by_vod_id.add(vod_id)
+            if isinstance(vod_id, int) and vod_id > max_vod_id:
+                max_vod_id = vod_id
+            if vod_time:
+                vod_times[vod_id] = vod_time
+            if content_hash:
+                content_hashes[vod_id] = content_hash
+
+        with self.lock:
+            self.by_identity = by_identity
+            self.by_title = by_title
+            self.by_vod_id = by_vod_id
+            self.anonymous = anonymous
+            self.vod_times = vod_times
+            self.content_hashes = content_hashes
+            self.max_vod_id = max_vod_id
+            self.loaded = True
+        return len(by_vod_id)
+
+    def lookup_identities(self, source_id, remote_vod_ids):
+        """
+        按采集身份批量查询已存在的视频
+
+        Returns:
+            dict: {remote_vod_id: vod_id}
+        """
+        with self.lock:
+            found = {}
+            for remote_vod_id in remote_vod_ids:
+                vod_id = self.by_identity.get((source_id, remote_vod_id))
+                if vod_id is not None:
+                    found[remote_vod_id] = vod_id
+            return found
+
+    def lookup_titles(self, title_keys):
+        """
+        按标准化名称批量查询已存在的视频
+
+        Returns:
+            dict: {title_key: vod_id}
+        """
+        with self.lock:
+            return {key: self.by_title[key] for key in title_keys if key in self.by_title}
+
+    def taken_vod_ids(self, vod_ids):
+        """
+        返回已被占用的vod_id集合
+        """
+        with self.lock:
+            return {vod_id for vod_id in vod_ids if vod_id in self.by_vod_id}
+
+    def allocate_vod_id(self):
+        """
+        分配一个大于库中所有vod_id的新vod_id（远程vod_id和名称摘要都已被占用时使用）
+
+        Returns:
+            int: 新的vod_id
+        """
+        with self.lock:
+            self.max_vod_id += 1
+            return self.max_vod_id
+
+    def lookup_hashes(self, vod_ids):
+        """
+        批量查询已入库视频的数据摘要
+
+        Returns:
+            dict: {vod_id: content_hash}
+        """
+        with self.lock:
+            return {vod_id: self.content_hashes[vod_id] for vod_id in vod_ids if vod_id in self.content_hashes}
+
+    def is_changed(self, remote_vod_id, vod_time, source_id=None):
+        """
+        判断远程视频相对本地是否为新增或有更新
+
+        有采集源时按采集身份查找本地视频；找不到时再按vod_id查找没有采集身份的视频
+        （升级前入库的视频的vod_id就是远程vod_id）
+
+        Returns:
+            str: 'new' | 'changed' | '' (未变化)
+        """
+        with self.lock:
+            vod_id = None
+            if source_id is not None:
+                vod_id = self.by_identity.get((source_id, str(remote_vod_id)))
+            if vod_id is None:
+                if remote_vod_id not in self.by_vod_id or \
+                        (source_id is not None and remote_vod_id not in self.anonymous):
+                    return 'new'
+                vod_id = remote_vod_id
+            if vod_time and str(vod_time) != str(self.vod_times.get(vod_id, '')):
+                return 'changed'
+            return ''
+
+    def add(self, vod_id, vod_name, title_key, source_id=None, remote_vod_id=None, vod_time=None):
+        """登记新增、更新或补全采集身份的视频（仅在事务提交成功后调用）"""
+        with self.lock:
+            known = vod_id in self.by_vod_id
+            self.by_title.setdefault(title_key, vod_id)
+            self.by_vod_id.add(vod_id)
+            if source_id is not None and remote_vod_id:
+                self.by_identity.setdefault((source_id, remote_vod_id), vod_id)
+                self.anonymous.discard(vod_id)
+            elif not known:
+                self.anonymous.add(vod_id)
+            if isinstance(vod_id, int) and vod_id > self.max_vod_id:
+                self.max_vod_id = vod_id
+            if vod_time:
+                self.vod_times[vod_id] = vod_time
+
+    def update_hashes(self, hashes):
+        """登记写入后的数据摘要（仅在事务提交成功后调用）"""
+        with self.lock:
+            self.content_hashes.update(hashes)
+
+    def __len__(self):
+        return len(self.by_vod_id)
@@ -0,0 +1,241 @@
+"""
+采集接口响应缓存
+
+进程内共享的磁盘缓存，按请求URL保存资源站的响应：
+- 响应带 ETag/Last-Modified 时保存，下次请求带 If-None-Match/If-Modified-Since 条件请求，
+  资源站返回 304 时直接使用缓存内容
+- 分类列表（ac=list 第1页）可以指定有效期，有效期内不再请求资源站（接口测试、获取分类）
+- 缓存总大小超过上限时按最近使用时间淘汰
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class CachedResponse:
+    """缓存命中时代替 requests.Response 返回（只提供采集器用到的属性）"""
+
+    from_cache = True
+
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+
+    def raise_for_status(self):
+        pass
+
+
+class HttpCache:
+    """
+    磁盘响应缓存（线程安全）
+
+    每个URL一个 gzip 文件：<目录>/<key前2位>/<key>.json.gz，
+    内容为 url、etag、last_modified、stored_at 和响应文本。
+    首次使用时扫描目录建立索引 {key: [文件大小, 最近使用时间]}，
+    之后未缓存的URL不访问磁盘
+    """
+
+    # 超过上限时淘汰到上限的这个比例，避免每次写入都触发淘汰
+    EVICT_TO = 0.9
+
+    def __init__(self, directory=None, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index = None
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def configure(self, directory, max_bytes):
+        """设置缓存目录和大小上限（目录变化时重新建立索引）"""
+        with self.lock:
+            if directory != self.directory:
+                self.directory = directory
+                self.index = None
+            self.max_bytes = int(max_bytes)
+
+    @staticmethod
+    def key_of(url):
+        """URL对应的缓存键"""
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json.gz')
+
+    def _load_index(self):
+        """扫描缓存目录建立索引（调用方持有锁）"""
+        if self.index is not None:
+            return
+        self.index = {}
+        self.total_bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.json.gz'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                self.index[name[:-len('.json.gz')]] = [stat.st_size, stat.st_mtime]
+                self.total_bytes += stat.st_size
+
+    def get(self, url):
+        """
+        读取缓存
+
+        Returns:
+            dict: {'url', 'etag', 'last_modified', 'stored_at', 'text'}，未缓存时为None
+        """
+        key = self.key_of(url)
+        with self.lock:
+            self._load_index()
+            if key not in self.index:
+                return None
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, EOFError, ValueError):
+            self.invalidate(url)
+            return None
+        if entry.get('url') != url:
+            return None
+        with self.lock:
+            if key in self.index:
+                self.index[key][1] = time.time()
+        return entry
+
+    @staticmethod
+    def is_fresh(entry, max_age):
+        """缓存是否在有效期内"""
+        return bool(max_age) and time.time() - entry.get('stored_at', 0) < max_age
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        条件请求头
+
+        Returns:
+            dict: 缓存没有校验字段时为None
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers or None
+
+    def hit(self, url, entry, revalidated=False):
+        """
+        记录一次缓存命中
+
+        Args:
+            url: 请求URL
+            entry: 命中的缓存
+            revalidated: 是否经资源站 304 确认，确认后重新计算有效期
+        """
+        with self.lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidated += 1
+        if revalidated:
+            self._write(url, dict(entry, stored_at=time.time()))
+
+    def store(self, url, headers, text, keep=False):
+        """
+        保存响应
+
+        Args:
+            url: 请求URL
+            headers: 响应头
+            text: 响应文本
+            keep: 没有 ETag/Last-Modified 时也保存（按有效期使用的请求）
+        """
+        etag = headers.get('ETag') if headers else None
+        last_modified = headers.get('Last-Modified') if headers else None
+        if not (etag or last_modified or keep) or not text:
+            # 资源站不再提供校验字段时删除旧缓存，不再发送条件请求
+            self.invalidate(url)
+            return
+        self._write(url, {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': time.time(),
+            'text': text,
+        })
+        with self.lock:
+            self.stores += 1
+
+    def _write(self, url, entry):
+        """写入缓存文件（先写临时文件再替换），超过大小上限时淘汰"""
+        key = self.key_of(url)
+        path = self._path(key)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"写入响应缓存失败: {str(e)}")
+            return
+        with self.lock:
+            self._load_index()
+            old = self.index.get(key)
+            self.total_bytes += size - (old[0] if old else 0)
+            self.index[key] = [size, time.time()]
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """按最近使用时间淘汰到上限以内（调用方持有锁）"""
+        target = self.max_bytes * self.EVICT_TO
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self.index[key]
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def invalidate(self, url):
+        """删除URL的缓存（响应解析失败时调用）"""
+        key = self.key_of(url)
+        with self.lock:
+            self._load_index()
+            item = self.index.pop(key, None)
+            if item is None:
+                return
+            self.total_bytes -= item[0]
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        """获取缓存统计"""
+        with self.lock:
+            return {
+                'cache_hits': self.hits,
+                'cache_revalidated': self.revalidated,
+                'cache_stores': self.stores,
+                'cache_evictions': self.evictions,
+                'cache_bytes': self.total_bytes,
+                'cache_entries': len(self.index) if self.index is not None else 0,
+            }
+
+
+# 进程内共享的响应缓存（由采集器按应用配置设置目录和大小）
+http_cache = HttpCache()
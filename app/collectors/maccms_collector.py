@@ -7,21 +7,62 @@ MacCMS10 通用采集器
 
 import requests
 import json
+import hashlib
 import time
 import threading
-import xml.etree.ElementTree as ET
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from app.models.video import Video
 from app.models.system_log import SystemLog
+from app.models.collect_source import CollectSource
+from app.models.collect_task import CollectTask
+from app.collectors.dedup_index import DedupIndex
+from app.collectors.page_writer import PageWriter
+from app.collectors import async_fetcher, parsers
+from app.collectors.concurrency import AIMDController, classify_error
+from app.collectors.rate_limiter import rate_limiter
+from app.collectors.mirrors import mirror_registry
+from app.collectors.circuit_breaker import breakers, CircuitOpenError, CollectStopped
+from app.collectors.page_spool import PageSpool
+from app.collectors.http_cache import http_cache, CachedResponse
+from app.collectors.retry import RetryPolicy
 from app import db
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from flask import current_app
+from sqlalchemy import func, or_
 import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Video模型中允许由采集数据写入的字段
+VIDEO_FIELDS = frozenset({
+    'vod_id', 'type_id', 'type_id_1', 'group_id', 'type_name', 'vod_name', 'vod_sub', 'vod_en',
+    'vod_status', 'vod_letter', 'vod_color', 'vod_tag', 'vod_class', 'vod_pic',
+    'vod_pic_thumb', 'vod_pic_slide', 'vod_actor', 'vod_director', 'vod_writer',
+    'vod_behind', 'vod_blurb', 'vod_remarks', 'vod_pubdate', 'vod_total', 'vod_serial',
+    'vod_tv', 'vod_weekday', 'vod_area', 'vod_lang', 'vod_year', 'vod_version',
+    'vod_state', 'vod_author', 'vod_jumpurl', 'vod_tpl', 'vod_tpl_play', 'vod_tpl_down',
+    'vod_isend', 'vod_lock', 'vod_level', 'vod_points_play', 'vod_points_down',
+    'vod_hits', 'vod_hits_day', 'vod_hits_week', 'vod_hits_month', 'vod_duration',
+    'vod_up', 'vod_down', 'vod_score', 'vod_score_all', 'vod_score_num',
+    'vod_time', 'vod_time_add', 'vod_time_hits', 'vod_time_make', 'vod_trysee',
+    'vod_douban_id', 'vod_douban_score', 'vod_reurl', 'vod_rel_vod', 'vod_rel_art',
+    'vod_content', 'vod_play_from', 'vod_play_server', 'vod_play_note', 'vod_play_url',
+    'vod_down_from', 'vod_down_server', 'vod_down_note', 'vod_down_url',
+    'vod_pwd', 'vod_pwd_url', 'vod_pwd_play', 'vod_pwd_play_url', 'vod_pwd_down'
+})
+
+EMPTY_NAME_MSG = '视频名称为空'
+
+# 采集身份字段：只在为空时写入，之后不被其他采集源覆盖
+IDENTITY_FIELDS = frozenset({'source_id', 'remote_vod_id'})
+
+# 批量查询时IN子句的最大参数个数（SQLite默认上限999）
+LOOKUP_CHUNK_SIZE = 500
+
+# 采集断点的最短保存间隔（秒），任务结束时总会保存
+CHECKPOINT_INTERVAL = 5
+
 
 class MacCMSCollector:
     """
@@ -64,6 +105,16 @@ class MacCMSCollector:
         
         # 采集参数
         self.params = params or {}
+        # 连接超时与读取超时分开设置，连接不上时尽快失败
+        self.connect_timeout = float(self.params.get('connect_timeout') or min(10, timeout))
+        # 统一重试策略：抖动退避 + 单次请求截止时间 + 任务级重试预算
+        self.retry_policy = RetryPolicy(
+            max_attempts=max_retries,
+            deadline=float(self.params.get('deadline') or timeout * 2)
+        )
+        # 分页采集中请求失败的页先放入稍后重试列表，不在采集线程中等待重试
+        self.retry_later = []
+        self.defer_failures = False
         self.ac = self.params.get('ac', 'videolist')  # 默认获取详情
         self.at = self.params.get('at', 'json')  # 默认JSON格式
         self.type_id = self.params.get('t', '')
@@ -72,38 +123,102 @@ class MacCMSCollector:
         self.ids = self.params.get('ids', '')
         self.wd = self.params.get('wd', '')
         self.hours = self.params.get('h', '')
-        
+        # 批量入库：整页数据在一个事务内写入
+        self.batch_ingest = bool(self.params.get('batch', False))
+        # 去重索引，批量入库时在采集开始前加载
+        self.dedup_index = None
+        # 采集引擎：thread（线程池）| async（asyncio事件循环，需要aiohttp）
+        self.engine = self.params.get('engine', 'thread')
+        self.concurrency = int(self.params.get('concurrency') or 100)
+        self.per_host = int(self.params.get('per_host') or self.concurrency)
+        # 采集模式：full（逐页全量）| diff（先比对列表，只取新增/更新的详情）
+        # | incremental（按采集源高水位自动计算h，只取增量）
+        self.mode = self.params.get('mode', 'full')
+        self.source_id = self.params.get('source_id')
+        self.detail_batch_size = int(self.params.get('detail_batch') or 20)
+        # 自适应并发：按资源站的延迟和错误率自动调整并发数（AIMD），上限为 max_concurrency
+        self.adaptive = bool(self.params.get('adaptive', False))
+        self.max_concurrency = int(self.params.get('max_concurrency') or (
+            self.concurrency if self.engine == 'async' else 32
+        ))
+        self.controller = None
+        # 多源采集时由编排器设置的全局并发额度（BudgetSlot）
+        self.budget = None
+        # 滑动窗口：已按顺序入库的页之后最多提前请求的页数
+        self.window = int(self.params.get('window') or 4 * (
+            self.max_concurrency if self.adaptive else
+            self.concurrency if self.engine == 'async' else self.max_workers
+        ))
+        if self.engine == 'async' or self.mode == 'diff':
+            # 异步引擎和差异采集都通过入库线程写库，总是使用批量入库
+            self.batch_ingest = True
+        # 差异采集只写入有变化的视频，不按连续重复停止
+        self.stop_on_duplicates = self.mode != 'diff'
+
         # 统计信息
         self.success_count = 0
         self.failed_count = 0
         self.skip_count = 0
+        # 已存在且采集数据未变化、跳过写入的视频数（同时计入skip_count）
+        self.unchanged_count = 0
+        # 重试后仍请求失败或入库异常的页数（有失败页时不推进高水位）
+        self.failed_pages = 0
         self.errors = []
         self.is_running = False
         self.should_stop = False
         self.consecutive_duplicates = 0
         self.max_consecutive_duplicates = 20
         self.current_page = self.start_page
+        self.diff_listed = 0
+        self.diff_new = 0
+        self.diff_changed = 0
+        self.stopped_by_user = False
+        # 增量采集高水位：本次运行开始时间和看到的最大vod_time
+        self.started_at = None
+        self.max_vod_time = ''
+        # 分类分片时由编排器在所有分片完成后统一推进高水位
+        self.advance_high_water = True
+        
+        # 断点续采：task_id对应collect_tasks表，由采集管理器设置
+        self.task_id = None
+        self.completed_pages = set()
+        self.total_pages = 0
+        self.last_checkpoint_at = 0.0
         
         # 线程锁
         self.count_lock = threading.Lock()
         self.db_lock = threading.Lock()
+        self.checkpoint_lock = threading.Lock()
         
         # 创建session
         self.session = self._create_session()
         
         # 分类绑定关系
         self.type_bind = {}  # {远程分类ID: 本地分类ID}
+        
+        # 采集源镜像（配置了多个接口地址时由 apply_source_settings 设置）
+        self.mirrors = None
+        # 对冲请求：主请求超过近期p95延迟未返回时向次优镜像再发一次
+        self.hedge = bool(self.params.get('hedge', False))
+        self.hedge_pool = None
+        # 采集源熔断器（由 apply_source_settings 设置）
+        self.breaker = None
+        self.circuit_open = False
+        # 原始响应暂存（params['spool'] 为真时在采集开始时创建）
+        self.spool = None
+        # 响应缓存（由 apply_source_settings 按应用配置设置）和分类列表的缓存有效期
+        self.http_cache = None
+        self.category_cache_ttl = 0
+        
+        # 入库线程（批量入库模式下创建）
+        self.writer = None
+        # 异步请求器（异步引擎下创建）
+        self.fetcher = None
     
     def _create_session(self):
-        """创建带重试机制的session"""
+        """创建session（重试统一由 fetch_data 的重试策略处理，连接层不再重试）"""
         session = requests.Session()
-        retry_strategy = Retry(
-            total=self.max_retries,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        adapter = HTTPAdapter(max_retries=0, pool_maxsize=max(10, self.max_workers))
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         session.headers.update({
@@ -148,11 +263,16 @@ class MacCMSCollector:
         separator = '&' if '?' in self.base_url else '?'
         return f"{self.base_url}{separator}{param_str}"
     
-    def fetch_data(self, **kwargs):
+    def fetch_data(self, max_attempts=None, max_age=None, **kwargs):
         """
         获取数据
         
+        失败时按重试策略抖动退避后重试，总时长不超过截止时间，
+        并受任务级重试预算限制
+        
         Args:
+            max_attempts: 最大尝试次数，默认使用重试策略的设置
+            max_age: 响应缓存的有效期（秒），有效期内直接使用缓存，不请求资源站
             **kwargs: URL参数
             
         Returns:
@@ -175,10 +295,13 @@ class MacCMSCollector:
         if self.wd:
             print(f"[采集器调试] 搜索关键词(wd): {self.wd}")
         
-        for attempt in range(self.max_retries):
+        policy = self.retry_policy
+        attempts = max_attempts or policy.max_attempts
+        deadline = time.time() + policy.deadline
+        last_error = '请求失败'
+        for attempt in range(attempts):
             try:
-                response = self.session.get(url, timeout=self.timeout, verify=False)
-                response.raise_for_status()
+                response = self._get(url, deadline, max_age)
                 response.encoding = 'utf-8'
                 
                 # 调试日志：输出响应状态和内容长度
@@ -187,21 +310,266 @@ class MacCMSCollector:
                 print(f"[采集器调试] 响应前200字符: {response.text[:200]}")
                 
                 # 根据格式解析
-                if self.at == 'xml':
-                    return self._parse_xml(response.text, url)
-                else:
-                    return self._parse_json(response.text, url)
+                return self._parse_response(response.text, url)
                     
+            except CircuitOpenError as e:
+                return self._circuit_opened(e)
+            except CollectStopped:
+                # 手动停止：与异步引擎一致，按正常停止处理，不记为熔断
+                return {'code': 0, 'msg': '采集已停止'}
             except Exception as e:
-                error_msg = f"请求失败 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}"
-                print(error_msg)
-                if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    self.errors.append(f"请求失败: {url}, 错误: {str(e)}")
-                    return {'code': 0, 'msg': str(e)}
+                last_error = str(e) or e.__class__.__name__
+                print(f"请求失败 (尝试 {attempt + 1}/{attempts}): {last_error}")
+                if attempt + 1 >= attempts or self.should_stop:
+                    break
+                delay = policy.backoff(attempt)
+                if time.time() + delay >= deadline:
+                    print("已到请求截止时间，不再重试")
+                    break
+                if not policy.try_spend():
+                    print("任务重试预算已用完，不再重试")
+                    break
+                self._sleep(delay)
         
-        return {'code': 0, 'msg': '请求失败'}
+        self.errors.append(f"请求失败: {url}, 错误: {last_error}")
+        return {'code': 0, 'msg': last_error}
+    
+    def _get(self, url, deadline=None, max_age=None):
+        """
+        发送GET请求
+
+        采集源熔断时不发送请求，直接抛出 CircuitOpenError（等待探测结果时被停止则抛出 CollectStopped）；
+        配置了镜像时发往最优的镜像，启用对冲请求时可能再请求次优镜像；
+        有缓存时发送条件请求，资源站返回 304 时使用缓存内容
+
+        Args:
+            url: 请求URL（主接口地址）
+            deadline: 截止时间戳，读取超时不超过剩余时间
+            max_age: 缓存有效期（秒），有效期内不发送请求
+        """
+        cache = self.http_cache
+        entry = cache.get(url) if cache is not None else None
+        if entry is not None and cache.is_fresh(entry, max_age):
+            cache.hit(url, entry)
+            return CachedResponse(entry['text'])
+        headers = cache.conditional_headers(entry) if entry is not None else None
+        targets = self._mirror_targets()
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.before_request(lambda: self.should_stop)
+        self._wait_rate_limit(self._mirror_url(url, targets[0]))
+        self.retry_policy.record_request()
+        read_timeout = self.timeout
+        if deadline is not None:
+            read_timeout = max(1.0, min(read_timeout, deadline - time.time()))
+        timeout = (self.connect_timeout, read_timeout)
+        try:
+            response = self._request_limited(url, targets, timeout, headers)
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure(e)
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        if cache is not None:
+            if response.status_code == 304 and entry is not None:
+                cache.hit(url, entry, revalidated=True)
+                return CachedResponse(entry['text'])
+            response.encoding = 'utf-8'
+            cache.store(url, response.headers, response.text, keep=bool(max_age))
+        return response
+
+    def _request_limited(self, url, targets, timeout, headers=None):
+        """启用自适应并发时先占用并发额度，请求结束后把耗时和结果反馈给控制器"""
+        controller = self.controller
+        if controller is None:
+            return self._request(url, targets, timeout, headers)
+        controller.acquire(lambda: self.should_stop)
+        start = time.time()
+        outcome = 'error'
+        try:
+            response = self._request(url, targets, timeout, headers)
+            outcome = 'ok'
+            return response
+        except Exception as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            controller.release(time.time() - start, outcome)
+
+    def _mirror_targets(self):
+        """
+        本次请求使用的接口地址
+
+        Returns:
+            list: 最优镜像；启用对冲请求且延迟样本足够时为最优和次优两个镜像
+        """
+        if self.mirrors is None:
+            return [self.base_url]
+        ranked = self.mirrors.rank()
+        if self.hedge and len(ranked) > 1 and self.mirrors.hedge_delay() is not None:
+            return ranked[:2]
+        return ranked[:1]
+
+    def _mirror_url(self, url, mirror):
+        """把主接口地址的请求URL换成镜像地址"""
+        if mirror == self.base_url or not url.startswith(self.base_url):
+            return url
+        return mirror + url[len(self.base_url):]
+
+    def _request(self, url, targets, timeout, headers=None):
+        """向一个镜像请求，或在两个镜像之间对冲请求"""
+        if len(targets) == 1:
+            return self._request_mirror(url, targets[0], timeout, headers)
+        return self._request_hedged(url, targets, timeout, headers)
+
+    def _request_mirror(self, url, mirror, timeout, headers=None):
+        """向指定镜像发送请求，并记录该镜像的延迟和健康状况"""
+        start = time.time()
+        try:
+            response = self.session.get(
+                self._mirror_url(url, mirror), timeout=timeout, verify=False, headers=headers
+            )
+            response.raise_for_status()
+        except Exception:
+            if self.mirrors is not None:
+                self.mirrors.record(mirror, ok=False)
+            raise
+        if self.mirrors is not None:
+            self.mirrors.record(mirror, time.time() - start)
+        return response
+
+    def _request_hedged(self, url, targets, timeout, headers=None):
+        """
+        对冲请求
+
+        主请求超过近期 p95 延迟仍未返回（或已经失败）时，向次优镜像发送相同的请求，
+        取先成功返回的结果；落后的请求在后台自然结束
+        """
+        pool = self._get_hedge_pool()
+        first = pool.submit(self._request_mirror, url, targets[0], timeout, headers)
+        done, _ = wait([first], timeout=self.mirrors.hedge_delay())
+        if done and first.exception() is None:
+            return first.result()
+        self._wait_rate_limit(self._mirror_url(url, targets[1]))
+        self.mirrors.record_hedge()
+        second = pool.submit(self._request_mirror, url, targets[1], timeout, headers)
+        error = None
+        for future in as_completed([first, second]):
+            try:
+                response = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if future is second:
+                self.mirrors.record_hedge(won=True)
+            return response
+        raise error
+
+    def _get_hedge_pool(self):
+        """对冲请求使用的线程池（每个请求最多占用两个线程）"""
+        with self.count_lock:
+            if self.hedge_pool is None:
+                self.hedge_pool = ThreadPoolExecutor(max_workers=2 * max(self.max_workers, self.max_concurrency))
+            return self.hedge_pool
+
+    def _circuit_opened(self, error):
+        """
+        采集源熔断：停止本次采集（可稍后从断点继续），只记录一次错误
+
+        Returns:
+            dict: 失败结果
+        """
+        with self.count_lock:
+            first = not self.circuit_open
+            self.circuit_open = True
+        if first:
+            self.should_stop = True
+            self.errors.append(str(error))
+            print(f"采集源熔断，停止采集: {error}")
+            SystemLog.log(
+                log_type='collect',
+                level='warning',
+                module='maccms_collector',
+                message='采集源熔断，停止采集',
+                details=json.dumps({
+                    'url': self.base_url,
+                    'source_id': self.source_id,
+                    'error': str(error)
+                }, ensure_ascii=False)
+            )
+        return {'code': 0, 'msg': str(error)}
+
+    def _wait_rate_limit(self, url):
+        """按主机限速等待"""
+        self._sleep(rate_limiter.reserve(url))
+
+    def _sleep(self, seconds):
+        """可被停止信号打断的等待"""
+        deadline = time.time() + seconds
+        while seconds > 0 and not self.should_stop:
+            time.sleep(min(seconds, 0.5))
+            seconds = deadline - time.time()
+
+    def apply_source_settings(self, source=None, direct=False):
+        """
+        按应用和采集源配置设置响应缓存、主机限速、镜像和熔断器（需在应用上下文中调用）
+
+        每个镜像是独立的主机，各自按采集源配置的速率限速
+
+        Args:
+            source: CollectSource实例，默认按 source_id 或接口URL查找
+            direct: 只请求输入的地址，不分配到镜像，也不经过熔断器（接口测试）
+        """
+        config = current_app.config
+        if config.get('COLLECTOR_HTTP_CACHE', True):
+            http_cache.configure(
+                config.get('COLLECTOR_HTTP_CACHE_DIR', 'instance/http_cache'),
+                config.get('COLLECTOR_HTTP_CACHE_SIZE', 200 * 1024 * 1024)
+            )
+            self.http_cache = http_cache
+            self.category_cache_ttl = config.get('COLLECTOR_CATEGORY_CACHE_TTL', 600)
+        if source is None:
+            if self.source_id:
+                source = db.session.get(CollectSource, self.source_id)
+            else:
+                source = CollectSource.query.filter(
+                    CollectSource.url.in_([self.base_url, self.base_url + '/'])
+                ).first()
+        if source is None:
+            return
+        urls = source.get_mirror_urls()
+        if self.base_url not in urls:
+            urls.insert(0, self.base_url)
+        for url in urls:
+            rate_limiter.configure(url, source.rate_limit or 0, source.rate_burst or None)
+        mirrors = mirror_registry.configure(self.base_url, urls)
+        if not direct:
+            self.mirrors = mirrors
+            self.breaker = breakers.get(
+                source,
+                config.get('COLLECTOR_BREAKER_THRESHOLD', 10),
+                config.get('COLLECTOR_BREAKER_COOLDOWN', 300)
+            )
+
+    def _parse_response(self, text, url):
+        """根据返回格式解析响应文本"""
+        if self.spool is not None:
+            # 解析前先暂存，解析或入库失败时仍可离线重放
+            try:
+                self.spool.write(url, text, self.at)
+            except Exception as e:
+                print(f"写入暂存文件失败，停止暂存: {str(e)}")
+                self.errors.append(f"写入暂存文件失败: {str(e)}")
+                self.spool = None
+        if self.at == 'xml':
+            result = self._parse_xml(text, url)
+        else:
+            result = self._parse_json(text, url)
+        if result.get('code') != 1 and self.http_cache is not None:
+            # 不缓存错误响应，下次重新请求
+            self.http_cache.invalidate(url)
+        return result
     
     def _parse_json(self, text, url):
         """解析JSON响应"""
@@ -211,7 +579,7 @@ class MacCMSCollector:
                 print(f"[采集器调试] 警告：收到空响应！")
                 return {'code': 0, 'msg': '响应内容为空'}
             
-            data = json.loads(text)
+            data = parsers.loads_json(text)
             
             # 调试日志：输出解析后的数据结构
             print(f"[采集器调试] JSON解析成功")
@@ -252,88 +620,25 @@ class MacCMSCollector:
             return {'code': 0, 'msg': f'JSON解析失败: {str(e)}'}
     
     def _parse_xml(self, text, url):
-        """解析XML响应"""
+        """解析XML响应（lxml流式解析，未安装lxml时使用标准库）"""
         try:
-            root = ET.fromstring(text)
-            
-            # 解析分页信息
-            list_elem = root.find('list')
-            page_info = {
-                'page': int(list_elem.get('page', 1)),
-                'pagecount': int(list_elem.get('pagecount', 1)),
-                'pagesize': int(list_elem.get('pagesize', 20)),
-                'recordcount': int(list_elem.get('recordcount', 0)),
-            }
-            
-            # 解析视频列表
-            videos = []
-            for video_elem in list_elem.findall('video'):
-                video = {}
-                
-                # 基本字段
-                video['vod_id'] = self._get_xml_text(video_elem, 'id')
-                video['type_id'] = self._get_xml_text(video_elem, 'tid')
-                video['vod_name'] = self._get_xml_text(video_elem, 'name')
-                video['type_name'] = self._get_xml_text(video_elem, 'type')
-                video['vod_pic'] = self._get_xml_text(video_elem, 'pic')
-                video['vod_lang'] = self._get_xml_text(video_elem, 'lang')
-                video['vod_area'] = self._get_xml_text(video_elem, 'area')
-                video['vod_year'] = self._get_xml_text(video_elem, 'year')
-                video['vod_remarks'] = self._get_xml_text(video_elem, 'note')
-                video['vod_actor'] = self._get_xml_text(video_elem, 'actor')
-                video['vod_director'] = self._get_xml_text(video_elem, 'director')
-                video['vod_content'] = self._get_xml_text(video_elem, 'des')
-                video['vod_time'] = self._get_xml_text(video_elem, 'last')
-                
-                # 解析播放数据
-                dl_elem = video_elem.find('dl')
-                if dl_elem is not None:
-                    play_from = []
-                    play_url = []
-                    for dd in dl_elem.findall('dd'):
-                        flag = dd.get('flag', '')
-                        urls = dd.text or ''
-                        play_from.append(flag)
-                        play_url.append(urls)
-                    
-                    video['vod_play_from'] = '$$$'.join(play_from)
-                    video['vod_play_url'] = '$$$'.join(play_url)
-                
-                videos.append(video)
-            
-            # 解析分类列表
-            classes = []
-            class_elem = root.find('class')
-            if class_elem is not None:
-                for ty in class_elem.findall('ty'):
-                    classes.append({
-                        'type_id': ty.get('id', ''),
-                        'type_name': ty.text or ''
-                    })
-            
+            data = parsers.parse_xml(text)
             return {
                 'code': 1,
                 'msg': 'xml',
-                'page': page_info['page'],
-                'pagecount': page_info['pagecount'],
-                'limit': page_info['pagesize'],
-                'total': page_info['recordcount'],
-                'list': videos,
-                'class': classes,
+                'page': data['page'],
+                'pagecount': data['pagecount'],
+                'limit': data['pagesize'],
+                'total': data['recordcount'],
+                'list': data['list'],
+                'class': data['class'],
                 'url': url
             }
             
-        except ET.ParseError as e:
+        except parsers.XML_ERRORS as e:
             self.errors.append(f"XML解析失败: {url}, 错误: {str(e)}")
             return {'code': 0, 'msg': f'XML解析失败: {str(e)}'}
     
-    def _get_xml_text(self, element, tag):
-        """安全获取XML元素文本"""
-        elem = element.find(tag)
-        if elem is not None:
-            return elem.text or ''
-        return ''
-    
     def get_categories(self):
         """
         获取分类列表
@@ -341,7 +646,7 @@ class MacCMSCollector:
         Returns:
             list: 分类列表 [{'type_id': '', 'type_name': ''}, ...]
         """
-        result = self.fetch_data(ac='list', pg=1)
+        result = self.fetch_data(ac='list', pg=1, max_age=self.category_cache_ttl)
         if result['code'] == 1:
             return result.get('class', [])
         return []
@@ -377,52 +682,52 @@ class MacCMSCollector:
                             'page': getattr(self, 'current_page', None)
                         }, ensure_ascii=False)
                     )
-                    return 'failed', '视频名称为空'
-                existing = Video.query.filter_by(vod_name=vod_name).first()
-                # 处理vod_id字段（Video模型要求必填）
-                if 'vod_id' not in video_data or not video_data['vod_id']:
-                    # 如果没有vod_id，使用名称hash值作为vod_id
-                    video_data['vod_id'] = abs(hash(vod_name)) % (10 ** 8)
-                # 处理分类ID绑定
-                remote_type_id = str(video_data.get('type_id', ''))
-                local_type_id = self.type_bind.get(remote_type_id, remote_type_id)
-                if local_type_id:
-                    video_data['type_id'] = local_type_id
-                # 处理分类名称（Video模型使用type_name字段显示分类）
-                # 优先使用API返回的type_name，如果没有则保持原样
-                if 'type_name' in video_data and video_data['type_name']:
-                    pass
-                elif 'type_id' in video_data:
-                    video_data['type_name'] = video_data.get('type_name', '未分类')
-                # 清理播放URL（保留纯URL）
-                if 'vod_play_url' in video_data:
-                    video_data['vod_play_url'] = self._clean_play_urls(video_data['vod_play_url'])
-                # 过滤掉Video模型不存在的字段
-                valid_fields = {
-                    'vod_id', 'type_id', 'type_id_1', 'group_id', 'type_name', 'vod_name', 'vod_sub', 'vod_en',
-                    'vod_status', 'vod_letter', 'vod_color', 'vod_tag', 'vod_class', 'vod_pic',
-                    'vod_pic_thumb', 'vod_pic_slide', 'vod_actor', 'vod_director', 'vod_writer',
-                    'vod_behind', 'vod_blurb', 'vod_remarks', 'vod_pubdate', 'vod_total', 'vod_serial',
-                    'vod_tv', 'vod_weekday', 'vod_area', 'vod_lang', 'vod_year', 'vod_version',
-                    'vod_state', 'vod_author', 'vod_jumpurl', 'vod_tpl', 'vod_tpl_play', 'vod_tpl_down',
-                    'vod_isend', 'vod_lock', 'vod_level', 'vod_points_play', 'vod_points_down',
-                    'vod_hits', 'vod_hits_day', 'vod_hits_week', 'vod_hits_month', 'vod_duration',
-                    'vod_up', 'vod_down', 'vod_score', 'vod_score_all', 'vod_score_num',
-                    'vod_time', 'vod_time_add', 'vod_time_hits', 'vod_time_make', 'vod_trysee',
-                    'vod_douban_id', 'vod_douban_score', 'vod_reurl', 'vod_rel_vod', 'vod_rel_art',
-                    'vod_content', 'vod_play_from', 'vod_play_server', 'vod_play_note', 'vod_play_url',
-                    'vod_down_from', 'vod_down_server', 'vod_down_note', 'vod_down_url',
-                    'vod_pwd', 'vod_pwd_url', 'vod_pwd_play', 'vod_pwd_play_url', 'vod_pwd_down'
-                }
-                filtered_data = {k: v for k, v in video_data.items() if k in valid_fields}
+                    return 'failed', EMPTY_NAME_MSG
+                remote_vod_id = self._remote_vod_id(video_data)
+                title_key = Video.make_title_key(vod_name)
+                identity = {}
+                if self.source_id is not None and remote_vod_id:
+                    identity = {'source_id': self.source_id, 'remote_vod_id': remote_vod_id}
+                existing = self._find_existing(title_key, vod_name, identity)
+                filtered_data = self._normalize_video_data(video_data)
+                content_hash = self._content_digest(filtered_data)
                 if existing:
+                    if update_existing and existing.content_hash == content_hash:
+                        # 采集数据与上次写入时一致，不再重写大字段和updated_at
+                        with self.count_lock:
+                            self._track_vod_time(video_data)
+                            self.skip_count += 1
+                            self.unchanged_count += 1
+                            self.consecutive_duplicates += 1
+                        SystemLog.log(
+                            log_type='collect',
+                            level='info',
+                            module='maccms_collector',
+                            message='视频未变化',
+                            details=json.dumps({
+                                'vod_name': vod_name,
+                                'vod_id': video_data.get('vod_id', ''),
+                                'type_id': video_data.get('type_id', ''),
+                                'type_name': video_data.get('type_name', ''),
+                                'result': 'skip-unchanged',
+                                'page': getattr(self, 'current_page', None)
+                            }, ensure_ascii=False)
+                        )
+                        return 'skip', f'视频未变化: {vod_name}'
                     if update_existing:
                         # 更新现有视频
                         for key, value in filtered_data.items():
                             if key != 'vod_id' and hasattr(existing, key) and value:
                                 setattr(existing, key, value)
+                        existing.content_hash = content_hash
+                        if existing.source_id is None and identity:
+                            # 没有采集身份的旧视频顺带补全身份
+                            existing.source_id = identity['source_id']
+                            existing.remote_vod_id = identity['remote_vod_id']
                         db.session.commit()
+                        self._register_model(existing)
                         with self.count_lock:
+                            self._track_vod_time(video_data)
                             self.skip_count += 1
                             self.consecutive_duplicates += 1
                         SystemLog.log(
@@ -442,6 +747,7 @@ class MacCMSCollector:
                         return 'skip', f'更新视频: {vod_name}'
                     else:
                         with self.count_lock:
+                            self._track_vod_time(video_data)
                             self.skip_count += 1
                             self.consecutive_duplicates += 1
                         SystemLog.log(
@@ -461,10 +767,20 @@ class MacCMSCollector:
                         return 'skip', f'跳过已存在视频: {vod_name}'
                 else:
                     # 创建新视频
-                    video = Video(**filtered_data)
+                    candidates = [
+                        c for c in (self._to_int(remote_vod_id), self._stable_vod_id(title_key)) if isinstance(c, int)
+                    ]
+                    if self.dedup_index is not None:
+                        taken = self.dedup_index.taken_vod_ids(candidates)
+                    else:
+                        taken = self._lookup_existing_vod_ids(candidates)
+                    filtered_data['vod_id'] = self._assign_vod_id(remote_vod_id, title_key, taken)
+                    video = Video(**filtered_data, content_hash=content_hash, **identity)
                     db.session.add(video)
                     db.session.commit()
+                    self._register_model(video)
                     with self.count_lock:
+                        self._track_vod_time(video_data)
                         self.success_count += 1
                         self.consecutive_duplicates = 0  # 重置连续重复计数
                     # 只在控制台打印前3个，但日志记录所有
@@ -530,7 +846,534 @@ class MacCMSCollector:
                 }, ensure_ascii=False)
             )
             return 'failed', error_msg
-    
+
+    def _find_existing(self, title_key, vod_name, identity):
+        """
+        查找已存在的视频：先按采集身份，再按标准化名称（升级前入库的视频按原名称）
+
+        Returns:
+            Video: 已存在的视频，没有时为None
+        """
+        if identity:
+            existing = Video.query.filter_by(**identity).first()
+            if existing is not None:
+                return existing
+        return Video.query.filter(
+            or_(Video.title_key == title_key, Video.vod_name == vod_name)
+        ).order_by(Video.id).first()
+
+    def _register_model(self, video):
+        """逐条保存提交后把视频登记到去重索引（批量入库失败退回逐条保存时保持索引与数据库一致）"""
+        if self.dedup_index is None:
+            return
+        self._register_video({
+            'vod_id': video.vod_id, 'vod_name': video.vod_name, 'title_key': video.title_key,
+            'source_id': video.source_id, 'remote_vod_id': video.remote_vod_id, 'vod_time': video.vod_time,
+        })
+        if video.content_hash:
+            self.dedup_index.update_hashes({video.vod_id: video.content_hash})
+
+    def _track_vod_time(self, video_data):
+        """
+        记录已入库视频的最大vod_time，用于推进采集源高水位（调用方需持有count_lock）
+
+        Args:
+            video_data: 已写入（或已存在）的视频数据
+        """
+        vod_time = str(video_data.get('vod_time') or '')
+        if vod_time > self.max_vod_time:
+            self.max_vod_time = vod_time
+
+    def _normalize_video_data(self, video_data):
+        """
+        标准化采集数据（补全vod_id、分类绑定、清理播放地址）并过滤无效字段
+
+        Args:
+            video_data: 视频数据字典（会被原地修改）
+
+        Returns:
+            dict: 仅包含Video模型字段的数据
+        """
+        vod_name = video_data.get('vod_name', '').strip()
+        # 处理vod_id字段（Video模型要求必填）
+        if 'vod_id' not in video_data or not video_data['vod_id']:
+            # 如果没有vod_id，使用标准化名称的摘要作为vod_id（跨进程稳定）
+            video_data['vod_id'] = self._stable_vod_id(Video.make_title_key(vod_name))
+        # 处理分类ID绑定
+        remote_type_id = str(video_data.get('type_id', ''))
+        local_type_id = self.type_bind.get(remote_type_id, remote_type_id)
+        if local_type_id:
+            video_data['type_id'] = local_type_id
+        # 处理分类名称（Video模型使用type_name字段显示分类）
+        # 优先使用API返回的type_name，如果没有则保持原样
+        if 'type_name' in video_data and video_data['type_name']:
+            pass
+        elif 'type_id' in video_data:
+            video_data['type_name'] = video_data.get('type_name', '未分类')
+        # 清理播放URL（保留纯URL）
+        if 'vod_play_url' in video_data:
+            video_data['vod_play_url'] = self._clean_play_urls(video_data['vod_play_url'])
+        # 过滤掉Video模型不存在的字段
+        return {k: v for k, v in video_data.items() if k in VIDEO_FIELDS}
+
+    def _build_video_log(self, level, message, video_data, result, page, error=None):
+        """构建单个视频的采集日志对象（不提交，由调用方统一提交）"""
+        details = {
+            'vod_name': video_data.get('vod_name', ''),
+            'vod_id': video_data.get('vod_id', ''),
+            'type_id': video_data.get('type_id', ''),
+            'type_name': video_data.get('type_name', ''),
+            'result': result,
+        }
+        if error is not None:
+            details['error'] = error
+        details['page'] = page
+        return SystemLog(
+            log_type='collect',
+            level=level,
+            module='maccms_collector',
+            message=message,
+            details=json.dumps(details, ensure_ascii=False)
+        )
+
+    def save_videos(self, videos, update_existing=True, page=None):
+        """
+        批量保存一页视频
+
+        整批数据只查询一次已存在记录，在一个事务内通过
+        INSERT ... ON CONFLICT 写入视频和采集日志。
+        计数器与连续重复的语义与逐条调用 save_video 一致。
+        批量写入失败时回滚并退回逐条保存。
+
+        Args:
+            videos: 视频数据字典列表
+            update_existing: 是否更新已存在的视频
+            page: 所属页码（写入日志）
+
+        Returns:
+            list: 与videos一一对应的 (status, message) 列表
+        """
+        if page is None:
+            page = getattr(self, 'current_page', None)
+        return self.save_pages([(page, videos)], update_existing)[0]
+
+    def save_pages(self, pages, update_existing=True):
+        """
+        在一个事务内批量保存多页视频
+
+        Args:
+            pages: [(page, videos), ...]，按处理顺序排列
+            update_existing: 是否更新已存在的视频
+
+        Returns:
+            list: 每页对应的 (status, message) 列表；
+                达到连续重复阈值时只写入到触发停止的那一页，之后的页不返回
+        """
+        items = [(video_data, page) for page, videos in pages for video_data in videos]
+
+        with self.db_lock:
+            try:
+                statuses, rows, logs, unchanged = self._plan_batch(items, update_existing)
+                cutoff = self._duplicate_cutoff(pages, statuses)
+                if cutoff < len(pages):
+                    # 与逐页写入一致：触发连续重复停止的页之后不再写入
+                    pages = pages[:cutoff]
+                    items = [(video_data, page) for page, videos in pages for video_data in videos]
+                    statuses, rows, logs, unchanged = self._plan_batch(items, update_existing)
+                if rows:
+                    self._execute_upsert(rows, update_existing)
+                db.session.add_all(logs)
+                db.session.commit()
+                if self.dedup_index is not None:
+                    for row in rows:
+                        self._register_video(row)
+                    self.dedup_index.update_hashes({row['vod_id']: row['content_hash'] for row in rows})
+            except Exception as e:
+                db.session.rollback()
+                print(f"批量入库失败，退回逐条保存: {str(e)}")
+                statuses = None
+
+        if statuses is None:
+            results = []
+            for page, videos in pages:
+                self.current_page = page
+                results.append([self.save_video(video_data, update_existing) for video_data in videos])
+            return results
+
+        # 按原始顺序更新计数器，保证连续重复计数与逐条保存一致
+        with self.count_lock:
+            self.unchanged_count += unchanged
+            for (video_data, _), (status, msg) in zip(items, statuses):
+                if status in ('success', 'skip'):
+                    self._track_vod_time(video_data)
+                if status == 'success':
+                    self.success_count += 1
+                    self.consecutive_duplicates = 0
+                    if self.success_count <= 3:
+                        print(msg)
+                elif status == 'skip':
+                    self.skip_count += 1
+                    self.consecutive_duplicates += 1
+                elif msg != EMPTY_NAME_MSG:
+                    # 名称为空的视频只记录日志，不计入失败数（与save_video一致）
+                    self.failed_count += 1
+                    self.errors.append(msg)
+
+        results = []
+        offset = 0
+        for _, videos in pages:
+            results.append(statuses[offset:offset + len(videos)])
+            offset += len(videos)
+        return results
+
+    def _duplicate_cutoff(self, pages, statuses):
+        """
+        按顺序模拟连续重复计数，返回应写入的页数（写到第一次达到阈值的那一页为止）
+        """
+        if not self.stop_on_duplicates:
+            return len(pages)
+        with self.count_lock:
+            count = self.consecutive_duplicates
+        offset = 0
+        for index, (_, videos) in enumerate(pages):
+            for status, _ in statuses[offset:offset + len(videos)]:
+                if status == 'success':
+                    count = 0
+                elif status == 'skip':
+                    count += 1
+            offset += len(videos)
+            if count >= self.max_consecutive_duplicates:
+                return index + 1
+        return len(pages)
+
+    def _plan_batch(self, items, update_existing):
+        """
+        规划一批视频的写入
+
+        已存在的视频先按采集身份（采集源ID + 远程vod_id）查找，再按标准化名称查找；
+        新视频优先使用远程vod_id作为本地vod_id，已被占用时（例如其他采集源的同号视频）
+        改用标准化名称的摘要，仍被占用时分配新的vod_id，不再因vod_id冲突入库失败
+
+        Args:
+            items: [(video_data, page), ...]
+            update_existing: 是否更新已存在的视频
+
+        Returns:
+            tuple: (statuses, rows, logs, unchanged)
+                statuses: 每个视频的 (status, message)
+                rows: 需要执行upsert的数据行（含content_hash、title_key和采集身份）
+                logs: 待提交的日志对象
+                unchanged: 数据未变化、跳过写入的视频数
+        """
+        source_id = self.source_id
+        prepared = []
+        for video_data, page in items:
+            data = dict(video_data)
+            vod_name = data.get('vod_name', '').strip()
+            # 标准化会补全缺失的vod_id，先记录资源站返回的原始值
+            remote_vod_id = self._remote_vod_id(data)
+            filtered = self._normalize_video_data(data) if vod_name else None
+            title_key = Video.make_title_key(vod_name) if vod_name else ''
+            prepared.append((vod_name, title_key, remote_vod_id, data, filtered, page))
+
+        remotes = {remote for name, _, remote, _, _, _ in prepared if name and remote}
+        titles = {key: name for name, key, _, _, _, _ in prepared if name}
+        candidates = set()
+        for name, key, remote, _, _, _ in prepared:
+            if name:
+                candidates.update(
+                    c for c in (self._to_int(remote), self._stable_vod_id(key)) if isinstance(c, int)
+                )
+        if self.dedup_index is not None:
+            by_identity = self.dedup_index.lookup_identities(source_id, remotes) if source_id is not None else {}
+            by_title = self.dedup_index.lookup_titles(titles.keys())
+            taken = self.dedup_index.taken_vod_ids(candidates)
+        else:
+            by_identity = self._lookup_identities(source_id, remotes) if source_id is not None else {}
+            by_title = self._lookup_titles(titles)
+            taken = self._lookup_existing_vod_ids(candidates)
+        known_hashes = {}
+        if update_existing:
+            existing_ids = set(by_identity.values()) | set(by_title.values())
+            if self.dedup_index is not None:
+                known_hashes = self.dedup_index.lookup_hashes(existing_ids)
+            else:
+                known_hashes = self._lookup_content_hashes(existing_ids)
+
+        statuses = []
+        logs = []
+        rows_by_vod_id = {}
+        unchanged = 0
+        for vod_name, title_key, remote_vod_id, data, filtered, page in prepared:
+            if not vod_name:
+                logs.append(self._build_video_log('error', '采集失败: 视频名称为空', data, 'failed', page))
+                statuses.append(('failed', EMPTY_NAME_MSG))
+                continue
+
+            content_hash = self._content_digest(filtered)
+            identity = {}
+            if source_id is not None and remote_vod_id:
+                identity = {'source_id': source_id, 'remote_vod_id': remote_vod_id}
+            vod_id = by_identity.get(remote_vod_id) if identity else None
+            if vod_id is None:
+                vod_id = by_title.get(title_key)
+            if vod_id is not None:
+                if identity:
+                    by_identity.setdefault(remote_vod_id, vod_id)
+                if update_existing and known_hashes.get(vod_id) == content_hash:
+                    # 采集数据与上次写入时一致，不再重写大字段和updated_at
+                    unchanged += 1
+                    logs.append(self._build_video_log('info', '视频未变化', data, 'skip-unchanged', page))
+                    statuses.append(('skip', f'视频未变化: {vod_name}'))
+                elif update_existing:
+                    row = rows_by_vod_id.get(vod_id)
+                    if row is None:
+                        # 没有采集身份的旧视频顺带补全身份（写入时只填充空值）
+                        row = dict(filtered, vod_id=vod_id, title_key=title_key, **identity)
+                        rows_by_vod_id[vod_id] = row
+                    else:
+                        # 同一批内重复出现的视频，按逐条更新的规则合并非空字段
+                        row.update({k: v for k, v in filtered.items() if k != 'vod_id' and v})
+                        row['title_key'] = title_key
+                        for key, value in identity.items():
+                            row.setdefault(key, value)
+                    row['content_hash'] = content_hash
+                    known_hashes[vod_id] = content_hash
+                    logs.append(self._build_video_log('info', '更新已存在视频', data, 'skip-update', page))
+                    statuses.append(('skip', f'更新视频: {vod_name}'))
+                else:
+                    logs.append(self._build_video_log('info', '跳过已存在视频', data, 'skip', page))
+                    statuses.append(('skip', f'跳过已存在视频: {vod_name}'))
+                continue
+
+            vod_id = self._assign_vod_id(remote_vod_id, title_key, taken)
+            taken.add(vod_id)
+            by_title[title_key] = vod_id
+            if identity:
+                by_identity[remote_vod_id] = vod_id
+            known_hashes[vod_id] = content_hash
+            rows_by_vod_id[vod_id] = dict(
+                filtered, vod_id=vod_id, content_hash=content_hash, title_key=title_key, **identity
+            )
+            logs.append(self._build_video_log('info', '新增视频成功', data, 'success', page))
+            statuses.append(('success', f'新增视频: {vod_name}'))
+
+        return statuses, list(rows_by_vod_id.values()), logs, unchanged
+
+    @staticmethod
+    def _remote_vod_id(video_data):
+        """资源站返回的vod_id（字符串），没有时为None"""
+        remote_vod_id = str(video_data.get('vod_id') or '').strip()
+        return remote_vod_id[:64] or None
+
+    @staticmethod
+    def _stable_vod_id(title_key):
+        """按标准化名称计算稳定的vod_id（与进程和PYTHONHASHSEED无关）"""
+        digest = hashlib.sha1(title_key.encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) % (10 ** 8) or 1
+
+    def _assign_vod_id(self, remote_vod_id, title_key, taken):
+        """
+        为新视频分配本地vod_id
+
+        依次尝试远程vod_id、标准化名称的摘要，都已被占用时分配大于库中所有vod_id的新值
+
+        Args:
+            remote_vod_id: 资源站返回的vod_id
+            title_key: 标准化名称
+            taken: 已被占用的候选vod_id（含本批已分配的）
+
+        Returns:
+            int: 本地vod_id
+        """
+        for candidate in (self._to_int(remote_vod_id), self._stable_vod_id(title_key)):
+            if isinstance(candidate, int) and candidate > 0 and candidate not in taken:
+                return candidate
+        if self.dedup_index is not None:
+            vod_id = self.dedup_index.allocate_vod_id()
+            while vod_id in taken:
+                vod_id = self.dedup_index.allocate_vod_id()
+            return vod_id
+        vod_id = (db.session.query(func.max(Video.vod_id)).scalar() or 0) + 1
+        while vod_id in taken:
+            vod_id += 1
+        return vod_id
+
+    def _register_video(self, row):
+        """事务提交后把写入的视频登记到去重索引"""
+        self.dedup_index.add(
+            row['vod_id'], row.get('vod_name', ''), row.get('title_key', ''),
+            row.get('source_id'), row.get('remote_vod_id'), row.get('vod_time')
+        )
+
+    def _lookup_identities(self, source_id, remote_vod_ids):
+        """批量按采集身份查询已存在的视频，返回 {remote_vod_id: vod_id}"""
+        found = {}
+        remote_vod_ids = list(remote_vod_ids)
+        for i in range(0, len(remote_vod_ids), LOOKUP_CHUNK_SIZE):
+            chunk = remote_vod_ids[i:i + LOOKUP_CHUNK_SIZE]
+            query = db.session.query(Video.remote_vod_id, Video.vod_id).filter(
+                Video.source_id == source_id, Video.remote_vod_id.in_(chunk)
+            )
+            found.update(query)
+        return found
+
+    def _lookup_titles(self, titles):
+        """
+        批量按标准化名称查询已存在的视频
+
+        升级前入库的视频没有title_key，同时按原名称查询并现算标准化名称
+
+        Args:
+            titles: {title_key: vod_name}
+
+        Returns:
+            dict: {title_key: vod_id}
+        """
+        found = {}
+        keys = list(titles)
+        for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+            query = db.session.query(Video.vod_name, Video.title_key, Video.vod_id).filter(
+                or_(Video.title_key.in_(chunk), Video.vod_name.in_([titles[key] for key in chunk]))
+            ).order_by(Video.id)
+            for vod_name, title_key, vod_id in query:
+                found.setdefault(title_key or Video.make_title_key(vod_name), vod_id)
+        return {key: vod_id for key, vod_id in found.items() if key in titles}
+
+    def _lookup_content_hashes(self, vod_ids):
+        """批量查询已入库视频的数据摘要，返回 {vod_id: content_hash}"""
+        found = {}
+        vod_ids = list(vod_ids)
+        for i in range(0, len(vod_ids), LOOKUP_CHUNK_SIZE):
+            chunk = vod_ids[i:i + LOOKUP_CHUNK_SIZE]
+            query = db.session.query(Video.vod_id, Video.content_hash).filter(Video.vod_id.in_(chunk))
+            found.update((vod_id, content_hash) for vod_id, content_hash in query if content_hash)
+        return found
+
+    def _lookup_existing_vod_ids(self, vod_ids):
+        """批量查询已被占用的vod_id集合"""
+        taken = set()
+        vod_ids = [v for v in vod_ids if v is not None]
+        for i in range(0, len(vod_ids), LOOKUP_CHUNK_SIZE):
+            chunk = vod_ids[i:i + LOOKUP_CHUNK_SIZE]
+            taken.update(v for (v,) in db.session.query(Video.vod_id).filter(Video.vod_id.in_(chunk)))
+        return taken
+
+    @staticmethod
+    def _content_digest(filtered_data):
+        """计算标准化后采集数据的摘要（字段顺序无关）"""
+        payload = json.dumps(filtered_data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _to_int(value):
+        """尽量将vod_id转换为整数，便于比较"""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+
+    def _execute_upsert(self, rows, update_existing):
+        """
+        按数据库方言执行 INSERT ... ON CONFLICT(vod_id) 批量写入
+
+        更新时只覆盖非空字段，与逐条更新时 `if value` 的判断一致。
+        不支持upsert的数据库退回ORM逐条合并。
+        """
+        table = Video.__table__
+        dialect = db.session.get_bind().dialect.name
+
+        # 相同字段集合的行合并为一条executemany语句
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        for keys, group in groups.items():
+            if dialect in ('sqlite', 'postgresql'):
+                if dialect == 'sqlite':
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+                stmt = insert(table)
+                if update_existing:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[table.c.vod_id],
+                        set_=self._upsert_set(table, keys, stmt.excluded)
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=[table.c.vod_id])
+            elif dialect in ('mysql', 'mariadb'):
+                from sqlalchemy.dialects.mysql import insert
+                stmt = insert(table)
+                if update_existing:
+                    stmt = stmt.on_duplicate_key_update(self._upsert_set(table, keys, stmt.inserted))
+                else:
+                    stmt = stmt.prefix_with('IGNORE')
+            else:
+                for row in group:
+                    existing = Video.query.filter_by(vod_id=row['vod_id']).first()
+                    if existing is None:
+                        db.session.add(Video(**row))
+                    elif update_existing:
+                        for key, value in row.items():
+                            if key in IDENTITY_FIELDS and getattr(existing, key) is not None:
+                                continue
+                            if key != 'vod_id' and value:
+                                setattr(existing, key, value)
+                continue
+            db.session.execute(stmt, group)
+
+    @staticmethod
+    def _upsert_set(table, keys, incoming):
+        """构建冲突时的更新字段：新值为空则保留旧值，采集身份只填充空值"""
+        set_ = {}
+        for key in keys:
+            if key == 'vod_id':
+                continue
+            column = table.c[key]
+            if key in IDENTITY_FIELDS:
+                # 已有采集身份的视频保持首次采集的身份
+                set_[key] = func.coalesce(column, incoming[key])
+                continue
+            empty = '' if isinstance(column.type, db.String) else 0
+            set_[key] = func.coalesce(func.nullif(incoming[key], empty), column)
+        set_['updated_at'] = datetime.utcnow()
+        return set_
+
+    def _save_page_statuses(self, videos, update_existing, page):
+        """
+        保存一页视频，根据配置选择批量或逐条模式
+
+        Returns:
+            list: 每个视频的 (status, message)，停止采集时可能不完整
+        """
+        if self.batch_ingest:
+            if self.should_stop:
+                return []
+            return self.save_videos(videos, update_existing, page)
+        self.current_page = page
+        statuses = []
+        for video_data in videos:
+            if self.should_stop:
+                break
+            statuses.append(self.save_video(video_data, update_existing))
+        return statuses
+
+    def _save_page_videos(self, videos, update_existing, page):
+        """
+        保存一页视频
+
+        Returns:
+            tuple: (success, skip, failed)
+        """
+        statuses = [status for status, _ in self._save_page_statuses(videos, update_existing, page)]
+        return (
+            statuses.count('success'),
+            statuses.count('skip'),
+            len(statuses) - statuses.count('success') - statuses.count('skip')
+        )
+
     def _clean_play_urls(self, play_url):
         """
         清理播放URL，只保留纯URL
@@ -591,12 +1434,11 @@ class MacCMSCollector:
         result = self.fetch_data(pg=page)
         
         if result['code'] != 1:
+            with self.count_lock:
+                self.failed_pages += 1
             return {'success': 0, 'failed': 1, 'skip': 0, 'should_stop': False}
         
         videos = result.get('list', [])
-        page_success = 0
-        page_failed = 0
-        page_skip = 0
         
         # 在采集前检查是否应该停止
         with self.count_lock:
@@ -604,18 +1446,9 @@ class MacCMSCollector:
                 return {'success': 0, 'failed': 0, 'skip': 0, 'should_stop': True}
         
         # 保存视频
-        for video_data in videos:
-            if self.should_stop:
-                break
-            
-            status, msg = self.save_video(video_data, update_existing)
-            
-            if status == 'success':
-                page_success += 1
-            elif status == 'skip':
-                page_skip += 1
-            else:
-                page_failed += 1
+        page_success, page_skip, page_failed = self._save_page_videos(videos, update_existing, page)
+        if not self.should_stop:
+            self._mark_page_done(page)
         
         # 检查是否达到连续重复阈值
         should_stop = False
@@ -630,13 +1463,223 @@ class MacCMSCollector:
             'should_stop': should_stop
         }
     
-    def _collect_page_with_context(self, page, update_existing):
-        """在Flask应用上下文中采集单页"""
-        if self.app:
-            with self.app.app_context():
-                return self.collect_page(page, update_existing)
-        return self.collect_page(page, update_existing)
-    
+    def _fetch_to_writer(self, key, url_kwargs):
+        """采集线程：请求并解析一次，交给入库线程（不访问数据库）"""
+        if self.should_stop:
+            return
+        if 'pg' in url_kwargs:
+            self.current_page = url_kwargs['pg']
+        result = self.fetch_data(max_attempts=1, **url_kwargs)
+        self.writer.submit(key, self._defer_if_failed(key, url_kwargs, result))
+
+    def _defer_if_failed(self, key, url_kwargs, result):
+        """
+        请求失败的页放入稍后重试列表（不在采集线程中等待重试）
+
+        Returns:
+            dict: 原结果；已延后重试时标记 deferred，入库线程只推进顺序水位
+        """
+        if result.get('code') == 1 or not self.defer_failures or not self.retry_policy.try_spend():
+            return result
+        with self.count_lock:
+            self.retry_later.append((key, url_kwargs))
+        return dict(result, deferred=True)
+
+    def _collect_pages_pipeline(self, pages, update_existing):
+        """
+        生产者/消费者方式采集多页
+
+        采集线程请求解析后把整页数据放入有界队列，
+        入库线程按页码顺序取出写入（批量入库时多页一个事务）
+
+        Args:
+            pages: 待采集页码列表
+            update_existing: 是否更新已存在的视频
+        """
+        self._run_pipeline([(page, {'pg': page}) for page in pages], update_existing)
+
+    def _run_pipeline(self, jobs, update_existing, label='页'):
+        """
+        执行一组请求并通过入库线程写库
+
+        Args:
+            jobs: [(key, url_kwargs), ...]，key 为页码或批次号
+            update_existing: 是否更新已存在的视频
+            label: 日志中key的单位（页/批）
+        """
+        use_async = self.engine == 'async' and async_fetcher.is_available()
+        if self.engine == 'async' and not use_async:
+            print("未安装aiohttp，异步引擎不可用，改用线程池采集")
+            self.errors.append("未安装aiohttp，已改用线程池采集")
+
+        # 每轮只请求一次，失败的页在本轮结束后抖动退避、再统一重试
+        for attempt in range(self.retry_policy.max_attempts):
+            self.retry_later = []
+            self.defer_failures = attempt < self.retry_policy.max_attempts - 1
+            if attempt:
+                print(f"重试第 {attempt} 轮: {len(jobs)} {label}")
+            self._run_pipeline_round(jobs, update_existing, label, use_async)
+            if not self.retry_later or self.should_stop:
+                break
+            retry_keys = {key for key, _ in self.retry_later}
+            jobs = [job for job in jobs if job[0] in retry_keys]
+            self._sleep(self.retry_policy.backoff(attempt))
+
+    def _run_pipeline_round(self, jobs, update_existing, label, use_async):
+        """执行一轮请求并通过入库线程写库"""
+        self.writer = PageWriter(self, update_existing, keys=[key for key, _ in jobs], label=label)
+        self.writer.start()
+        try:
+            if use_async:
+                self.fetcher = async_fetcher.AsyncPageFetcher(self, self.concurrency, self.per_host)
+                self.fetcher.run(jobs, self.writer.submit, self.window, self.writer.get_committed)
+                return
+
+            def on_done(key, result, error):
+                if error is not None:
+                    error_msg = f"第 {key} {label}采集异常: {str(error)}"
+                    print(error_msg)
+                    self.errors.append(error_msg)
+                    # 按失败页交给入库线程，保证顺序水位能继续推进
+                    self.writer.submit(key, {'code': 0, 'msg': str(error)})
+
+            self._run_window(jobs, self._fetch_to_writer, on_done, self.writer.get_committed)
+        finally:
+            self.writer.close()
+
+    def _run_window(self, jobs, fn, on_done, committed):
+        """
+        线程池滑动窗口调度
+
+        只提交序号小于 committed() + window 的任务：前面的任务按顺序完成后窗口才向后滑动，
+        在途和等待入库的页数始终有上限，停止信号也能在窗口内及时生效
+
+        Args:
+            jobs: [(key, url_kwargs), ...]，按顺序排列
+            fn: 在线程中执行 fn(key, url_kwargs)
+            on_done: 任务完成回调 on_done(key, result, error)，在调度线程中调用
+            committed: 返回已按顺序完成的任务数
+        """
+        # 自适应并发时线程池按上限创建，实际在途请求数由控制器限制
+        pool_size = self.controller.maximum if self.controller is not None else self.max_workers
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = {}
+            index = 0
+            while not self.should_stop:
+                limit = committed() + self.window
+                while index < len(jobs) and index < limit:
+                    key, url_kwargs = jobs[index]
+                    futures[executor.submit(fn, key, url_kwargs)] = key
+                    index += 1
+                if not futures:
+                    if index >= len(jobs):
+                        break
+                    # 已请求的页都在等待按顺序入库，稍后窗口会向后滑动
+                    time.sleep(0.05)
+                    continue
+                done, _ = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = futures.pop(future)
+                    try:
+                        on_done(key, future.result(), None)
+                    except Exception as e:
+                        on_done(key, None, e)
+            if self.should_stop and futures:
+                print("检测到停止信号，关闭线程池...")
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _list_remote_changes(self, update_existing):
+        """
+        差异采集第一阶段：遍历 ac=list 分页，与本地视频库比对
+
+        Args:
+            update_existing: 为False时只需要新增视频，忽略有更新的已存在视频
+
+        Returns:
+            list: 需要获取详情的远程vod_id列表（保持远程顺序）
+        """
+        first = self.fetch_data(ac='list', pg=self.start_page)
+        if first['code'] != 1:
+            self.errors.append(f"获取列表失败: {first.get('msg', '未知错误')}")
+            return []
+
+        total_pages = first['pagecount']
+        end_page = min(self.end_page or total_pages, total_pages)
+        jobs = [(page, {'ac': 'list', 'pg': page}) for page in range(self.start_page + 1, end_page + 1)]
+        changed = []
+        seen = set()
+        # 按页码顺序比对，乱序返回的页先暂存
+        buffered = {}
+        progress = {'next': 0}
+
+        def compare(result):
+            if result.get('code') != 1:
+                return
+            for item in result.get('list', []):
+                vod_id = self._to_int(item.get('vod_id'))
+                if not vod_id or vod_id in seen:
+                    continue
+                seen.add(vod_id)
+                state = self.dedup_index.is_changed(vod_id, item.get('vod_time', ''), self.source_id)
+                if state == 'new':
+                    self.diff_new += 1
+                elif state == 'changed' and update_existing:
+                    self.diff_changed += 1
+                else:
+                    continue
+                changed.append(vod_id)
+
+        def on_done(page, result, error):
+            if error is not None:
+                self.errors.append(f"第 {page} 页列表获取异常: {str(error)}")
+                result = {'code': 0}
+            buffered[page] = result
+            while progress['next'] < len(jobs) and jobs[progress['next']][0] in buffered:
+                compare(buffered.pop(jobs[progress['next']][0]))
+                progress['next'] += 1
+
+        compare(first)
+        self._run_window(jobs, lambda page, url_kwargs: self.fetch_data(**url_kwargs), on_done,
+                         lambda: progress['next'])
+        self.diff_listed = len(seen)
+        return changed
+
+    def _collect_diff(self, update_existing):
+        """
+        两阶段差异采集
+
+        1. 遍历廉价的 ac=list 分页获取 vod_id + vod_time，与本地比对
+        2. 只对新增或有更新的视频按批请求 ac=detail&ids=...，交给入库线程写库
+
+        Returns:
+            bool: 是否完整执行（列表获取成功且未被停止）
+        """
+        changed = self._list_remote_changes(update_existing)
+        print(f"差异比对完成: 远程 {self.diff_listed} 个, 新增 {self.diff_new} 个, 更新 {self.diff_changed} 个")
+        SystemLog.log(
+            log_type='collect',
+            level='info',
+            module='maccms_collector',
+            message='差异比对完成',
+            details=json.dumps({
+                'listed': self.diff_listed,
+                'new': self.diff_new,
+                'changed': self.diff_changed
+            }, ensure_ascii=False)
+        )
+        if self.should_stop:
+            return False
+        if not changed:
+            return not self.errors
+
+        size = self.detail_batch_size
+        jobs = [
+            (index + 1, {'ac': 'detail', 'ids': ','.join(str(v) for v in changed[i:i + size])})
+            for index, i in enumerate(range(0, len(changed), size))
+        ]
+        self._run_pipeline(jobs, update_existing, label='批')
+        return not self.should_stop
+
     def collect(self, update_existing=True):
         """
         开始采集
@@ -649,6 +1692,23 @@ class MacCMSCollector:
         """
         self.is_running = True
         self.should_stop = False
+        # 断点续采时沿用首次开始时间，保证高水位不漏掉中断期间的更新
+        self.started_at = self.started_at or datetime.now()
+        completed = False
+        
+        # 增量模式：根据采集源高水位自动计算h参数（断点续采沿用已保存的h）
+        if self.mode == 'incremental' and not self.completed_pages:
+            self._apply_high_water_mark()
+        self._save_checkpoint(status='running', force=True)
+        self.apply_source_settings()
+        if self.params.get('spool') and self.spool is None:
+            self._open_spool()
+        if self.adaptive:
+            self._init_controller()
+        if self.budget is not None:
+            # 多源采集：请求先占用采集源自身的自适应额度（如有），再占用全局额度
+            self.budget.inner = self.controller
+            self.controller = self.budget
         
         # 记录开始日志
         SystemLog.log(
@@ -667,12 +1727,25 @@ class MacCMSCollector:
                 'wd': self.wd,
                 'hours': self.hours,
                 'max_workers': self.max_workers,
+                'engine': self.engine,
+                'parser': parsers.xml_backend() if self.at == 'xml' else parsers.json_backend(),
+                'mode': self.mode,
                 'timeout': self.timeout,
                 'max_retries': self.max_retries
             }, ensure_ascii=False)
         )
         
         try:
+            # 批量入库时一次性加载去重索引，之后整页判断新增/更新不再查询数据库
+            if self.batch_ingest and self.dedup_index is None:
+                self.dedup_index = DedupIndex()
+                print(f"去重索引加载完成: {self.dedup_index.load()} 个视频")
+
+            if self.mode == 'diff':
+                completed = self._collect_diff(update_existing)
+                print("采集完成")
+                return self._build_result()
+
             # 第一页先单独采集，获取总页数
             print(f"开始采集第 {self.start_page} 页...")
             first_result = self.fetch_data(pg=self.start_page)
@@ -686,42 +1759,37 @@ class MacCMSCollector:
             
             # 获取总页数
             total_pages = first_result['pagecount']
+            self.total_pages = total_pages
             print(f"总页数: {total_pages}")
             
             # 确定结束页码
             if self.end_page is None or self.end_page > total_pages:
                 self.end_page = total_pages
             
-            # 处理第一页数据
-            page_success = 0
-            page_skip = 0
-            page_failed = 0
-            
-            for video_data in first_result.get('list', []):
-                if self.should_stop:
-                    break
-                result, _ = self.save_video(video_data, update_existing)
-                if result == 'success':
-                    page_success += 1
-                elif result == 'skip':
-                    page_skip += 1
-                else:
-                    page_failed += 1
-            
-            # 输出第一页结果
-            print(f"第 {self.start_page} 页完成: 成功={page_success}, 跳过={page_skip}, 失败={page_failed}")
-            SystemLog.log(
-                log_type='collect',
-                level='info',
-                module='maccms_collector',
-                message=f'第{self.start_page}页采集完成',
-                details=json.dumps({
-                    'page': self.start_page,
-                    'success': page_success,
-                    'skip': page_skip,
-                    'failed': page_failed
-                }, ensure_ascii=False)
-            )
+            if self.start_page in self.completed_pages:
+                # 断点续采：第一页已入库，只用于获取总页数
+                print(f"第 {self.start_page} 页已完成，跳过")
+            else:
+                # 处理第一页数据
+                page_success, page_skip, page_failed = self._save_page_videos(
+                    first_result.get('list', []), update_existing, self.start_page
+                )
+                self._mark_page_done(self.start_page)
+                
+                # 输出第一页结果
+                print(f"第 {self.start_page} 页完成: 成功={page_success}, 跳过={page_skip}, 失败={page_failed}")
+                SystemLog.log(
+                    log_type='collect',
+                    level='info',
+                    module='maccms_collector',
+                    message=f'第{self.start_page}页采集完成',
+                    details=json.dumps({
+                        'page': self.start_page,
+                        'success': page_success,
+                        'skip': page_skip,
+                        'failed': page_failed
+                    }, ensure_ascii=False)
+                )
             
             # 检查是否需要继续
             with self.count_lock:
@@ -739,6 +1807,7 @@ class MacCMSCollector:
                         }, ensure_ascii=False)
                     )
                     self.is_running = False
+                    completed = True
                     return self._build_result()
             
             # 如果只有一页或起始页就是结束页
@@ -758,59 +1827,19 @@ class MacCMSCollector:
                         'failed': self.failed_count
                     }, ensure_ascii=False)
                 )
+                completed = True
                 return result
             
-            # 多线程采集剩余页面
-            pages_to_collect = list(range(self.start_page + 1, self.end_page + 1))
+            # 多线程采集剩余页面（跳过断点中已完成的页）
+            pages_to_collect = [
+                page for page in range(self.start_page + 1, self.end_page + 1)
+                if page not in self.completed_pages
+            ]
+            if self.completed_pages:
+                print(f"断点续采: 已完成 {len(self.completed_pages)} 页，剩余 {len(pages_to_collect)} 页")
             
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = {
-                    executor.submit(self._collect_page_with_context, page, update_existing): page
-                    for page in pages_to_collect
-                }
-                
-                for future in as_completed(futures):
-                    page = futures[future]
-                    
-                    try:
-                        page_result = future.result()
-                        print(f"第 {page} 页完成: 成功={page_result['success']}, "
-                              f"跳过={page_result['skip']}, 失败={page_result['failed']}")
-                        
-                        # 记录每页日志
-                        SystemLog.log(
-                            log_type='collect',
-                            level='info',
-                            module='maccms_collector',
-                            message=f'第{page}页采集完成',
-                            details=json.dumps({
-                                'page': page,
-                                'success': page_result['success'],
-                                'skip': page_result['skip'],
-                                'failed': page_result['failed']
-                            }, ensure_ascii=False)
-                        )
-                        
-                        # 检查是否需要停止
-                        if page_result['should_stop'] or self.should_stop:
-                            print("检测到停止信号，关闭线程池...")
-                            executor.shutdown(wait=False, cancel_futures=True)
-                            break
-                            
-                    except Exception as e:
-                        error_msg = f"第 {page} 页采集异常: {str(e)}"
-                        print(error_msg)
-                        self.errors.append(error_msg)
-                        SystemLog.log(
-                            log_type='collect',
-                            level='error',
-                            module='maccms_collector',
-                            message=f'第{page}页采集异常',
-                            details=json.dumps({
-                                'page': page,
-                                'error': str(e)
-                            }, ensure_ascii=False)
-                        )
+            # 采集线程只请求解析，由入库线程按页码顺序写库（滑动窗口控制提前请求的页数）
+            self._collect_pages_pipeline(pages_to_collect, update_existing)
             
             # 所有页面采集完成，设置状态
             print("采集完成")
@@ -827,6 +1856,7 @@ class MacCMSCollector:
                     'failed': self.failed_count
                 }, ensure_ascii=False)
             )
+            completed = True
         
         except Exception as e:
             import traceback
@@ -847,6 +1877,32 @@ class MacCMSCollector:
         
         finally:
             self.is_running = False
+            if self.hedge_pool is not None:
+                # 落后的对冲请求在后台自然结束
+                self.hedge_pool.shutdown(wait=False)
+                self.hedge_pool = None
+            
+            # 熔断停止的任务与异常中断相同：未请求的页没有入库，不推进高水位，保存为可继续的断点
+            if self.circuit_open:
+                completed = False
+            
+            # 完整跑完（含连续重复自动停止）且所有页都已入库才推进高水位；
+            # 手动停止或有失败页、失败视频的任务下次仍从旧高水位开始，失败的数据会被重新采集
+            if completed and not self.stopped_by_user and self.advance_high_water and self._ingest_complete():
+                self._save_high_water_mark()
+            if self.adaptive and self.controller is not None:
+                self._save_learned_concurrency()
+            if self.breaker is not None:
+                self._save_source_health()
+            if self.spool is not None:
+                self.spool.close()
+            
+            # 保存最终断点：手动停止或异常中断的任务可以继续采集
+            if self.stopped_by_user:
+                task_status = 'stopped'
+            else:
+                task_status = 'finished' if completed else 'failed'
+            self._save_checkpoint(status=task_status, force=True)
             
             # 记录完成日志
             SystemLog.log(
@@ -865,20 +1921,150 @@ class MacCMSCollector:
         
         return self._build_result()
     
+    def _ingest_complete(self):
+        """是否所有计划的页都已入库（没有失败页、失败视频和待重试的页）"""
+        with self.count_lock:
+            return not self.failed_pages and not self.failed_count and not self.retry_later
+
+    def _apply_high_water_mark(self):
+        """增量模式：从采集源高水位计算h参数，没有高水位时退化为全量采集"""
+        source = db.session.get(CollectSource, self.source_id) if self.source_id else None
+        hours = source.get_incremental_hours() if source else None
+        if hours:
+            self.hours = hours
+            print(f"增量采集: 距上次采集 {hours} 小时内的数据")
+        else:
+            print("增量采集: 采集源没有高水位记录，执行全量采集")
+
+    def _save_high_water_mark(self):
+        """采集完成后推进采集源高水位"""
+        if not self.source_id:
+            return
+        try:
+            source = db.session.get(CollectSource, self.source_id)
+            if source:
+                source.update_high_water_mark(self.started_at, self.max_vod_time)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.errors.append(f"更新采集源高水位失败: {str(e)}")
+
+    def _init_controller(self):
+        """创建自适应并发控制器，从采集源上次学到的并发数开始"""
+        source = db.session.get(CollectSource, self.source_id) if self.source_id else None
+        learned = source.learned_concurrency if source else 0
+        initial = learned or (min(self.concurrency, 10) if self.engine == 'async' else self.max_workers)
+        self.controller = AIMDController(initial=initial, maximum=self.max_concurrency)
+        print(f"自适应并发: 初始 {self.controller.limit}，上限 {self.controller.maximum}")
+
+    def _save_learned_concurrency(self):
+        """把健康运行过的最高并发保存到采集源，下次采集从这里开始"""
+        if not self.source_id:
+            return
+        try:
+            source = db.session.get(CollectSource, self.source_id)
+            if source:
+                source.learned_concurrency = self.controller.ceiling
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.errors.append(f"保存采集源并发数失败: {str(e)}")
+
+    def _open_spool(self):
+        """创建原始响应暂存文件，按采集源ID（没有时按主机）分目录"""
+        directory = self.app.config.get('COLLECTOR_SPOOL_DIR', 'instance/spool') if self.app else 'instance/spool'
+        source_key = f'source_{self.source_id}' if self.source_id else \
+            rate_limiter.host_of(self.base_url).replace(':', '_')
+        try:
+            self.spool = PageSpool(directory, source_key, self.task_id, self.source_id)
+            print(f"原始响应暂存到: {self.spool.path}")
+        except OSError as e:
+            print(f"创建暂存文件失败: {str(e)}")
+            self.errors.append(f"创建暂存文件失败: {str(e)}")
+
+    def _save_source_health(self):
+        """把熔断状态和健康分保存到采集源"""
+        try:
+            source = db.session.get(CollectSource, self.breaker.source_id)
+            if source:
+                self.breaker.save(source)
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.errors.append(f"保存采集源健康状况失败: {str(e)}")
+
+    def _mark_page_done(self, page):
+        """记录已入库的页码，并按间隔保存断点"""
+        if self.task_id is None or self.mode == 'diff':
+            return
+        with self.checkpoint_lock:
+            self.completed_pages.add(page)
+        self._save_checkpoint()
+
+    def _save_checkpoint(self, status=None, force=False):
+        """
+        保存采集断点（已完成页码、计数器、任务状态）
+
+        Args:
+            status: 新的任务状态，None表示不变
+            force: 忽略保存间隔立即保存
+        """
+        if self.task_id is None:
+            return
+        now = time.time()
+        with self.checkpoint_lock:
+            if not force and now - self.last_checkpoint_at < CHECKPOINT_INTERVAL:
+                return
+            self.last_checkpoint_at = now
+            pages = set(self.completed_pages)
+        with self.db_lock:
+            try:
+                task = db.session.get(CollectTask, self.task_id)
+                if task is None:
+                    return
+                task.set_completed_pages(pages)
+                task.total_pages = self.total_pages or task.total_pages
+                task.success_count = self.success_count
+                task.skip_count = self.skip_count
+                task.failed_count = self.failed_count
+                task.started_at = task.started_at or self.started_at
+                params = task.get_params()
+                if self.mode == 'incremental' and self.hours:
+                    # 保存计算出的h，断点续采时页码含义保持一致
+                    params['h'] = self.hours
+                # 已入库的最大vod_time随断点保存，继续采集或分片任务推进高水位时使用
+                params['max_vod_time'] = self.max_vod_time
+                if status == 'finished':
+                    # 分类分片完成时记录是否所有页都已入库，编排器据此决定能否推进高水位
+                    params['ingest_complete'] = self._ingest_complete()
+                task.set_params(params)
+                if status:
+                    task.status = status
+                # 作为心跳，即使没有新页完成也刷新更新时间
+                task.updated_at = datetime.now()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"保存采集断点失败: {str(e)}")
+
     def _build_result(self):
         """构建采集结果"""
         return {
             'success_count': self.success_count,
             'failed_count': self.failed_count,
             'skip_count': self.skip_count,
+            'unchanged_count': self.unchanged_count,
             'errors': self.errors,
             'consecutive_duplicates': self.consecutive_duplicates,
-            'is_stopped': self.should_stop or (self.consecutive_duplicates >= self.max_consecutive_duplicates)
+            'is_stopped': self.should_stop or (
+                self.stop_on_duplicates and self.consecutive_duplicates >= self.max_consecutive_duplicates
+            )
         }
     
     def stop(self):
         """停止采集"""
         self.should_stop = True
+        self.stopped_by_user = True
         SystemLog.log(
             log_type='collect',
             level='warning',
@@ -902,15 +2088,43 @@ class MacCMSCollector:
     
     def get_status(self):
         """获取当前采集状态"""
-        return {
+        status = {
             'is_running': self.is_running,
             'success_count': self.success_count,
             'failed_count': self.failed_count,
             'skip_count': self.skip_count,
+            'unchanged_count': self.unchanged_count,
             'consecutive_duplicates': self.consecutive_duplicates,
             'current_page': self.current_page,
             'errors': self.errors[-5:] if self.errors else []
         }
+        if self.mode == 'diff':
+            status.update({
+                'diff_listed': self.diff_listed,
+                'diff_new': self.diff_new,
+                'diff_changed': self.diff_changed,
+            })
+        # 入库队列深度与写入延迟：队列常满说明瓶颈在数据库，常空说明瓶颈在网络
+        if self.writer is not None:
+            status.update(self.writer.get_stats())
+        else:
+            status.update({'queue_depth': 0, 'writer_lag': 0})
+        if self.fetcher is not None:
+            status.update(self.fetcher.get_stats())
+        if self.controller is not None:
+            status.update(self.controller.get_stats())
+        status.update(self.retry_policy.get_stats())
+        status['retry_later'] = len(self.retry_later)
+        status['rate_limit'] = rate_limiter.get_stats(self.base_url)
+        if self.mirrors is not None:
+            status.update(self.mirrors.get_stats())
+        if self.breaker is not None:
+            status.update(self.breaker.get_stats())
+        if self.spool is not None:
+            status.update(self.spool.get_stats())
+        if self.http_cache is not None:
+            status.update(self.http_cache.get_stats())
+        return status
     
     def search(self, wd=None, page=1, type_id=None):
         """
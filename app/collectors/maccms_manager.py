@@ -5,9 +5,16 @@ MacCMS10采集管理器
 """
 
 from app.collectors.maccms_collector import MacCMSCollector
+from app.collectors.orchestrator import CollectOrchestrator
+from app.models.collect_task import CollectTask
+from app import db
 from flask import current_app
+from datetime import datetime
 import threading
 
+# 运行中任务的心跳超时（秒）：超过该时间未更新断点的任务视为已中断，可以继续采集
+TASK_STALE_SECONDS = 120
+
 
 class MacCMSCollectorManager:
     """MacCMS10采集管理器（单例模式）"""
@@ -27,8 +34,9 @@ class MacCMSCollectorManager:
         if self._initialized:
             return
         
-        self.collectors = {}  # {task_id: collector}
-        self.task_id_counter = 0
+        self.collectors = {}  # {task_id: collector}，task_id 即 collect_tasks 表主键
+        self.threads = {}  # {task_id: thread}，线程结束前任务仍可能在保存断点
+        self.child_tasks = {}  # {子任务ID: 多源采集任务ID}
         self._initialized = True
     
     def start_collect(self, url, params=None, max_workers=3, timeout=30, max_retries=3):
@@ -45,18 +53,8 @@ class MacCMSCollectorManager:
         Returns:
             int: 任务ID
         """
-        # 获取Flask应用实例（必须在请求上下文中调用）
-        try:
-            from flask import current_app
-            app = current_app._get_current_object()
-        except (RuntimeError, AttributeError) as e:
-            print(f"警告：无法获取Flask应用上下文: {str(e)}")
-            # 尝试从全局获取app
-            try:
-                from app import create_app
-                app = create_app()
-            except:
-                app = None
+        params = params or {}
+        app = self._get_app()
         
         # 创建采集器
         collector = MacCMSCollector(
@@ -68,22 +66,315 @@ class MacCMSCollectorManager:
             app=app
         )
         
-        # 生成任务ID
-        self.task_id_counter += 1
-        task_id = self.task_id_counter
+        # 持久化任务参数，任务ID即记录ID
+        with app.app_context():
+            task = CollectTask(
+                source_id=params.get('source_id'),
+                url=url,
+                max_workers=max_workers,
+                timeout=timeout,
+                max_retries=max_retries,
+                status='running'
+            )
+            task.set_params(params)
+            db.session.add(task)
+            db.session.commit()
+            task_id = task.id
+        collector.task_id = task_id
+        
+        self._launch(task_id, collector, params.get('update_existing', True))
+        return task_id
+    
+    def start_collect_all(self, sources, params=None, total_workers=12, timeout=30, max_retries=3):
+        """
+        同时从多个采集源采集（共享全局并发预算和去重索引）
+        
+        Args:
+            sources: CollectSource列表
+            params: 采集参数（各采集源相同，source_id 按采集源设置）
+            total_workers: 全局并发预算
+            timeout: 超时时间
+            max_retries: 重试次数
+            
+        Returns:
+            int: 任务ID
+        """
+        params = params or {}
+        shards = [
+            (source.name, source.url, dict(params, source_id=source.id))
+            for source in sources
+        ]
+        parent_params = dict(params, source_ids=[source.id for source in sources])
+        return self._start_group('', parent_params, shards, total_workers, timeout, max_retries)
+    
+    def start_collect_sharded(self, url, params=None, max_workers=3, timeout=30, max_retries=3):
+        """
+        按分类分片并行采集一个采集源
+        
+        通过 get_categories() 获取分类列表，每个分类一个分片，
+        各分片有自己的滑动窗口和断点，在同一个任务ID下并行采集
+        
+        Args:
+            url: 采集接口URL
+            params: 采集参数，t 可以是逗号分隔的分类ID（只采集这些分类），为空时采集全部分类
+            max_workers: 所有分片共享的并发数（异步引擎为"异步并发"）
+            timeout: 超时时间
+            max_retries: 重试次数
+            
+        Returns:
+            int: 任务ID
+            
+        Raises:
+            ValueError: 获取不到分类列表
+        """
+        params = params or {}
+        app = self._get_app()
+        
+        with app.app_context():
+            probe = MacCMSCollector(url=url, params=params, timeout=timeout, max_retries=max_retries, app=app)
+            probe.apply_source_settings()
+            categories = self._leaf_categories(probe.get_categories())
+        wanted = [t.strip() for t in str(params.get('t') or '').split(',') if t.strip()]
+        if wanted:
+            categories = [c for c in categories if str(c.get('type_id')) in wanted]
+        if not categories:
+            raise ValueError('未获取到可采集的分类')
+        
+        shards = [
+            (category.get('type_name') or str(category.get('type_id')), url,
+             dict(params, t=str(category.get('type_id'))))
+            for category in categories
+        ]
+        parent_params = dict(params, t='', sharded=True)
+        total = int(params.get('concurrency') or 100) if params.get('engine') == 'async' else max_workers
+        return self._start_group(url, parent_params, shards, total, timeout, max_retries)
+    
+    @staticmethod
+    def _leaf_categories(categories):
+        """去掉有子分类的父分类（父分类的列表通常包含子分类的视频，避免重复请求）"""
+        parents = {str(c.get('type_pid')) for c in categories if str(c.get('type_pid') or '0') != '0'}
+        return [c for c in categories if str(c.get('type_id')) not in parents]
+    
+    def _start_group(self, url, parent_params, shards, total_workers, timeout, max_retries):
+        """
+        创建并行采集任务及其分片子任务并启动
+        
+        Args:
+            url: 任务URL（多源采集为空）
+            parent_params: 任务参数
+            shards: [(分片名称, 采集接口URL, 分片采集参数), ...]
+            total_workers: 所有分片共享的并发预算
+            timeout: 超时时间
+            max_retries: 重试次数
+            
+        Returns:
+            int: 任务ID
+        """
+        app = self._get_app()
+        source_id = parent_params.get('source_id') if parent_params.get('sharded') else None
+        orchestrator = CollectOrchestrator(total_workers=total_workers, app=app, source_id=source_id)
+        
+        with app.app_context():
+            task = CollectTask(
+                source_id=source_id,
+                url=url,
+                max_workers=total_workers,
+                timeout=timeout,
+                max_retries=max_retries,
+                status='running'
+            )
+            task.set_params(dict(parent_params, orchestrator=True))
+            db.session.add(task)
+            db.session.commit()
+            
+            children = []
+            for name, shard_url, shard_params in shards:
+                # 共享去重索引只在批量入库时使用；单个分片最多可借用整个并发预算
+                shard_params = dict(shard_params, batch=True, parent_id=task.id, shard_name=name)
+                child = CollectTask(
+                    source_id=shard_params.get('source_id'),
+                    url=shard_url,
+                    max_workers=total_workers,
+                    timeout=timeout,
+                    max_retries=max_retries,
+                    status='running'
+                )
+                child.set_params(shard_params)
+                db.session.add(child)
+                children.append(child)
+            db.session.commit()
+            task.set_params(dict(task.get_params(), child_task_ids=[child.id for child in children]))
+            db.session.commit()
+            
+            orchestrator.task_id = task.id
+            for child in children:
+                orchestrator.add_shard(child.get_params()['shard_name'], self._restore_collector(child, app), child.id)
+                self.child_tasks[child.id] = task.id
+        
+        self._launch(orchestrator.task_id, orchestrator, parent_params.get('update_existing', True))
+        return orchestrator.task_id
+    
+    def _resume_group(self, task, app):
+        """
+        继续并行采集任务：未完成的分片从各自的断点继续（需在应用上下文中调用）
+        
+        Returns:
+            CollectOrchestrator: 编排器
+        """
+        params = task.get_params()
+        source_id = task.source_id if params.get('sharded') else None
+        orchestrator = CollectOrchestrator(total_workers=task.max_workers, app=app, source_id=source_id)
+        orchestrator.task_id = task.id
+        children = CollectTask.query.filter(
+            CollectTask.id.in_(params.get('child_task_ids') or [])
+        ).order_by(CollectTask.id).all()
+        for child in children:
+            if child.id not in self.child_tasks and self._is_alive_elsewhere(child):
+                raise ValueError('任务可能正在其他进程中运行，请稍后再试')
+        for child in children:
+            self.child_tasks[child.id] = task.id
+            name = child.get_params().get('shard_name', f'#{child.id}')
+            if child.status == 'finished':
+                orchestrator.add_finished_shard(name, child)
+                continue
+            orchestrator.add_shard(name, self._restore_collector(child, app), child.id)
+        if not orchestrator.collectors:
+            raise ValueError('任务已完成')
+        task.status = 'running'
+        db.session.commit()
+        return orchestrator
+    
+    @staticmethod
+    def _restore_collector(task, app):
+        """按任务记录创建采集器，并恢复断点（需在应用上下文中调用）"""
+        collector = MacCMSCollector(
+            url=task.url,
+            params=task.get_params(),
+            max_workers=task.max_workers,
+            timeout=task.timeout,
+            max_retries=task.max_retries,
+            app=app
+        )
+        collector.task_id = task.id
+        collector.completed_pages = task.get_completed_pages()
+        collector.total_pages = task.total_pages or 0
+        collector.started_at = task.started_at
+        collector.max_vod_time = task.get_params().get('max_vod_time') or ''
+        collector.success_count = task.success_count or 0
+        collector.skip_count = task.skip_count or 0
+        collector.failed_count = task.failed_count or 0
+        return collector
+    
+    def resume_collect(self, task_id):
+        """
+        从断点继续采集任务（进程重启或手动停止后）
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            int: 任务ID
+            
+        Raises:
+            ValueError: 任务不存在、已完成或仍在运行
+        """
+        existing = self.collectors.get(task_id)
+        if self._is_running(task_id):
+            raise ValueError('任务正在运行')
+        
+        app = self._get_app()
+        with app.app_context():
+            task = db.session.get(CollectTask, task_id)
+            if task is None:
+                raise ValueError('任务不存在')
+            if task.status == 'finished':
+                raise ValueError('任务已完成')
+            if existing is None and self._is_alive_elsewhere(task):
+                raise ValueError('任务可能正在其他进程中运行，请稍后再试')
+            
+            params = task.get_params()
+            if params.get('parent_id'):
+                raise ValueError(f'分片子任务请通过所属任务 #{params["parent_id"]} 继续')
+            if params.get('orchestrator'):
+                collector = self._resume_group(task, app)
+            else:
+                collector = self._restore_collector(task, app)
+        
+        self._launch(task_id, collector, params.get('update_existing', True))
+        return task_id
+    
+    def get_resumable_tasks(self, limit=20):
+        """
+        获取可以继续采集的任务（需在应用上下文中调用）
         
-        # 保存采集器
+        Returns:
+            list: 任务信息字典列表
+        """
+        tasks = CollectTask.query.filter(
+            CollectTask.status != 'finished'
+        ).order_by(CollectTask.id.desc()).limit(limit).all()
+        resumable = []
+        for task in tasks:
+            if self._is_running(task.id):
+                continue
+            if task.id not in self.collectors and self._is_alive_elsewhere(task):
+                continue
+            params = task.get_params()
+            if params.get('parent_id'):
+                # 分片子任务随所属任务一起继续
+                continue
+            info = task.to_dict()
+            if params.get('orchestrator'):
+                info['shard_count'] = len(params.get('child_task_ids') or [])
+            resumable.append(info)
+        return resumable
+    
+    def _is_running(self, task_id):
+        """任务是否在本进程中运行（含采集结束后保存断点的阶段）"""
+        if task_id in self.child_tasks:
+            # 多源采集的子任务随多源采集任务一起运行
+            task_id = self.child_tasks[task_id]
+        collector = self.collectors.get(task_id)
+        thread = self.threads.get(task_id)
+        return bool(collector and collector.is_running) or bool(thread and thread.is_alive())
+    
+    @staticmethod
+    def _is_alive_elsewhere(task):
+        """不在本进程中的运行中任务，心跳未超时则认为仍在其他进程中运行"""
+        if task.status != 'running' or task.updated_at is None:
+            return False
+        return (datetime.now() - task.updated_at).total_seconds() < TASK_STALE_SECONDS
+    
+    def _launch(self, task_id, collector, update_existing):
+        """登记采集器并在新线程中启动"""
+        collector.is_running = True
         self.collectors[task_id] = collector
         
-        # 在新线程中启动采集
         thread = threading.Thread(
             target=self._run_collector,
-            args=(collector, params.get('update_existing', True))
+            args=(collector, update_existing)
         )
         thread.daemon = True
         thread.start()
-        
-        return task_id
+        self.threads[task_id] = thread
+    
+    def _get_app(self):
+        """获取Flask应用实例"""
+        # 获取Flask应用实例（必须在请求上下文中调用）
+        try:
+            from flask import current_app
+            app = current_app._get_current_object()
+        except (RuntimeError, AttributeError) as e:
+            print(f"警告：无法获取Flask应用上下文: {str(e)}")
+            # 尝试从全局获取app
+            try:
+                from app import create_app
+                app = create_app()
+            except:
+                app = None
+        if app is None:
+            raise RuntimeError('未找到Flask应用实例，无法启动采集')
+        return app
     
     def _run_collector(self, collector, update_existing):
         """在线程中运行采集器"""
@@ -157,6 +448,11 @@ class MacCMSCollectorManager:
         ]
         for task_id in finished:
             del self.collectors[task_id]
+            self.threads.pop(task_id, None)
+        self.child_tasks = {
+            child_id: parent_id for child_id, parent_id in self.child_tasks.items()
+            if parent_id in self.collectors
+        }
         return len(finished)
 
 
@@ -0,0 +1,180 @@
+"""
+采集源镜像
+
+同一个采集源可以配置多个镜像接口地址。按各镜像的延迟和健康状况排序，
+分页请求发往最快的健康镜像；启用对冲请求时，主请求超过近期 p95 延迟仍未返回，
+再向次优镜像发送一次相同的请求，取先返回的结果，削减慢镜像造成的长尾等待
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class Mirror:
+    """单个镜像的延迟与健康统计"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # 成功请求延迟的指数加权平均（秒）
+        self.failures = 0  # 连续失败次数
+        self.opened_at = 0.0  # 判定为不可用的时间
+        self.requests = 0
+        self.errors = 0
+
+
+class MirrorSet:
+    """
+    一个采集源的镜像集合（线程安全）
+
+    - rank(): 可用且没有连续失败的镜像在前，其次按平均延迟从低到高；
+      未测过延迟的镜像排在前面，保证每个镜像都会被测量
+    - 连续失败 FAILURE_THRESHOLD 次的镜像判定为不可用，COOLDOWN 秒后重新参与排序
+    - 每 EXPLORE_EVERY 次选择把次优的可用镜像排到最前，
+      避免某个镜像因为偶发的慢请求被一直冷落，延迟统计得不到更新
+    - hedge_delay(): 最近成功请求延迟的 p95，样本不足时返回None（不对冲）
+    """
+
+    FAILURE_THRESHOLD = 3
+    COOLDOWN = 30.0
+    SAMPLE_SIZE = 100
+    MIN_SAMPLES = 20
+    MIN_HEDGE_DELAY = 0.05
+    EXPLORE_EVERY = 20
+
+    def __init__(self, urls):
+        self.lock = threading.Lock()
+        self.mirrors = {}
+        self.samples = deque(maxlen=self.SAMPLE_SIZE)
+        self.hedged = 0  # 发出的对冲请求数
+        self.hedge_wins = 0  # 对冲请求先返回的次数
+        self.picks = 0
+        self.configure(urls)
+
+    def configure(self, urls):
+        """更新镜像列表，保留仍在列表中的镜像的统计"""
+        with self.lock:
+            self.mirrors = {url: self.mirrors.get(url) or Mirror(url) for url in urls}
+
+    def rank(self):
+        """
+        按健康状况和延迟排序的镜像URL列表
+
+        Returns:
+            list: 最优的镜像在前
+        """
+        now = time.time()
+        with self.lock:
+            def key(mirror):
+                unavailable = (mirror.failures >= self.FAILURE_THRESHOLD
+                               and now - mirror.opened_at < self.COOLDOWN)
+                return (unavailable, mirror.failures > 0, mirror.latency or 0.0)
+            ranked = sorted(self.mirrors.values(), key=key)
+            self.picks += 1
+            if self.picks % self.EXPLORE_EVERY == 0 and len(ranked) > 1 and not key(ranked[1])[0]:
+                ranked[0], ranked[1] = ranked[1], ranked[0]
+            return [mirror.url for mirror in ranked]
+
+    def record(self, url, latency=None, ok=True):
+        """
+        记录一次请求结果
+
+        Args:
+            url: 镜像URL
+            latency: 请求耗时（秒）
+            ok: 是否成功
+        """
+        with self.lock:
+            mirror = self.mirrors.get(url)
+            if mirror is None:
+                return
+            mirror.requests += 1
+            if ok:
+                mirror.failures = 0
+                if latency is not None:
+                    mirror.latency = latency if mirror.latency is None else mirror.latency * 0.8 + latency * 0.2
+                    self.samples.append(latency)
+            else:
+                mirror.errors += 1
+                mirror.failures += 1
+                if mirror.failures >= self.FAILURE_THRESHOLD:
+                    mirror.opened_at = time.time()
+
+    def record_hedge(self, won=False):
+        """记录一次对冲请求"""
+        with self.lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedged += 1
+
+    def hedge_delay(self):
+        """
+        对冲请求的等待时间
+
+        Returns:
+            float: 最近成功请求延迟的 p95（秒），样本不足时返回None
+        """
+        with self.lock:
+            if len(self.samples) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return max(self.MIN_HEDGE_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+    def get_stats(self):
+        """获取镜像统计"""
+        delay = self.hedge_delay()
+        with self.lock:
+            return {
+                'mirrors': [
+                    {
+                        'url': mirror.url,
+                        'latency_ms': round(mirror.latency * 1000) if mirror.latency is not None else None,
+                        'failures': mirror.failures,
+                        'requests': mirror.requests,
+                        'errors': mirror.errors,
+                    }
+                    for mirror in self.mirrors.values()
+                ],
+                'hedge_delay_ms': round(delay * 1000) if delay is not None else None,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+            }
+
+
+class MirrorRegistry:
+    """
+    进程级镜像注册表
+
+    按采集源主接口地址保存镜像集合，同一采集源的多个任务共享延迟和健康统计
+    """
+
+    def __init__(self):
+        self.sets = {}  # {主接口地址: MirrorSet}
+        self.lock = threading.Lock()
+
+    def configure(self, base_url, urls):
+        """
+        设置采集源的镜像
+
+        Args:
+            base_url: 采集源主接口地址
+            urls: 全部镜像地址（含主接口地址）
+
+        Returns:
+            MirrorSet: 只有一个地址时返回None
+        """
+        with self.lock:
+            if len(urls) < 2:
+                self.sets.pop(base_url, None)
+                return None
+            mirrors = self.sets.get(base_url)
+            if mirrors is None:
+                mirrors = self.sets[base_url] = MirrorSet(urls)
+            else:
+                mirrors.configure(urls)
+            return mirrors
+
+
+# 进程内共享的镜像注册表
+mirror_registry = MirrorRegistry()
@@ -0,0 +1,265 @@
+"""
+并行采集编排
+
+把一个采集任务拆成多个分片并行采集：
+- 多源采集：每个采集源一个分片
+- 分类分片：同一采集源按分类拆分，每个分类一个分片
+
+所有分片共享一个全局并发预算（按公平份额分配），
+共享一个去重索引和入库锁（跨分片去重），并汇总为一个整体进度
+"""
+
+import threading
+import traceback
+from datetime import datetime
+from app import db
+from app.collectors.concurrency import WorkerBudget
+from app.collectors.dedup_index import DedupIndex
+from app.models.collect_task import CollectTask
+from app.models.collect_source import CollectSource
+
+
+class CollectOrchestrator:
+    """
+    并行采集编排器
+
+    接口与 MacCMSCollector 一致（collect/stop/get_status/is_running），
+    由采集管理器按普通任务登记和启动。每个分片是一个独立的 MacCMSCollector，
+    有自己的滑动窗口和 collect_tasks 子任务（断点），停止或中断后通过所属任务一起继续
+    """
+
+    def __init__(self, total_workers=12, app=None, source_id=None):
+        """
+        初始化编排器
+
+        Args:
+            total_workers: 全局并发预算（所有分片同时在途的请求数上限）
+            app: Flask应用实例
+            source_id: 分类分片时的采集源ID，所有分片完成后由编排器统一推进该采集源的增量高水位
+        """
+        self.app = app
+        self.budget = WorkerBudget(total_workers)
+        # 所有采集源共用一个去重索引和入库锁：
+        # 判断新增/更新、写库、更新索引在同一把锁内完成，不同采集源的同名视频只入库一次
+        self.dedup_index = DedupIndex()
+        self.db_lock = threading.Lock()
+
+        self.source_id = source_id
+        self.task_id = None
+        self.shards = []  # [{'name', 'task_id'}]
+        self.finished_shards = []  # 继续采集时已完成的分片 [{'name', 'task_id', 计数...}]
+        self.finished_marks = []  # 已完成分片的高水位信息 [{'started_at', 'max_vod_time', 'ingest_complete'}]
+        self.collectors = {}  # {子任务ID: collector}
+        self.errors = []
+        self.is_running = False
+        self.should_stop = False
+        self.stopped_by_user = False
+
+    def add_shard(self, name, collector, task_id):
+        """
+        添加一个分片
+
+        Args:
+            name: 分片名称（采集源名称或分类名称）
+            collector: 该分片的MacCMSCollector
+            task_id: 该分片的子任务ID
+        """
+        collector.dedup_index = self.dedup_index
+        collector.db_lock = self.db_lock
+        collector.budget = self.budget.register(task_id)
+        if self.source_id:
+            # 分类分片各自推进高水位会让失败的分片漏采，由编排器在全部完成后统一推进
+            collector.advance_high_water = False
+        self.collectors[task_id] = collector
+        self.shards.append({'name': name, 'task_id': task_id})
+
+    def add_finished_shard(self, name, task):
+        """
+        登记继续采集时已经完成的分片（只计入汇总进度，不再采集；
+        保存的开始时间和最大vod_time在推进高水位时一并计入）
+
+        Args:
+            name: 分片名称
+            task: 该分片的CollectTask
+        """
+        params = task.get_params()
+        self.finished_shards.append({
+            'name': name,
+            'task_id': task.id,
+            'is_running': False,
+            'current_page': task.total_pages,
+            'total_pages': task.total_pages,
+            'completed_pages': len(task.get_completed_pages()),
+            'success_count': task.success_count or 0,
+            'skip_count': task.skip_count or 0,
+            'failed_count': task.failed_count or 0,
+            'budget_in_flight': 0,
+        })
+        self.finished_marks.append({
+            'started_at': task.started_at,
+            'max_vod_time': params.get('max_vod_time') or '',
+            'ingest_complete': bool(params.get('ingest_complete')),
+        })
+
+    def child_task_ids(self):
+        """各分片子任务ID"""
+        return [item['task_id'] for item in self.shards]
+
+    def collect(self, update_existing=True):
+        """
+        并行采集所有采集源（需在应用上下文中调用）
+
+        Args:
+            update_existing: 是否更新已存在的视频
+
+        Returns:
+            dict: 汇总的采集结果
+        """
+        self.is_running = True
+        self.should_stop = False
+        try:
+            print(f"并行采集: {len(self.collectors)} 个分片，全局并发 {self.budget.total}")
+            print(f"去重索引加载完成: {self.dedup_index.load()} 个视频")
+
+            threads = []
+            for task_id, collector in self.collectors.items():
+                collector.is_running = True
+                thread = threading.Thread(
+                    target=self._run_shard,
+                    args=(task_id, collector, update_existing)
+                )
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        finally:
+            self.is_running = False
+            self._save_task_status()
+        return self._build_result()
+
+    def _run_shard(self, task_id, collector, update_existing):
+        """在线程中采集单个分片，结束后释放其公平份额"""
+        try:
+            with self.app.app_context():
+                collector.collect(update_existing=update_existing)
+        except Exception as e:
+            print(f"分片 #{task_id} 采集异常: {str(e)}")
+            print(traceback.format_exc())
+            collector.errors.append(f"采集异常: {str(e)}")
+            collector.is_running = False
+        finally:
+            self.budget.unregister(task_id)
+
+    def _save_task_status(self):
+        """保存编排任务的最终状态和汇总计数"""
+        if self.task_id is None:
+            return
+        try:
+            task = db.session.get(CollectTask, self.task_id)
+            if task is None:
+                return
+            # 所有子任务都完成才算完成，否则可以分别继续各子任务
+            child_ids = self.child_task_ids()
+            child_status = {
+                row.status for row in CollectTask.query.filter(CollectTask.id.in_(child_ids))
+            } if child_ids else set()
+            if self.stopped_by_user:
+                status = 'stopped'
+            elif child_status <= {'finished'}:
+                status = 'finished'
+                self._save_high_water_mark()
+            else:
+                status = 'failed'
+            totals = self._totals()
+            task.status = status
+            task.success_count = totals['success_count']
+            task.skip_count = totals['skip_count']
+            task.failed_count = totals['failed_count']
+            task.updated_at = datetime.now()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"保存多源采集任务状态失败: {str(e)}")
+
+    def _save_high_water_mark(self):
+        """
+        分类分片全部完成后推进采集源高水位（调用方负责提交）
+
+        任一分片有失败页、失败视频或待重试的页时不推进（子任务状态为finished不代表所有页都已入库）；
+        继续采集时已完成的分片按其保存的开始时间、最大vod_time和入库结果计入
+        """
+        if not self.source_id or not self.collectors:
+            return
+        collectors = list(self.collectors.values())
+        if not all(c._ingest_complete() for c in collectors):
+            return
+        if not all(mark['ingest_complete'] for mark in self.finished_marks):
+            return
+        source = db.session.get(CollectSource, self.source_id)
+        if source is None:
+            return
+        started = [c.started_at for c in collectors] + [mark['started_at'] for mark in self.finished_marks]
+        started_at = min((value for value in started if value), default=None)
+        max_vod_time = max(
+            [c.max_vod_time for c in collectors] + [mark['max_vod_time'] for mark in self.finished_marks]
+        )
+        if started_at:
+            source.update_high_water_mark(started_at, max_vod_time)
+
+    def _totals(self):
+        """汇总各分片的计数器"""
+        totals = {'success_count': 0, 'failed_count': 0, 'skip_count': 0, 'unchanged_count': 0}
+        for collector in self.collectors.values():
+            for key in totals:
+                totals[key] += getattr(collector, key)
+        for shard in self.finished_shards:
+            for key in totals:
+                totals[key] += shard.get(key, 0)
+        return totals
+
+    def _build_result(self):
+        """构建汇总的采集结果"""
+        result = self._totals()
+        result['errors'] = self.errors + [e for c in self.collectors.values() for e in c.errors]
+        result['is_stopped'] = self.should_stop
+        return result
+
+    def stop(self):
+        """停止所有分片"""
+        self.should_stop = True
+        self.stopped_by_user = True
+        for collector in self.collectors.values():
+            if collector.is_running:
+                collector.stop()
+
+    def get_status(self):
+        """获取汇总的采集状态，shards 中为各分片的进度"""
+        shards = []
+        for item in self.shards:
+            collector = self.collectors[item['task_id']]
+            shards.append({
+                'name': item['name'],
+                'task_id': item['task_id'],
+                'is_running': collector.is_running,
+                'current_page': collector.current_page,
+                'total_pages': collector.total_pages,
+                'completed_pages': len(collector.completed_pages),
+                'success_count': collector.success_count,
+                'skip_count': collector.skip_count,
+                'failed_count': collector.failed_count,
+                'budget_in_flight': collector.budget.get_stats()['budget_in_flight'],
+            })
+        shards = self.finished_shards + shards
+        status = self._totals()
+        status.update({
+            'is_running': self.is_running,
+            'consecutive_duplicates': max(
+                (c.consecutive_duplicates for c in self.collectors.values()), default=0
+            ),
+            'current_page': None,
+            'errors': [e for c in self.collectors.values() for e in c.errors[-2:]][-5:],
+            'shards': shards,
+        })
+        status.update(self.budget.get_stats())
+        return status
@@ -0,0 +1,201 @@
+"""
+原始响应暂存
+
+采集时把资源站返回的每一页原始响应追加写入本地 gzip 文件（每行一条JSON记录），
+与请求和入库解耦：入库因表结构错误、数据库锁等原因失败时，下载的数据不会丢失，
+修复后可以用 db_manager.py replay 离线重新入库，无需再次请求资源站；
+也可以用同一份数据单独测试入库速度
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+# 只暂存带完整视频数据的响应，ac=list 的列表和分类不能用于入库
+SPOOL_ACTIONS = ('videolist', 'detail')
+
+
+class PageSpool:
+    """
+    单个采集任务的暂存文件（线程安全，只追加）
+
+    文件路径: <目录>/<采集源>/<开始时间>[_task<任务ID>].jsonl.gz
+    记录字段: source_id、url、page、at、fetched_at、text（原始响应文本）
+
+    每条记录写入后同步刷新压缩流，进程中断时最多丢失最后一条记录
+    """
+
+    def __init__(self, directory, source_key, task_id=None, source_id=None):
+        """
+        创建暂存文件
+
+        Args:
+            directory: 暂存根目录
+            source_key: 采集源标识（子目录名）
+            task_id: 采集任务ID（写入文件名）
+            source_id: 采集源ID（写入每条记录）
+        """
+        folder = os.path.join(directory, source_key)
+        os.makedirs(folder, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if task_id:
+            name += f'_task{task_id}'
+        self.path = os.path.join(folder, f'{name}.jsonl.gz')
+        self.source_id = source_id
+        self.pages = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.file = gzip.open(self.path, 'ab')
+
+    def write(self, url, text, at='json'):
+        """
+        追加一条原始响应
+
+        Args:
+            url: 请求URL
+            text: 响应文本
+            at: 响应格式（json/xml）
+        """
+        query = parse_qs(urlsplit(url).query)
+        if query.get('ac', [''])[0] not in SPOOL_ACTIONS:
+            return
+        page = query.get('pg', [None])[0]
+        record = {
+            'source_id': self.source_id,
+            'url': url,
+            'page': int(page) if page and page.isdigit() else None,
+            'at': at,
+            'fetched_at': time.time(),
+            'text': text,
+        }
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.file.flush()
+            self.pages += 1
+            self.bytes += len(line)
+
+    def close(self):
+        """关闭暂存文件"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def get_stats(self):
+        """获取暂存统计"""
+        with self.lock:
+            return {
+                'spool_file': self.path,
+                'spool_pages': self.pages,
+                'spool_bytes': self.bytes,
+            }
+
+
+def spool_files(path):
+    """
+    列出暂存文件
+
+    Args:
+        path: 暂存文件或目录（目录时递归查找）
+
+    Returns:
+        list: 按文件名（即开始时间）排序的文件路径
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names if name.endswith('.jsonl.gz'))
+    return sorted(files, key=os.path.basename)
+
+
+def read_spool(path):
+    """
+    逐条读取暂存文件
+
+    进程中断时文件末尾可能不完整，读到损坏的结尾时停止，不影响之前的记录
+
+    Args:
+        path: 暂存文件路径
+
+    Yields:
+        dict: 暂存记录
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                yield json.loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as e:
+            print(f"暂存文件结尾不完整，已停止读取: {path} ({e})")
+
+
+def replay(path, update_existing=True, pages_per_commit=20):
+    """
+    把暂存的原始响应离线入库（需在应用上下文中调用）
+
+    与采集时相同的解析和批量入库流程（去重索引、内容哈希、upsert），
+    但不请求资源站，也不按连续重复停止
+
+    Args:
+        path: 暂存文件或目录
+        update_existing: 是否更新已存在的视频
+        pages_per_commit: 每个事务写入的页数
+
+    Returns:
+        dict: {'files', 'pages', 'videos', 'parse_failed', 'success_count', 'skip_count',
+               'failed_count', 'unchanged_count', 'elapsed'}
+    """
+    from app.collectors.maccms_collector import MacCMSCollector
+    from app.collectors.dedup_index import DedupIndex
+
+    files = spool_files(path)
+    stats = {'files': len(files), 'pages': 0, 'videos': 0, 'parse_failed': 0}
+    collector = None
+    pending = []
+    started = time.time()
+
+    def flush():
+        if pending:
+            collector.save_pages(pending, update_existing)
+            pending.clear()
+
+    for file in files:
+        print(f"重放暂存文件: {file}")
+        for record in read_spool(file):
+            if collector is None:
+                collector = MacCMSCollector(record['url'].split('?', 1)[0], params={'batch': True})
+                collector.stop_on_duplicates = False
+                collector.dedup_index = DedupIndex()
+                print(f"去重索引加载完成: {collector.dedup_index.load()} 个视频")
+            collector.at = record.get('at') or 'json'
+            collector.source_id = record.get('source_id')
+            result = collector._parse_response(record['text'], record['url'])
+            stats['pages'] += 1
+            if result.get('code') != 1:
+                stats['parse_failed'] += 1
+                continue
+            videos = result.get('list', [])
+            stats['videos'] += len(videos)
+            pending.append((record.get('page'), videos))
+            if len(pending) >= pages_per_commit:
+                flush()
+        # 不同文件可能来自不同采集源，每个文件单独提交
+        if collector is not None:
+            flush()
+
+    if collector is not None:
+        for key in ('success_count', 'skip_count', 'failed_count', 'unchanged_count'):
+            stats[key] = getattr(collector, key)
+        stats['errors'] = collector.errors[:10]
+    stats['elapsed'] = round(time.time() - started, 3)
+    return stats
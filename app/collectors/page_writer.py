@@ -0,0 +1,248 @@
+"""
+采集入库线程
+
+采集线程只负责请求和解析，把标准化后的整页数据放入有界队列；
+由唯一的入库线程在自己的应用上下文中按页码顺序写入数据库，
+避免多个采集线程争抢数据库锁，连续重复的判断也与页码顺序一致
+"""
+
+import json
+import queue
+import threading
+import time
+from flask import current_app
+from app.models.system_log import SystemLog
+
+
+class PageWriter:
+    """
+    单写入线程
+
+    - submit(): 采集线程调用，队列满时阻塞（背压），停止采集时放弃
+    - 乱序到达的页先放入重排缓冲区，只按 keys 的顺序连续写入，
+      每次最多 batch_pages 页（批量入库时在一个事务内）
+    - get_committed(): 已按顺序写入的页数（水位），采集调度据此滑动窗口
+    - get_stats(): 队列深度与写入延迟，用于判断瓶颈在网络还是数据库
+    """
+
+    # 结束信号
+    _SENTINEL = object()
+
+    def __init__(self, collector, update_existing=True, keys=None, max_queue_pages=None, batch_pages=5, label='页'):
+        """
+        初始化入库线程
+
+        Args:
+            collector: MacCMSCollector实例
+            update_existing: 是否更新已存在的视频
+            keys: 页码（或批次号）的写入顺序
+            max_queue_pages: 队列最多缓存的页数，默认并发线程数的4倍
+            batch_pages: 每个事务最多写入的页数
+            label: 日志中页码的单位（差异采集按批次记录）
+        """
+        self.collector = collector
+        self.update_existing = update_existing
+        self.keys = list(keys or [])
+        self.batch_pages = max(1, batch_pages)
+        self.label = label
+        self.queue_capacity = max_queue_pages or max(4, collector.max_workers * 4)
+        self.queue = queue.Queue(maxsize=self.queue_capacity)
+        self.thread = None
+
+        # 重排缓冲区 {key: item}，committed 为已按顺序写入的页数
+        self.reorder = {}
+        self.committed = 0
+
+        # 统计信息
+        self.pages_queued = 0
+        self.pages_written = 0
+        self.writer_lag = 0.0  # 最近一批数据在队列中等待的秒数
+        self.last_batch_seconds = 0.0  # 最近一批数据的入库耗时
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        """启动写入线程（需在应用上下文中调用）"""
+        app = self.collector.app or current_app._get_current_object()
+        self.thread = threading.Thread(target=self._run, args=(app,), daemon=True)
+        self.thread.start()
+
+    def submit(self, page, result):
+        """
+        提交一页采集结果
+
+        Args:
+            page: 页码
+            result: fetch_data 返回的标准化数据，请求失败时 code != 1
+
+        Returns:
+            bool: 是否成功放入队列（采集已停止时返回False）
+        """
+        item = (page, result, time.time())
+        while not self.collector.should_stop:
+            try:
+                self.queue.put(item, timeout=0.5)
+                with self.stats_lock:
+                    self.pages_queued += 1
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """发送结束信号并等待队列写完"""
+        if self.thread is None:
+            return
+        self.queue.put(self._SENTINEL)
+        self.thread.join()
+        self.thread = None
+
+    def get_committed(self):
+        """已按顺序写入的页数"""
+        return self.committed
+
+    def get_stats(self):
+        """获取队列与写入延迟统计"""
+        with self.stats_lock:
+            committed = self.committed
+            return {
+                'queue_depth': self.queue.qsize(),
+                'queue_capacity': self.queue_capacity,
+                'reorder_buffer': len(self.reorder),
+                'committed_upto': self.keys[committed - 1] if committed else None,
+                'pages_queued': self.pages_queued,
+                'pages_written': self.pages_written,
+                'writer_lag': round(self.writer_lag, 3),
+                'writer_batch_seconds': round(self.last_batch_seconds, 3),
+            }
+
+    def _run(self, app):
+        """写入线程主循环"""
+        with app.app_context():
+            finished = False
+            while not finished:
+                item = self.queue.get()
+                if item is self._SENTINEL:
+                    break
+                self.reorder[item[0]] = item
+                # 取走队列中已到达的页，减少采集线程等待
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._SENTINEL:
+                        finished = True
+                        break
+                    self.reorder[item[0]] = item
+                self._write_ready()
+            # 停止采集后前面缺页的数据不再写入
+            with self.stats_lock:
+                self.pages_written += len(self.reorder)
+            self.reorder.clear()
+
+    def _write_ready(self):
+        """按顺序写入重排缓冲区中连续的页，尽量多页合并为一个事务"""
+        while self.committed < len(self.keys) and self.keys[self.committed] in self.reorder:
+            batch = []
+            while len(batch) < self.batch_pages and self.committed + len(batch) < len(self.keys):
+                key = self.keys[self.committed + len(batch)]
+                if key not in self.reorder:
+                    break
+                batch.append(self.reorder.pop(key))
+            self._write_batch(batch)
+            with self.stats_lock:
+                self.committed += len(batch)
+
+    def _write_batch(self, batch):
+        """写入一批页面"""
+        collector = self.collector
+        now = time.time()
+        with self.stats_lock:
+            self.writer_lag = now - min(queued_at for _, _, queued_at in batch)
+
+        if collector.should_stop:
+            # 已停止（手动或连续重复）时丢弃剩余数据，与逐页采集保持一致
+            with self.stats_lock:
+                self.pages_written += len(batch)
+            return
+
+        pages = []
+        for page, result, _ in batch:
+            if result.get('deferred'):
+                # 已放入稍后重试列表，本轮只推进顺序水位
+                continue
+            if result.get('code') != 1:
+                with collector.count_lock:
+                    collector.failed_pages += 1
+                self._log_page(page, 0, 0, 1)
+                continue
+            pages.append((page, result.get('list', [])))
+
+        saved = False
+        try:
+            if collector.batch_ingest:
+                results = collector.save_pages(pages, self.update_existing) if pages else []
+            else:
+                results = []
+                for page, videos in pages:
+                    if collector.should_stop or self._reached_duplicates():
+                        break
+                    results.append(collector._save_page_statuses(videos, self.update_existing, page))
+            saved = True
+        except Exception as e:
+            error_msg = f"第 {[page for page, _ in pages]} {self.label}入库异常: {str(e)}"
+            print(error_msg)
+            collector.errors.append(error_msg)
+            with collector.count_lock:
+                collector.failed_pages += len(pages)
+            results = [[] for _ in pages]
+
+        for (page, videos), statuses in zip(pages, results):
+            success = sum(1 for status, _ in statuses if status == 'success')
+            skip = sum(1 for status, _ in statuses if status == 'skip')
+            self._log_page(page, success, skip, len(statuses) - success - skip)
+            # 逐条入库时中途停止的页只写入了一部分，不记为已完成
+            if saved and len(statuses) == len(videos):
+                collector._mark_page_done(page)
+
+        with self.stats_lock:
+            self.pages_written += len(batch)
+            self.last_batch_seconds = time.time() - now
+
+        if self._reached_duplicates() and not collector.should_stop:
+            print(f"连续 {collector.consecutive_duplicates} 个重复，自动停止采集")
+            collector.should_stop = True
+            SystemLog.log(
+                log_type='collect',
+                level='info',
+                module='maccms_collector',
+                message='采集自动停止',
+                details=json.dumps({
+                    'reason': 'consecutive_duplicates',
+                    'count': collector.consecutive_duplicates,
+                    'threshold': collector.max_consecutive_duplicates
+                }, ensure_ascii=False)
+            )
+
+    def _reached_duplicates(self):
+        """是否达到连续重复阈值（差异采集不按连续重复停止）"""
+        collector = self.collector
+        with collector.count_lock:
+            return collector.stop_on_duplicates and \
+                collector.consecutive_duplicates >= collector.max_consecutive_duplicates
+
+    def _log_page(self, page, success, skip, failed):
+        """记录单页完成日志"""
+        print(f"第 {page} {self.label}完成: 成功={success}, 跳过={skip}, 失败={failed}")
+        SystemLog.log(
+            log_type='collect',
+            level='info',
+            module='maccms_collector',
+            message=f'第{page}{self.label}采集完成',
+            details=json.dumps({
+                'page': page,
+                'success': success,
+                'skip': skip,
+                'failed': failed
+            }, ensure_ascii=False)
+        )
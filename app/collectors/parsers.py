@@ -0,0 +1,176 @@
+"""
+采集响应解析后端
+
+- JSON: 安装了 orjson 时使用 orjson（pip install orjson），否则使用标准库 json
+- XML: 使用 lxml 的 iterparse 流式解析，每解析完一个 <video> 就释放其节点，
+  未安装 lxml 时退回标准库 ElementTree
+
+后端自动选择，各后端返回相同的结构；每个 <video> 只遍历一次子节点，
+不再对每个字段调用 find()
+"""
+
+import json
+import re
+import xml.etree.ElementTree as ET
+from io import BytesIO
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    from lxml import etree
+except ImportError:  # 可选依赖
+    etree = None
+
+# <video> 子节点到视频字段的映射
+XML_FIELDS = {
+    'id': 'vod_id',
+    'tid': 'type_id',
+    'name': 'vod_name',
+    'type': 'type_name',
+    'pic': 'vod_pic',
+    'lang': 'vod_lang',
+    'area': 'vod_area',
+    'year': 'vod_year',
+    'note': 'vod_remarks',
+    'actor': 'vod_actor',
+    'director': 'vod_director',
+    'des': 'vod_content',
+    'last': 'vod_time',
+}
+
+# 解析失败时可能抛出的异常
+XML_ERRORS = (ET.ParseError, ValueError) + ((etree.XMLSyntaxError,) if etree is not None else ())
+
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def json_backend():
+    """当前的JSON解析后端名称"""
+    return 'orjson' if orjson is not None else 'json'
+
+
+def xml_backend():
+    """当前的XML解析后端名称"""
+    return 'lxml' if etree is not None else 'etree'
+
+
+def loads_json(text):
+    """
+    解析JSON文本
+
+    Raises:
+        json.JSONDecodeError: JSON格式错误（orjson的异常也是其子类）
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def parse_xml(text, backend=None):
+    """
+    解析 MacCMS10 XML 响应
+
+    Args:
+        text: 响应文本
+        backend: 'lxml' | 'etree'，默认自动选择
+
+    Returns:
+        dict: {'page', 'pagecount', 'pagesize', 'recordcount', 'list', 'class'}
+
+    Raises:
+        XML_ERRORS 中的异常: XML格式错误或缺少 <list> 节点
+    """
+    backend = backend or xml_backend()
+    if backend == 'lxml':
+        return _parse_xml_lxml(text)
+    return _parse_xml_etree(text)
+
+
+def _video_from_element(elem):
+    """从 <video> 节点提取视频字段（同名子节点取第一个，与 find() 一致）"""
+    video = dict.fromkeys(XML_FIELDS.values(), '')
+    seen = set()
+    dl_elem = None
+    for child in elem:
+        tag = child.tag
+        if tag in seen:
+            continue
+        seen.add(tag)
+        key = XML_FIELDS.get(tag)
+        if key is not None:
+            video[key] = child.text or ''
+        elif tag == 'dl':
+            dl_elem = child
+    if dl_elem is not None:
+        play_from = []
+        play_url = []
+        for dd in dl_elem:
+            if dd.tag == 'dd':
+                play_from.append(dd.get('flag', ''))
+                play_url.append(dd.text or '')
+        video['vod_play_from'] = '$$$'.join(play_from)
+        video['vod_play_url'] = '$$$'.join(play_url)
+    return video
+
+
+def _page_info(list_elem):
+    """<list> 节点上的分页信息"""
+    return {
+        'page': int(list_elem.get('page', 1)),
+        'pagecount': int(list_elem.get('pagecount', 1)),
+        'pagesize': int(list_elem.get('pagesize', 20)),
+        'recordcount': int(list_elem.get('recordcount', 0)),
+    }
+
+
+def _parse_xml_etree(text):
+    """标准库 ElementTree 解析（整棵树）"""
+    root = ET.fromstring(text)
+    list_elem = root.find('list')
+    if list_elem is None:
+        raise ValueError('缺少list节点')
+    result = _page_info(list_elem)
+    result['list'] = [_video_from_element(elem) for elem in list_elem.findall('video')]
+    class_elem = root.find('class')
+    result['class'] = [
+        {'type_id': ty.get('id', ''), 'type_name': ty.text or ''}
+        for ty in class_elem.findall('ty')
+    ] if class_elem is not None else []
+    return result
+
+
+def _parse_xml_lxml(text):
+    """lxml iterparse 流式解析，只在 <video> 结束时取出字段，已处理的节点立即释放"""
+    # 响应已按文本解码，去掉编码声明后统一按UTF-8交给lxml
+    data = _XML_DECLARATION.sub('', text, count=1).encode('utf-8')
+    context = etree.iterparse(BytesIO(data), events=('end',), tag='video', resolve_entities=False)
+    list_elem = None
+    videos = []
+    for _, elem in context:
+        parent = elem.getparent()
+        if list_elem is None:
+            root = parent.getparent() if parent is not None else None
+            if root is not None and root.getparent() is None:
+                list_elem = root.find('list')
+        # 与 find('list').findall('video') 一致：只取第一个 <list> 下的 <video>
+        if parent is list_elem:
+            videos.append(_video_from_element(elem))
+        elem.clear()
+        # 释放已处理的兄弟节点
+        while elem.getprevious() is not None:
+            del parent[0]
+    root = context.root
+    list_elem = root.find('list')
+    if list_elem is None:
+        raise ValueError('缺少list节点')
+    result = _page_info(list_elem)
+    result['list'] = videos
+    class_elem = root.find('class')
+    result['class'] = [
+        {'type_id': ty.get('id', ''), 'type_name': ty.text or ''}
+        for ty in class_elem.findall('ty')
+    ] if class_elem is not None else []
+    return result
@@ -0,0 +1,129 @@
+"""
+按主机限速
+
+进程内所有采集请求（采集任务、接口测试、获取分类）共用一组按主机划分的令牌桶，
+多个任务同时采集同一资源站时合计速率也不会超过该采集源配置的限速
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    - rate: 每秒补充的令牌数（即平均请求速率）
+    - burst: 桶容量，允许的瞬时突发请求数
+    - reserve() 预约一个令牌并返回需要等待的秒数，
+      线程和协程都可以据此自行等待，不在锁内睡眠
+    """
+
+    def __init__(self, rate, burst=None):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated_at = time.monotonic()
+        self.requests = 0
+        self.waited = 0.0
+        self.configure(rate, burst)
+        self.tokens = float(self.burst)
+
+    def configure(self, rate, burst=None):
+        """更新速率和容量（已有令牌不超过新容量）"""
+        with self.lock:
+            self.rate = float(rate)
+            self.burst = max(1, int(burst or 0) or int(round(self.rate)) or 1)
+            self.tokens = min(self.tokens, float(self.burst))
+
+    def reserve(self):
+        """
+        预约一个令牌
+
+        Returns:
+            float: 需要等待的秒数（0表示立即发送）
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            self.requests += 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += delay
+            return delay
+
+    def get_stats(self):
+        """获取令牌桶统计"""
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'requests': self.requests,
+                'waited_seconds': round(self.waited, 3),
+            }
+
+
+class HostRateLimiter:
+    """
+    进程级按主机限速器
+
+    - configure(url, rate, burst): 按采集源配置设置该主机的限速，rate<=0 表示不限速
+    - reserve(url): 所有采集请求发送前调用，返回需要等待的秒数
+    - 同一主机的多个采集源取最近一次配置
+    """
+
+    def __init__(self):
+        self.buckets = {}  # {host: TokenBucket}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url):
+        """提取URL中的主机（含端口）"""
+        return urlsplit(url).netloc.lower()
+
+    def configure(self, url, rate, burst=None):
+        """
+        设置主机限速
+
+        Args:
+            url: 采集接口URL
+            rate: 每秒请求数，<=0 表示不限速
+            burst: 允许的瞬时突发请求数，默认与rate相同
+        """
+        host = self.host_of(url)
+        with self.lock:
+            if not rate or rate <= 0:
+                self.buckets.pop(host, None)
+                return
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                self.buckets[host] = TokenBucket(rate, burst)
+            else:
+                bucket.configure(rate, burst)
+
+    def reserve(self, url):
+        """
+        预约一次请求
+
+        Returns:
+            float: 需要等待的秒数，未限速的主机返回0
+        """
+        bucket = self.buckets.get(self.host_of(url))
+        if bucket is None:
+            return 0.0
+        return bucket.reserve()
+
+    def get_stats(self, url):
+        """
+        获取主机的限速统计
+
+        Returns:
+            dict: 未限速时为None
+        """
+        bucket = self.buckets.get(self.host_of(url))
+        return bucket.get_stats() if bucket else None
+
+
+# 进程内共享的限速器
+rate_limiter = HostRateLimiter()
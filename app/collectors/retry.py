@@ -0,0 +1,77 @@
+"""
+采集重试策略
+
+统一管理采集请求的重试：抖动退避、单次请求截止时间和任务级重试预算，
+避免一个异常页在多层重试下放大成大量请求和长时间占用采集线程
+"""
+
+import random
+import threading
+
+
+class RetryPolicy:
+    """
+    重试策略（线程安全）
+
+    - backoff(): 全抖动指数退避，random(0, min(cap, base * 2^attempt))
+    - deadline: 单次 fetch 的总时长上限（含所有重试和等待）
+    - 重试预算: 整个任务的重试次数不超过 budget_min + 请求数 * budget_ratio，
+      资源站大面积故障时快速失败，而不是每页都重试满
+    """
+
+    def __init__(self, max_attempts=3, base=0.5, cap=8.0, deadline=60.0, budget_ratio=0.2, budget_min=10):
+        """
+        初始化重试策略
+
+        Args:
+            max_attempts: 单次请求的最大尝试次数（含第一次）
+            base: 退避基数（秒）
+            cap: 单次退避上限（秒）
+            deadline: 单次请求含重试的总时长上限（秒）
+            budget_ratio: 重试预算占请求数的比例
+            budget_min: 任务开始阶段的最少重试预算
+        """
+        self.max_attempts = max(1, int(max_attempts))
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0  # 因预算耗尽而放弃的重试次数
+        self.lock = threading.Lock()
+
+    def backoff(self, attempt):
+        """第 attempt 次失败后的等待秒数（attempt 从0开始）"""
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+    def record_request(self):
+        """记录一次请求（用于计算重试预算）"""
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self):
+        """
+        申请一次重试
+
+        Returns:
+            bool: 预算充足时返回True并扣减
+        """
+        with self.lock:
+            if self.retries < self.budget_min + self.requests * self.budget_ratio:
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def get_stats(self):
+        """获取重试统计"""
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'retry_budget_left': max(0, int(self.budget_min + self.requests * self.budget_ratio) - self.retries),
+                'retry_exhausted': self.exhausted,
+            }
@@ -7,6 +7,7 @@
 import threading
 from flask import current_app
 from app.downloaders.image_downloader import ImageDownloader
+from app.downloaders.poster_store import PosterStore, poster_folder
 
 
 class ImageDownloadManager:
@@ -29,32 +30,54 @@ class ImageDownloadManager:
                     cls._instance.last_result = None
         return cls._instance
     
-    def start_download(self, app):
+    # 下载模式
+    MODES = {
+        'all': '全部检查',
+        'incremental': '增量下载',
+        'continuous': '持续增量',
+    }
+    
+    def start_download(self, app, mode='all'):
         """
         启动图片下载任务
         
         Args:
             app: Flask应用实例
+            mode: 'all' 检查所有视频 | 'incremental' 只下载未本地化的视频 |
+                'continuous' 增量下载并按间隔持续扫描，直到手动停止
             
         Returns:
             tuple: (是否成功, 消息)
         """
         if self.downloader and self.downloader.is_running:
             return False, "已有下载任务正在运行"
+        if mode not in self.MODES:
+            return False, f"未知的下载模式: {mode}"
         
         # 创建新的下载器，传入app实例
-        self.downloader = ImageDownloader(app=app)
+        downloader = self.downloader = ImageDownloader(
+            app=app, variant_workers=app.config.get('IMAGE_VARIANT_WORKERS', 2)
+        )
+        # 线程启动前标记为运行中，避免重复启动
+        downloader.is_running = True
+        interval = app.config.get('IMAGE_LOCALIZE_INTERVAL', 300)
+        chunk_size = app.config.get('IMAGE_LOCALIZE_CHUNK_SIZE', 500)
         
         # 在新线程中执行下载
         def run_download():
             with app.app_context():
-                result = self.downloader.download_all()
+                if mode == 'all':
+                    result = downloader.download_all()
+                else:
+                    result = downloader.download_incremental(
+                        continuous=(mode == 'continuous'), interval=interval, chunk_size=chunk_size
+                    )
                 self.last_result = result
         
         self.thread = threading.Thread(target=run_download, daemon=True)
         self.thread.start()
         
-        return True, "图片下载任务已启动"
+        return True, f"图片下载任务已启动（{self.MODES[mode]}）"
     
     def stop_download(self):
         """
@@ -86,7 +109,18 @@ class ImageDownloadManager:
             'processed_count': 0,
             'current_video': None,
             'is_running': False,
-            'errors': []
+            'mode': None,
+            'passes': 0,
+            'next_pass_in': None,
+            'errors': [],
+            'http_requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'connection_reuse_rate': 0.0,
+            'variants_enabled': False,
+            'variants_pending': 0,
+            'variants_built': 0,
+            'variants_failed': 0
         }
     
     def get_last_result(self):
@@ -113,5 +147,15 @@ class ImageDownloadManager:
             return downloader.verify_all_localized()
 
 
+def poster_store(app=None):
+    """
+    获取封面存储（根目录由应用的 static_folder 计算）
+
+    Args:
+        app: Flask应用实例，默认使用当前应用
+    """
+    return PosterStore(poster_folder(app))
+
+
 # 全局下载管理器实例
 download_manager = ImageDownloadManager()
@@ -3,10 +3,13 @@
 
 该模块负责下载视频封面图片到本地服务器
 - 多线程下载图片
+- 每个线程复用长连接会话（keep-alive），同一图床只握手一次
 - 自动重试机制
 - 支持启动和停止
 - 更新数据库中的图片路径
-- 线程安全的数据库操作
+- 本地化结果由单独的写入线程批量提交
+- 封面按内容摘要分片存储，相同URL只下载一次，相同内容只保存一份
+- 原图保存后在进程池中生成多规格的 AVIF/WebP/JPEG 派生图
 """
 
 import requests
@@ -14,15 +17,17 @@ import os
 import time
 import threading
 from datetime import datetime
-from queue import Queue
+from queue import Queue, Full, Empty
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import current_app
+from requests.adapters import HTTPAdapter
 from app.models.video import Video
 from app.models.system_log import SystemLog
+from app.models.poster_url import PosterUrl
+from app.downloaders.result_writer import LocalizeWriter
+from app.downloaders.poster_store import PosterStore, load_url_mappings, is_blob_path, poster_folder
+from app.downloaders.poster_variants import VariantBuilder
 from app import db
-from werkzeug.utils import secure_filename
-import hashlib
-from urllib.parse import urlparse
 
 
 class ImageDownloader:
@@ -33,19 +38,23 @@ class ImageDownloader:
     支持多线程并发下载
     """
     
-    def __init__(self, app=None, upload_folder='app/static/uploads/posters', timeout=30, max_retries=3, max_workers=10):
+    def __init__(self, app=None, upload_folder=None, timeout=30, max_retries=3, max_workers=10,
+                 flush_size=200, flush_interval=0.5, variant_workers=2):
         """
         初始化图片下载器
         
         Args:
             app: Flask应用实例
-            upload_folder (str): 图片保存的文件夹路径
+            upload_folder (str): 图片保存的文件夹路径，默认为应用static目录下的 uploads/posters
             timeout (int): 下载超时时间（秒）
             max_retries (int): 下载失败时的最大重试次数
             max_workers (int): 最大工作线程数
+            flush_size (int): 本地化结果每批写入的条数
+            flush_interval (float): 本地化结果最多攒多少秒后写入
+            variant_workers (int): 生成派生图的进程数，0 表示不生成
         """
         self.app = app
-        self.upload_folder = upload_folder
+        self.upload_folder = upload_folder or poster_folder(app)
         self.timeout = timeout
         self.max_retries = max_retries
         self.max_workers = max_workers
@@ -59,80 +68,146 @@ class ImageDownloader:
         self.current_video = None
         self.total_videos = 0
         self.processed_count = 0
+        self.mode = 'all'
+        self.passes = 0
+        self.next_pass_at = None
+        self.failed_ids = set()
         
         # 线程锁，用于保护共享资源
         self.count_lock = threading.Lock()
-        self.db_lock = threading.Lock()
+        
+        # 本地化结果写入线程（download_all 时创建）
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.writer = None
+        
+        # 派生图生成进程池（下载任务开始时创建）
+        self.variant_workers = variant_workers
+        self.variants = None
+        
+        # 线程本地的长连接会话，任务结束时统一关闭
+        self.local = threading.local()
+        self.sessions = []
+        # 已关闭会话的连接统计
+        self.closed_requests = 0
+        self.closed_connections = 0
         
         # 确保上传文件夹存在
         os.makedirs(self.upload_folder, exist_ok=True)
+        self.store = PosterStore(self.upload_folder)
+        
+        # URL到存储文件的映射 {url_hash: blob}，下载失败的URL和正在下载的URL
+        self.url_blobs = {}
+        self.failed_urls = set()
+        self.inflight = {}
+        self.url_reused = 0
     
     def _create_session(self):
         """
-        创建带重试机制的requests会话（线程本地）
+        创建带连接池的requests会话（线程本地）
+        
+        每个主机的连接池大小与线程数一致，连接在请求之间保持（keep-alive），
+        同一图床的后续图片不再重新进行TCP/TLS握手
         """
         session = requests.Session()
         session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://www.google.com/'
+            'Referer': 'https://www.google.com/',
+            'Connection': 'keep-alive'
         })
+        # 重试由 download_image 控制，连接层不再重试
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
         return session
     
-    def _generate_filename(self, url, vod_id):
+    def _get_session(self):
+        """获取当前线程的会话，首次调用时创建"""
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = self._create_session()
+            with self.count_lock:
+                self.sessions.append(session)
+        return session
+    
+    @staticmethod
+    def _pool_stats(session):
         """
-        生成唯一的文件名
+        统计会话中各主机连接池的请求数和新建连接数
         
-        Args:
-            url (str): 图片URL
-            vod_id (int): 视频ID
-            
         Returns:
-            str: 生成的文件名
+            tuple: (请求数, 新建连接数)
         """
-        # 获取文件扩展名
-        parsed_url = urlparse(url)
-        path = parsed_url.path
-        ext = os.path.splitext(path)[1].lower()
-        
-        # 如果没有扩展名，默认使用.jpg
-        if not ext or ext not in ['.jpg', '.jpeg', '.png', '.webp', '.gif']:
-            ext = '.jpg'
-        
-        # 使用视频ID和URL的MD5生成唯一文件名
-        url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-        filename = f"poster_{vod_id}_{url_hash}{ext}"
+        requests_count = 0
+        connections = 0
+        # http:// 和 https:// 挂载的是同一个适配器，只统计一次
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_count += pool.num_requests
+                    connections += pool.num_connections
+        return requests_count, connections
+    
+    def close_sessions(self):
+        """关闭所有线程的会话（关闭前保留连接统计）"""
+        with self.count_lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            requests_count, connections = self._pool_stats(session)
+            with self.count_lock:
+                self.closed_requests += requests_count
+                self.closed_connections += connections
+            session.close()
+        self.local = threading.local()
+    
+    def get_connection_stats(self):
+        """
+        获取连接复用统计
         
-        return secure_filename(filename)
+        Returns:
+            dict: {'http_requests', 'connections_opened', 'connections_reused', 'connection_reuse_rate'}
+        """
+        with self.count_lock:
+            sessions = list(self.sessions)
+            requests_count = self.closed_requests
+            connections = self.closed_connections
+        for session in sessions:
+            session_requests, session_connections = self._pool_stats(session)
+            requests_count += session_requests
+            connections += session_connections
+        reused = max(0, requests_count - connections)
+        return {
+            'http_requests': requests_count,
+            'connections_opened': connections,
+            'connections_reused': reused,
+            'connection_reuse_rate': round(reused / requests_count, 3) if requests_count else 0.0
+        }
     
-    def download_image(self, url, save_path):
+    def download_image(self, url):
         """
-        下载单张图片（线程安全）
+        下载单张图片到内容寻址存储（线程安全）
         
         Args:
             url (str): 图片URL
-            save_path (str): 保存路径
             
         Returns:
-            bool: 下载是否成功
+            tuple: (相对路径, 文件大小)，下载失败时为None
         """
-        # 每个线程创建自己的session
-        session = self._create_session()
+        # 复用当前线程的长连接会话
+        session = self._get_session()
         
         for attempt in range(self.max_retries):
             try:
-                response = session.get(url, timeout=self.timeout, stream=True, verify=False)
-                response.raise_for_status()
-                
-                # 写入文件
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                
-                session.close()
-                return True
+                # 响应读完或出错时连接归还连接池
+                with session.get(url, timeout=self.timeout, stream=True, verify=False) as response:
+                    response.raise_for_status()
+                    
+                    # 边下载边计算内容摘要，写入分片目录
+                    return self.store.save_stream(response.iter_content(chunk_size=8192), url)
                 
             except requests.exceptions.RequestException as e:
                 if attempt < self.max_retries - 1:
@@ -140,16 +215,71 @@ class ImageDownloader:
                 else:
                     with self.count_lock:
                         self.errors.append(f"下载失败 {url}: {str(e)}")
-                    session.close()
-                    return False
+                    return None
             except Exception as e:
                 with self.count_lock:
-                    self.errors.append(f"保存失败 {save_path}: {str(e)}")
-                session.close()
-                return False
+                    self.errors.append(f"保存失败 {url}: {str(e)}")
+                return None
         
-        session.close()
-        return False
+        return None
+    
+    def _load_mappings(self, videos):
+        """批量读取一批视频封面URL的映射（需在应用上下文中调用）"""
+        hashes = {PosterUrl.hash_url(video.vod_pic) for video in videos if video.vod_pic}
+        with self.count_lock:
+            hashes -= self.url_blobs.keys()
+        found = load_url_mappings(hashes)
+        with self.count_lock:
+            for url_hash, blob in found.items():
+                self.url_blobs.setdefault(url_hash, blob)
+    
+    def _fetch_blob(self, url):
+        """
+        获取URL对应的存储文件，已下载过的URL直接复用
+        
+        多个线程同时请求同一URL时只有一个线程下载，其他线程等待其结果
+        
+        Returns:
+            str: 相对路径，下载失败时为None
+        """
+        url_hash = PosterUrl.hash_url(url)
+        while True:
+            with self.count_lock:
+                if url_hash in self.failed_urls:
+                    return None
+                blob = self.url_blobs.get(url_hash)
+                event = self.inflight.get(url_hash)
+                owner = blob is None and event is None
+                if owner:
+                    event = self.inflight[url_hash] = threading.Event()
+            if blob is not None:
+                if self.store.exists(blob):
+                    with self.count_lock:
+                        self.url_reused += 1
+                    return blob
+                # 映射的文件已被删除，重新下载
+                with self.count_lock:
+                    if self.url_blobs.get(url_hash) == blob:
+                        del self.url_blobs[url_hash]
+                continue
+            if not owner:
+                event.wait()
+                continue
+            saved = None
+            try:
+                saved = self.download_image(url)
+            finally:
+                with self.count_lock:
+                    if saved is None:
+                        self.failed_urls.add(url_hash)
+                    else:
+                        self.url_blobs[url_hash] = saved[0]
+                    del self.inflight[url_hash]
+                event.set()
+            if saved is None:
+                return None
+            self.writer.map_url(url_hash, url, *saved)
+            return saved[0]
     
     def verify_local_image(self, video):
         """
@@ -178,113 +308,91 @@ class ImageDownloader:
         
         return exists
     
-    def process_video(self, video_id):
+    def process_video(self, video):
         """
         处理单个视频的图片下载（线程安全）
         
+        视频信息由 download_all 预先批量读取，本地化结果交给写入线程批量提交，
+        下载线程不访问数据库
+        
         Args:
-            video_id (int): 视频ID
+            video: 视频行，含 id、vod_name、vod_pic、is_localized、local_pic
             
         Returns:
             str: 处理结果 'success', 'skip', 'error'
         """
-        # 在Flask应用上下文中执行
-        with self.app.app_context():
-            # 每个线程单独查询数据库
-            with self.db_lock:
-                video = db.session.query(Video).filter_by(id=video_id).first()
-                if not video:
-                    return 'error'
-                
-                # 验证本地化状态，检查文件是否真实存在
-                if video.is_localized and video.local_pic:
-                    file_path = os.path.join(self.upload_folder, video.local_pic)
-                    if os.path.exists(file_path):
-                        # 文件存在，跳过
-                        with self.count_lock:
-                            self.skip_count += 1
-                        return 'skip'
-                    else:
-                        # 文件不存在，重置标记
-                        video.is_localized = False
-                        video.local_pic = ''
-                        db.session.commit()
-                
-                # 检查是否有有效的图片URL
-                if not video.vod_pic or not video.vod_pic.startswith('http'):
-                    with self.count_lock:
-                        self.skip_count += 1
-                    return 'skip'
-                
-                # 获取必要的信息
-                vod_name = video.vod_name
-                vod_pic = video.vod_pic
-            
-            try:
-                # 设置当前处理的视频名称
+        video_id = video.id
+        vod_name = video.vod_name
+        vod_pic = video.vod_pic
+        
+        # 验证本地化状态，检查文件是否真实存在
+        if video.is_localized and video.local_pic:
+            file_path = os.path.join(self.upload_folder, video.local_pic)
+            if os.path.exists(file_path):
+                # 文件存在，跳过；补齐缺少的派生图
+                self._build_variants(video.local_pic)
                 with self.count_lock:
-                    self.current_video = vod_name
-                
-                # 生成文件名和保存路径
-                filename = self._generate_filename(vod_pic, video_id)
-                save_path = os.path.join(self.upload_folder, filename)
-                
-                # 如果文件已存在，只更新数据库
-                if os.path.exists(save_path):
-                    with self.db_lock:
-                        video = db.session.query(Video).filter_by(id=video_id).first()
-                        if video:
-                            video.local_pic = filename
-                            video.is_localized = True
-                            db.session.commit()
-                    with self.count_lock:
-                        self.success_count += 1
-                    return 'success'
-                
-                # 下载图片
-                if self.download_image(vod_pic, save_path):
-                    # 更新数据库中的本地化字段
-                    with self.db_lock:
-                        video = db.session.query(Video).filter_by(id=video_id).first()
-                        if video:
-                            video.local_pic = filename
-                            video.is_localized = True
-                            db.session.commit()
-                    
-                    with self.count_lock:
-                        self.success_count += 1
-                    return 'success'
-                else:
-                    with self.count_lock:
-                        self.failed_count += 1
-                    # 记录下载失败日志
-                    with self.db_lock:
-                        SystemLog.log(
-                            log_type='download',
-                            level='warning',
-                            module='ImageDownloader',
-                            message=f'图片下载失败: {vod_name} (ID: {video_id})',
-                            details=vod_pic
-                        )
-                    return 'error'
-                    
-            except Exception as e:
-                with self.db_lock:
-                    db.session.rollback()
-                    error_msg = f"处理视频失败 (ID: {video_id}): {str(e)}"
-                    SystemLog.log(
-                        log_type='download',
-                        level='error',
-                        module='ImageDownloader',
-                        message=error_msg,
-                        details=str(e)
-                    )
-                
+                    self.skip_count += 1
+                return 'skip'
+            # 文件不存在，重置标记
+            self.writer.reset(video_id)
+        
+        # 检查是否有有效的图片URL
+        if not vod_pic or not vod_pic.startswith('http'):
+            with self.count_lock:
+                self.skip_count += 1
+            return 'skip'
+        
+        try:
+            # 设置当前处理的视频名称
+            with self.count_lock:
+                self.current_video = vod_name
+            
+            # 已下载过的URL直接复用存储文件，否则下载
+            blob = self._fetch_blob(vod_pic)
+            if blob is not None:
+                self.writer.mark_localized(video_id, blob)
+                self._build_variants(blob)
                 with self.count_lock:
-                    self.errors.append(error_msg)
-                    self.failed_count += 1
+                    self.success_count += 1
+                return 'success'
+            
+            with self.count_lock:
+                self.failed_count += 1
+            # 记录下载失败日志
+            self.writer.log('warning', f'图片下载失败: {vod_name} (ID: {video_id})', vod_pic)
+            return 'error'
                 
-                return 'error'
+        except Exception as e:
+            error_msg = f"处理视频失败 (ID: {video_id}): {str(e)}"
+            self.writer.log('error', error_msg, str(e))
+            
+            with self.count_lock:
+                self.errors.append(error_msg)
+                self.failed_count += 1
+            
+            return 'error'
+    
+    def _build_variants(self, local_pic):
+        """提交派生图生成任务（迁移前的平铺文件不生成）"""
+        if self.variants is not None and is_blob_path(local_pic):
+            self.variants.submit(local_pic)
+    
+    def _start_workers(self):
+        """启动写入线程和派生图进程池"""
+        self.writer = LocalizeWriter(self.app, self.flush_size, self.flush_interval)
+        self.writer.start()
+        self.variants = VariantBuilder(self.upload_folder, self.variant_workers)
+        self.variants.start()
+    
+    def _close_workers(self):
+        """写完剩余结果、等待派生图生成后关闭（手动停止时取消未开始的派生图）"""
+        if self.writer is not None:
+            self.writer.close()
+            self.errors.extend(self.writer.errors)
+        if self.variants is not None:
+            self.variants.close(cancel=self.should_stop)
+            self.errors.extend(self.variants.errors)
     
     def stop(self):
         """停止下载任务"""
@@ -346,14 +454,8 @@ class ImageDownloader:
             'fixed': fixed_count
         }
     
-    def download_all(self):
-        """
-        下载所有视频的图片（多线程）
-        
-        Returns:
-            dict: 下载结果统计
-        """
-        # 重置计数器和状态
+    def _reset_state(self, mode):
+        """重置计数器和状态"""
         self.success_count = 0
         self.failed_count = 0
         self.skip_count = 0
@@ -361,6 +463,180 @@ class ImageDownloader:
         self.is_running = True
         self.should_stop = False
         self.processed_count = 0
+        self.total_videos = 0
+        self.closed_requests = 0
+        self.closed_connections = 0
+        self.mode = mode
+        self.passes = 0
+        self.next_pass_at = None
+        self.failed_ids = set()
+        self.url_blobs = {}
+        self.failed_urls = set()
+        self.inflight = {}
+        self.url_reused = 0
+        self.store.deduped = 0
+    
+    def _record_processed(self):
+        """累计已处理数并定期打印进度"""
+        with self.count_lock:
+            self.processed_count += 1
+            if self.processed_count % 10 == 0:
+                print(f"进度: {self.processed_count}/{self.total_videos} - "
+                      f"成功: {self.success_count}, 失败: {self.failed_count}, 跳过: {self.skip_count}")
+    
+    def _pending_chunks(self, chunk_size):
+        """
+        按主键游标分页读取未本地化的视频（走 is_localized 索引，不读取已本地化的视频）
+        
+        Args:
+            chunk_size: 每次读取的行数
+            
+        Yields:
+            list: 视频行，含 id、vod_name、vod_pic、is_localized、local_pic
+        """
+        last_id = 0
+        while not self.should_stop:
+            rows = Video.query.filter(
+                Video.is_localized == False,  # noqa: E712 使用等值条件才能走索引
+                Video.id > last_id,
+                Video.vod_pic.like('http%')
+            ).with_entities(
+                Video.id, Video.vod_name, Video.vod_pic, Video.is_localized, Video.local_pic
+            ).order_by(Video.id).limit(chunk_size).all()
+            self._load_mappings(rows)
+            # 结束读事务，下一页能看到写入线程刚提交的结果
+            db.session.rollback()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield rows
+    
+    def _worker(self, work_queue):
+        """增量模式的下载线程：从有界队列取视频处理，收到None时退出"""
+        while True:
+            video = work_queue.get()
+            if video is None:
+                return
+            try:
+                if self.process_video(video) == 'error':
+                    with self.count_lock:
+                        self.failed_ids.add(video.id)
+            except Exception as e:
+                with self.count_lock:
+                    self.failed_count += 1
+                    self.errors.append(f"线程异常 (视频ID: {video.id}): {str(e)}")
+            self._record_processed()
+    
+    def _run_pass(self, chunk_size):
+        """
+        执行一轮增量下载
+        
+        读取线程按游标分页把未本地化的视频放入有界队列，队列满时等待下载线程，
+        内存中最多只有 max_workers × 4 个待处理视频；本轮中已失败的视频和URL不再重复下载，
+        下一轮重新尝试（持续模式下失败集合不会无限增长，临时故障恢复后的视频也能本地化）
+        """
+        with self.count_lock:
+            self.failed_ids = set()
+            self.failed_urls = set()
+        pending = Video.query.filter(
+            Video.is_localized == False,  # noqa: E712
+            Video.vod_pic.like('http%')
+        ).count()
+        db.session.rollback()
+        with self.count_lock:
+            self.total_videos = self.processed_count + max(0, pending - len(self.failed_ids))
+        print(f"第 {self.passes + 1} 轮: {pending} 个视频未本地化")
+        
+        work_queue = Queue(maxsize=self.max_workers * 4)
+        workers = [threading.Thread(target=self._worker, args=(work_queue,), daemon=True)
+                   for _ in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for rows in self._pending_chunks(chunk_size):
+                for video in rows:
+                    if video.id in self.failed_ids:
+                        continue
+                    while not self.should_stop:
+                        try:
+                            work_queue.put(video, timeout=0.5)
+                            break
+                        except Full:
+                            continue
+                    if self.should_stop:
+                        break
+        finally:
+            if self.should_stop:
+                # 停止时丢弃尚未开始的视频
+                while True:
+                    try:
+                        work_queue.get_nowait()
+                    except Empty:
+                        break
+            for _ in workers:
+                work_queue.put(None)
+            for worker in workers:
+                worker.join()
+    
+    def download_incremental(self, continuous=False, interval=300, chunk_size=500):
+        """
+        增量下载未本地化视频的图片
+        
+        只读取 is_localized 为假的视频，已本地化的视频不再查询和检查文件；
+        持续模式下每轮结束后等待 interval 秒再扫描一次，新采集的视频在下一轮即可本地化
+        
+        Args:
+            continuous (bool): 是否持续运行，直到手动停止
+            interval (int): 持续模式下两轮之间的间隔（秒）
+            chunk_size (int): 每次从数据库读取的视频数
+            
+        Returns:
+            dict: 下载结果统计
+        """
+        self._reset_state('continuous' if continuous else 'incremental')
+        
+        try:
+            print("开始增量下载视频图片:")
+            print(f"  - 保存路径: {self.upload_folder}")
+            print(f"  - 线程数: {self.max_workers}")
+            if continuous:
+                print(f"  - 持续运行，每 {interval} 秒扫描一次")
+            print("-" * 60)
+            
+            self._start_workers()
+            
+            while not self.should_stop:
+                self._run_pass(chunk_size)
+                self.passes += 1
+                if not continuous:
+                    break
+                self.next_pass_at = time.time() + interval
+                while not self.should_stop and time.time() < self.next_pass_at:
+                    time.sleep(max(0.0, min(1.0, self.next_pass_at - time.time())))
+                self.next_pass_at = None
+            
+            if self.should_stop:
+                print("下载任务被手动停止")
+            print("-" * 60)
+            print(f"增量下载结束！共 {self.passes} 轮")
+            print(f"  - 成功: {self.success_count}")
+            print(f"  - 失败: {self.failed_count}")
+            
+        finally:
+            self.close_sessions()
+            self._close_workers()
+            self.is_running = False
+        
+        return self.get_result()
+    
+    def download_all(self):
+        """
+        下载所有视频的图片（多线程）
+        
+        Returns:
+            dict: 下载结果统计
+        """
+        self._reset_state('all')
         
         try:
             print("开始下载视频图片:")
@@ -370,21 +646,25 @@ class ImageDownloader:
             print(f"  - 线程数: {self.max_workers}")
             print("-" * 60)
             
-            # 获取所有需要下载图片的视频ID
+            # 一次读取所有需要下载图片的视频，下载线程不再逐条查询
             videos = Video.query.filter(
                 Video.vod_pic.isnot(None),
                 Video.vod_pic != ''
-            ).with_entities(Video.id).all()
+            ).with_entities(
+                Video.id, Video.vod_name, Video.vod_pic, Video.is_localized, Video.local_pic
+            ).all()
             
-            video_ids = [v.id for v in videos]
-            self.total_videos = len(video_ids)
+            self.total_videos = len(videos)
             print(f"找到 {self.total_videos} 个视频需要处理")
+            self._load_mappings(videos)
+            
+            self._start_workers()
             
             # 使用线程池处理视频
             with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 # 提交所有任务
-                future_to_video = {executor.submit(self.process_video, video_id): video_id 
-                                   for video_id in video_ids}
+                future_to_video = {executor.submit(self.process_video, video): video.id
+                                   for video in videos}
                 
                 # 处理完成的任务
                 for future in as_completed(future_to_video):
@@ -395,13 +675,8 @@ class ImageDownloader:
                     
                     video_id = future_to_video[future]
                     try:
-                        result = future.result()
-                        with self.count_lock:
-                            self.processed_count += 1
-                            
-                            if self.processed_count % 10 == 0:
-                                print(f"进度: {self.processed_count}/{self.total_videos} - "
-                                      f"成功: {self.success_count}, 失败: {self.failed_count}, 跳过: {self.skip_count}")
+                        future.result()
+                        self._record_processed()
                     except Exception as e:
                         with self.count_lock:
                             self.processed_count += 1
@@ -415,8 +690,15 @@ class ImageDownloader:
             print(f"  - 跳过: {self.skip_count}")
             
         finally:
+            self.close_sessions()
+            # 写完队列中剩余的结果、生成完派生图后再结束任务
+            self._close_workers()
             self.is_running = False
         
+        stats = self.get_connection_stats()
+        print(f"  - 连接复用: {stats['connections_reused']}/{stats['http_requests']} "
+              f"(新建连接 {stats['connections_opened']})")
+        
         return self.get_result()
     
     def get_result(self):
@@ -426,7 +708,7 @@ class ImageDownloader:
         Returns:
             dict: 结果字典
         """
-        return {
+        result = {
             'success_count': self.success_count,
             'failed_count': self.failed_count,
             'skip_count': self.skip_count,
@@ -434,5 +716,16 @@ class ImageDownloader:
             'processed_count': self.processed_count,
             'current_video': self.current_video,
             'is_running': self.is_running,
+            'mode': self.mode,
+            'passes': self.passes,
+            'next_pass_in': max(0, int(self.next_pass_at - time.time())) if self.next_pass_at else None,
+            'url_reused': self.url_reused,
+            'content_deduped': self.store.deduped,
             'errors': self.errors[:50]  # 只返回前50个错误
         }
+        result.update(self.get_connection_stats())
+        if self.writer is not None:
+            result.update(self.writer.get_stats())
+        if self.variants is not None:
+            result.update(self.variants.get_stats())
+        return result
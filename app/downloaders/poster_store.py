@@ -0,0 +1,420 @@
+"""
+内容寻址封面存储
+
+封面按内容的SHA1保存在两级分片目录中：<海报目录>/ab/cd/abcd...ef.jpg
+- 内容相同的图片只保存一份，无论来自多少个URL或视频
+- 每个目录最多几千个文件，os.path.exists 和备份不再受单目录文件数影响
+- 先写临时文件再原子替换，下载中断不会留下不完整的封面
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from flask import current_app
+from sqlalchemy import bindparam
+from app import db
+from app.models.video import Video
+from app.models.poster_url import PosterUrl
+from app.downloaders.poster_variants import variant_files
+
+# 按文件头识别的图片格式
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+
+# 批量查询时IN子句的最大参数个数（SQLite默认上限999）
+LOOKUP_CHUNK_SIZE = 500
+
+# 允许的扩展名（无法识别文件头时按URL判断）
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+def poster_folder(app=None):
+    """
+    封面存储根目录：<应用static目录>/uploads/posters
+
+    由应用的 static_folder 计算，与启动时的工作目录无关
+
+    Args:
+        app: Flask应用实例，默认使用当前应用（需在应用上下文中调用）
+    """
+    app = app or current_app
+    return os.path.join(app.static_folder, 'uploads', 'posters')
+
+
+def sniff_extension(head, url=''):
+    """
+    根据文件头判断图片扩展名，无法识别时使用URL中的扩展名，默认 .jpg
+
+    Args:
+        head: 文件开头的字节
+        url: 图片URL
+    """
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    ext = os.path.splitext(url.split('?', 1)[0])[1].lower()
+    if ext == '.jpeg':
+        return '.jpg'
+    return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+
+def is_blob_path(local_pic):
+    """local_pic 是否为内容寻址路径（迁移前的平铺文件名不含目录）"""
+    return bool(local_pic) and '/' in local_pic
+
+
+class PosterStore:
+    """
+    内容寻址封面存储（线程安全）
+
+    - save_stream(): 边下载边计算摘要，保存后返回相对路径
+    - import_file(): 把已有文件移入存储（迁移平铺目录）
+    - remove_unreferenced(): 删除没有视频引用的文件
+    """
+    def __init__(self, root):
+        """
+        Args:
+            root: 海报根目录
+        """
+        self.root = root
+        self.tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        # 内容已存在、未重复保存的文件数
+        self.deduped = 0
+
+    @staticmethod
+    def blob_path(digest, ext):
+        """内容摘要对应的相对路径"""
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def full_path(self, blob):
+        """相对路径对应的文件路径"""
+        return os.path.join(self.root, *blob.split('/'))
+
+    def exists(self, blob):
+        """文件是否存在"""
+        return bool(blob) and os.path.exists(self.full_path(blob))
+
+    def _commit(self, tmp_path, digest, ext):
+        """把临时文件放到内容寻址位置，内容已存在时丢弃临时文件"""
+        blob = self.blob_path(digest, ext)
+        path = self.full_path(blob)
+        with self.lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                self.deduped += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        return blob
+
+    def save_stream(self, chunks, url=''):
+        """
+        保存下载的图片
+
+        Args:
+            chunks: 字节块的可迭代对象
+            url: 图片URL（无法识别文件头时用于判断扩展名）
+
+        Returns:
+            tuple: (相对路径, 文件大小)
+
+        Raises:
+            ValueError: 内容为空
+        """
+        sha1 = hashlib.sha1()
+        size = 0
+        head = b''
+        tmp_path = self._tmp_path('part')
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if len(head) < 16:
+                        head += chunk[:16]
+                    sha1.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if not size:
+                raise ValueError('图片内容为空')
+            return self._commit(tmp_path, sha1.hexdigest(), sniff_extension(head, url)), size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _tmp_path(self, suffix):
+        """
+        当前线程的临时文件路径
+
+        下载任务和 db_manager.py migrate-posters 可能在不同进程中同时写入，
+        文件名同时包含进程ID和线程ID，避免互相覆盖
+        """
+        return os.path.join(self.tmp_dir, f'{os.getpid()}-{threading.get_ident()}.{suffix}')
+
+    @staticmethod
+    def _file_digest(path):
+        """
+        计算文件内容摘要
+
+        Returns:
+            tuple: (SHA1摘要, 文件开头的字节)
+        """
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            head = f.read(16)
+            sha1.update(head)
+            for chunk in iter(lambda: f.read(65536), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest(), head
+
+    def find_imported(self, path):
+        """
+        文件内容是否已在存储中
+
+        Returns:
+            str: 已存在时为相对路径，否则为None
+        """
+        digest, head = self._file_digest(path)
+        blob = self.blob_path(digest, sniff_extension(head, path))
+        return blob if self.exists(blob) else None
+
+    def import_file(self, path, keep=False):
+        """
+        把已有文件放入存储
+
+        Args:
+            path: 文件路径
+            keep: 是否保留原文件（硬链接到存储，不支持硬链接时复制），默认移动原文件
+
+        Returns:
+            tuple: (相对路径, 文件大小)
+        """
+        digest, head = self._file_digest(path)
+        size = os.path.getsize(path)
+        source = path
+        if keep:
+            source = self._tmp_path('import')
+            if os.path.exists(source):
+                os.remove(source)
+            try:
+                os.link(path, source)
+            except OSError:
+                shutil.copyfile(path, source)
+        return self._commit(source, digest, sniff_extension(head, path)), size
+
+    def remove_local_pics(self, local_pics):
+        """
+        删除已删除视频的本地图片（删除视频并提交后调用）
+
+        迁移前的平铺文件直接删除；内容寻址文件只在没有其他视频引用时删除
+
+        Args:
+            local_pics: 已删除视频的 local_pic
+
+        Returns:
+            int: 删除的文件数
+        """
+        removed = 0
+        blobs = []
+        for local_pic in local_pics:
+            if is_blob_path(local_pic):
+                blobs.append(local_pic)
+                continue
+            try:
+                os.remove(os.path.join(self.root, local_pic))
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f'删除图片文件失败: {local_pic}, 错误: {str(e)}')
+        return removed + self.remove_unreferenced(blobs)
+
+    def remove_variants(self, blob):
+        """删除原图的派生图"""
+        for path in variant_files(self.root, blob):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f'删除派生图失败: {path}, 错误: {str(e)}')
+
+    def remove_unreferenced(self, blobs):
+        """
+        删除已没有视频引用的文件、派生图及其URL映射（需在应用上下文中调用，删除视频并提交后调用）
+
+        Args:
+            blobs: 候选的相对路径
+
+        Returns:
+            int: 删除的文件数
+        """
+        blobs = sorted({blob for blob in blobs if is_blob_path(blob)})
+        removed = 0
+        for i in range(0, len(blobs), LOOKUP_CHUNK_SIZE):
+            chunk = blobs[i:i + LOOKUP_CHUNK_SIZE]
+            referenced = {
+                blob for (blob,) in
+                db.session.query(Video.local_pic).filter(Video.local_pic.in_(chunk)).distinct()
+            }
+            orphans = [blob for blob in chunk if blob not in referenced]
+            for blob in orphans:
+                try:
+                    os.remove(self.full_path(blob))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f'删除图片文件失败: {blob}, 错误: {str(e)}')
+                self.remove_variants(blob)
+            if orphans:
+                PosterUrl.query.filter(PosterUrl.blob.in_(orphans)).delete(synchronize_session=False)
+                db.session.commit()
+        return removed
+
+
+def save_url_mappings(rows):
+    """
+    写入URL映射，已存在的URL更新为新的文件（不提交，由调用方统一提交）
+
+    Args:
+        rows: [{'url_hash', 'url', 'blob', 'size'}, ...]
+    """
+    rows = list({row['url_hash']: row for row in rows}.values())
+    table = PosterUrl.__table__
+    for i in range(0, len(rows), LOOKUP_CHUNK_SIZE):
+        chunk = rows[i:i + LOOKUP_CHUNK_SIZE]
+        existing = {
+            url_hash for (url_hash,) in
+            db.session.query(PosterUrl.url_hash).filter(PosterUrl.url_hash.in_([row['url_hash'] for row in chunk]))
+        }
+        updates = [
+            {'_hash': row['url_hash'], '_blob': row['blob'], '_size': row['size']}
+            for row in chunk if row['url_hash'] in existing
+        ]
+        inserts = [row for row in chunk if row['url_hash'] not in existing]
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.url_hash == bindparam('_hash')).values(
+                    blob=bindparam('_blob'), size=bindparam('_size')
+                ),
+                updates
+            )
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+
+
+def load_url_mappings(url_hashes):
+    """
+    批量查询URL映射（需在应用上下文中调用）
+
+    Returns:
+        dict: {url_hash: blob}
+    """
+    found = {}
+    url_hashes = list(url_hashes)
+    for i in range(0, len(url_hashes), LOOKUP_CHUNK_SIZE):
+        chunk = url_hashes[i:i + LOOKUP_CHUNK_SIZE]
+        found.update(db.session.query(PosterUrl.url_hash, PosterUrl.blob).filter(PosterUrl.url_hash.in_(chunk)))
+    return found
+
+
+def migrate_flat(root, batch_size=500):
+    """
+    把平铺目录中的封面转换为内容寻址存储（需在应用上下文中调用，可重复执行）
+
+    按视频的 local_pic 找到旧文件放入分片目录并更新 local_pic；
+    旧文件名包含URL的MD5前8位，与当前 vod_pic 一致时同时写入URL映射；
+    文件已丢失的视频清除本地化标记。没有视频引用的平铺文件保留不动，只统计数量
+
+    旧文件先硬链接（或复制）到分片目录，所有批次提交后才删除：中途中断时视频仍指向存在的旧文件，
+    重新执行时再次导入（内容相同，不会重复保存），不会误清除本地化标记；
+    中断前已提交的批次留下的旧文件内容已在存储中，重新执行时一并删除
+
+    Args:
+        root: 海报根目录
+        batch_size: 每个事务处理的视频数
+
+    Returns:
+        dict: {'migrated', 'deduped', 'missing', 'mapped', 'unreferenced'}
+
+    Raises:
+        FileNotFoundError: 海报根目录不存在（目录错误时所有视频都会被当作文件丢失而清除本地化标记）
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f'封面目录不存在: {root}')
+    store = PosterStore(root)
+    table = Video.__table__
+    stats = {'migrated': 0, 'deduped': 0, 'missing': 0, 'mapped': 0, 'unreferenced': 0}
+    moved = {}  # {旧文件名: (相对路径, 文件大小)}，多个视频引用同一文件时复用
+    last_id = 0
+    while True:
+        rows = db.session.query(Video.id, Video.local_pic, Video.vod_pic).filter(
+            Video.id > last_id,
+            Video.local_pic != '',
+            ~Video.local_pic.contains('/')
+        ).order_by(Video.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        updates = []
+        resets = []
+        mappings = []
+        for video_id, local_pic, vod_pic in rows:
+            if local_pic not in moved:
+                path = os.path.join(root, local_pic)
+                if not os.path.isfile(path):
+                    resets.append({'_id': video_id})
+                    continue
+                before = store.deduped
+                moved[local_pic] = store.import_file(path, keep=True)
+                stats['deduped'] += store.deduped - before
+            blob, size = moved[local_pic]
+            updates.append({'_id': video_id, '_pic': blob})
+            if vod_pic and hashlib.md5(vod_pic.encode()).hexdigest()[:8] in local_pic:
+                mappings.append({'url_hash': PosterUrl.hash_url(vod_pic), 'url': vod_pic, 'blob': blob, 'size': size})
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('_id')).values(local_pic=bindparam('_pic')),
+                updates
+            )
+        if resets:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('_id')).values(local_pic='', is_localized=False),
+                resets
+            )
+        save_url_mappings(mappings)
+        db.session.commit()
+        stats['migrated'] += len(updates)
+        stats['missing'] += len(resets)
+        stats['mapped'] += len(mappings)
+        print(f"  已迁移: {stats['migrated']}，文件丢失: {stats['missing']}")
+
+    # 所有视频都已指向分片目录，删除已导入的旧文件
+    for local_pic in moved:
+        try:
+            os.remove(os.path.join(root, local_pic))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'删除旧封面文件失败: {local_pic}, 错误: {str(e)}')
+
+    # 没有视频引用的平铺文件：内容已在存储中的（上次迁移中断前已导入）直接删除，其余只统计数量
+    for entry in os.scandir(root):
+        if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        if store.find_imported(entry.path):
+            os.remove(entry.path)
+        else:
+            stats['unreferenced'] += 1
+    return stats
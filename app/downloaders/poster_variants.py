@@ -0,0 +1,290 @@
+"""
+封面派生图
+
+原图保存后在进程池中按规格缩放，每个规格输出 AVIF、WebP 和 JPEG：
+<海报目录>/ab/cd/<sha1>.<规格>.<格式>
+各规格的实际宽度写入 <sha1>.variants.json（最后写入，存在即表示派生图已全部生成）
+- 派生图路径由原图路径决定，原图按内容寻址，派生图生成后不再变化
+- Pillow 为可选依赖，未安装时不生成派生图，页面继续使用原图
+- Pillow 未包含 AVIF 编码器时只生成 WebP 和 JPEG
+- 前台 /poster/<规格>/<原图路径> 按 Accept 请求头返回浏览器支持的最佳格式
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+# 规格名 -> 宽度（像素），高度按原图比例；原图更小时不放大
+VARIANTS = {
+    'grid': 320,      # 首页、分类页的卡片
+    'detail': 640,    # 详情页，或卡片在高清屏上显示
+    'retina': 1280,   # 详情页在高清屏上显示
+}
+
+# 按优先级排列的输出格式：(扩展名, MIME类型, Pillow格式名)
+FORMATS = (
+    ('avif', 'image/avif', 'AVIF'),
+    ('webp', 'image/webp', 'WEBP'),
+    ('jpg', 'image/jpeg', 'JPEG'),
+)
+
+# 各格式的额外保存参数
+SAVE_OPTIONS = {
+    'AVIF': {},
+    'WEBP': {'method': 4},
+    'JPEG': {'optimize': True, 'progressive': True},
+}
+
+
+def is_available():
+    """是否可以生成派生图（已安装 Pillow）"""
+    return Image is not None
+
+
+def supported_formats():
+    """
+    当前 Pillow 能写出的格式（JPEG 总是最后一个，作为兜底）
+
+    Returns:
+        list: [(扩展名, MIME类型, Pillow格式名), ...]
+    """
+    if Image is None:
+        return []
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[2] in Image.SAVE]
+
+
+def variant_path(root, blob, variant, ext):
+    """派生图的文件路径"""
+    base = os.path.splitext(blob)[0]
+    return os.path.join(root, *f'{base}.{variant}.{ext}'.split('/'))
+
+
+def manifest_path(root, blob):
+    """记录各规格实际宽度的文件路径"""
+    base = os.path.splitext(blob)[0]
+    return os.path.join(root, *f'{base}.variants.json'.split('/'))
+
+
+def variant_files(root, blob):
+    """原图所有可能存在的派生图路径（删除原图时一并删除）"""
+    return [
+        variant_path(root, blob, variant, ext)
+        for variant in VARIANTS
+        for ext, _, _ in FORMATS
+    ] + [manifest_path(root, blob)]
+
+
+def has_variants(root, blob):
+    """派生图是否已全部生成"""
+    return os.path.exists(manifest_path(root, blob))
+
+
+def read_variants(root, blob):
+    """
+    读取各规格派生图的实际宽度
+
+    Returns:
+        dict: {规格名: 宽度}，派生图未生成时为None
+    """
+    try:
+        with open(manifest_path(root, blob), encoding='utf-8') as f:
+            widths = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return {variant: int(widths[variant]) for variant in VARIANTS if variant in widths}
+
+
+def build_srcset(url_prefix, blob, widths):
+    """
+    生成 srcset
+
+    原图较窄时多个规格的宽度相同（不放大），只保留最小规格，宽度描述符使用实际宽度
+
+    Args:
+        url_prefix: 派生图地址前缀，如 /poster
+        blob: 原图相对路径
+        widths: read_variants() 的结果
+
+    Returns:
+        str: 如 "/poster/grid/ab/cd/...jpg 320w, /poster/detail/ab/cd/...jpg 640w"
+    """
+    seen = set()
+    candidates = []
+    for variant in VARIANTS:
+        width = widths.get(variant)
+        if not width or width in seen:
+            continue
+        seen.add(width)
+        candidates.append(f'{url_prefix}/{variant}/{blob} {width}w')
+    return ', '.join(candidates)
+
+
+def pick_formats(accepted):
+    """
+    按 Accept 请求头选择格式
+
+    只有明确列出的类型才算支持（image/* 和 */* 不代表浏览器能解码 AVIF）
+
+    Args:
+        accepted: 请求头中q值大于0的MIME类型集合
+
+    Returns:
+        list: 按优先级排列的扩展名，总是以 jpg 结尾
+    """
+    return [ext for ext, mimetype, _ in FORMATS if ext == 'jpg' or mimetype in accepted]
+
+
+def render_variants(root, blob, quality=80):
+    """
+    生成一张原图的全部派生图（在子进程中执行）
+
+    Args:
+        root: 海报根目录
+        blob: 原图相对路径
+        quality: 有损格式的压缩质量
+
+    Returns:
+        int: 写入的文件数，已存在时为0
+    """
+    if has_variants(root, blob):
+        return 0
+    formats = supported_formats()
+    written = 0
+    widths = {}
+    with Image.open(os.path.join(root, *blob.split('/'))) as source:
+        # 动图只取第一帧；按EXIF方向旋转
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P', 'PA') else 'RGB')
+        for variant, width in VARIANTS.items():
+            resized = image.copy()
+            if resized.width > width:
+                resized = resized.resize((width, max(1, round(resized.height * width / resized.width))), Image.LANCZOS)
+            for ext, _, pil_format in formats:
+                frame = resized
+                if pil_format == 'JPEG' and frame.mode == 'RGBA':
+                    # JPEG不支持透明，铺白色底
+                    frame = Image.new('RGB', resized.size, (255, 255, 255))
+                    frame.paste(resized, mask=resized.getchannel('A'))
+                path = variant_path(root, blob, variant, ext)
+                tmp_path = f'{path}.{os.getpid()}.part'
+                try:
+                    frame.save(tmp_path, format=pil_format, quality=quality, **SAVE_OPTIONS[pil_format])
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                written += 1
+            widths[variant] = resized.width
+    # 宽度清单最后写入，作为派生图已全部生成的标记
+    path = manifest_path(root, blob)
+    tmp_path = f'{path}.{os.getpid()}.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(widths, f)
+    os.replace(tmp_path, path)
+    return written
+
+
+class VariantBuilder:
+    """
+    派生图生成进程池
+
+    - submit(): 原图保存后提交生成任务，立即返回，下载线程不等待
+    - close(): 等待（或取消）剩余任务并关闭进程池
+    - get_stats(): 排队中、已生成、失败的数量
+
+    缩放和编码是CPU密集型操作，放在子进程中执行，不占用下载线程和GIL
+    """
+
+    def __init__(self, root, workers=2, quality=80):
+        """
+        Args:
+            root: 海报根目录
+            workers: 进程数，0 表示不生成派生图
+            quality: 有损格式的压缩质量
+        """
+        self.root = root
+        self.workers = max(0, int(workers))
+        self.quality = quality
+        self.enabled = is_available() and self.workers > 0
+        self.executor = None
+        self.submitted = set()
+        self.pending = 0
+        self.built = 0
+        self.failed = 0
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """启动进程池（未安装 Pillow 或进程数为0时不启动）"""
+        if not self.enabled or self.executor is not None:
+            return
+        # 下载任务运行在多线程进程中，使用 spawn 避免子进程继承其他线程持有的锁
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def submit(self, blob):
+        """
+        提交一张原图的派生图生成任务
+
+        同一原图在一个任务中只提交一次，派生图已存在时不提交
+
+        Args:
+            blob: 原图相对路径
+        """
+        if self.executor is None or not blob:
+            return
+        with self.lock:
+            if blob in self.submitted:
+                return
+            self.submitted.add(blob)
+        if has_variants(self.root, blob):
+            return
+        with self.lock:
+            self.pending += 1
+        future = self.executor.submit(render_variants, self.root, blob, self.quality)
+        future.add_done_callback(lambda f, blob=blob: self._done(f, blob))
+
+    def _done(self, future, blob):
+        """任务结束回调"""
+        with self.lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                self.failed += 1
+                self.errors.append(f'生成派生图失败: {blob}, 错误: {str(error)}')
+            elif future.result():
+                self.built += 1
+
+    def close(self, cancel=False):
+        """
+        关闭进程池
+
+        Args:
+            cancel: 是否取消尚未开始的任务（停止下载时）
+        """
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=True, cancel_futures=cancel)
+        self.executor = None
+
+    def get_stats(self):
+        """获取派生图统计"""
+        with self.lock:
+            return {
+                'variants_enabled': self.enabled,
+                'variants_pending': self.pending,
+                'variants_built': self.built,
+                'variants_failed': self.failed,
+            }
@@ -0,0 +1,177 @@
+"""
+图片本地化结果写入线程
+
+下载线程只负责下载文件，把本地化结果和失败日志放入队列；
+由唯一的写入线程每 flush_size 条或每 flush_interval 秒合并为一次批量 UPDATE 和一次提交，
+下载线程之间不再争抢数据库锁
+"""
+
+import queue
+import threading
+import time
+from sqlalchemy import bindparam
+from app import db
+from app.models.video import Video
+from app.models.system_log import SystemLog
+from app.downloaders.poster_store import save_url_mappings
+
+
+class LocalizeWriter:
+    """
+    单写入线程
+
+    - mark_localized(): 图片已保存，设置 local_pic 和 is_localized
+    - reset(): 本地文件已丢失，清除本地化标记
+    - map_url(): 图片URL到内容寻址文件的映射，相同URL以后不再下载
+    - log(): 下载失败等系统日志，与本地化结果在同一事务内写入
+    - get_stats(): 队列深度、批次数和最近一批的写入耗时
+    """
+
+    # 结束信号
+    _SENTINEL = object()
+
+    def __init__(self, app, flush_size=200, flush_interval=0.5):
+        """
+        初始化写入线程
+
+        Args:
+            app: Flask应用实例
+            flush_size: 每批最多写入的结果数
+            flush_interval: 第一条结果到达后最多等待的秒数
+        """
+        self.app = app
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = float(flush_interval)
+        self.queue = queue.Queue()
+        self.thread = None
+
+        # 统计信息
+        self.batches = 0
+        self.rows_written = 0
+        self.failed_rows = 0
+        self.last_batch_seconds = 0.0
+        self.errors = []
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        """启动写入线程"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def mark_localized(self, video_id, blob):
+        """记录图片本地化成功"""
+        self.queue.put(('localized', video_id, blob))
+
+    def reset(self, video_id):
+        """记录本地图片已丢失，清除本地化标记"""
+        self.queue.put(('reset', video_id, None))
+
+    def map_url(self, url_hash, url, blob, size):
+        """记录图片URL已下载到的存储文件"""
+        self.queue.put(('url', url_hash, (url, blob, size)))
+
+    def log(self, level, message, details=None):
+        """记录一条下载日志"""
+        self.queue.put(('log', level, (message, details)))
+
+    def close(self):
+        """发送结束信号并等待队列写完"""
+        if self.thread is None:
+            return
+        self.queue.put(self._SENTINEL)
+        self.thread.join()
+        self.thread = None
+
+    def get_stats(self):
+        """获取写入统计"""
+        with self.stats_lock:
+            return {
+                'writer_queue': self.queue.qsize(),
+                'writer_batches': self.batches,
+                'writer_rows': self.rows_written,
+                'writer_failed_rows': self.failed_rows,
+                'writer_batch_seconds': round(self.last_batch_seconds, 3),
+            }
+
+    def _run(self):
+        """写入线程主循环：攒够一批或等待超时后写入"""
+        with self.app.app_context():
+            pending = []
+            deadline = None
+            while True:
+                timeout = max(0.0, deadline - time.time()) if pending else None
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is self._SENTINEL:
+                    self._flush(pending)
+                    return
+                if item is not None:
+                    if not pending:
+                        deadline = time.time() + self.flush_interval
+                    pending.append(item)
+                if pending and (len(pending) >= self.flush_size or time.time() >= deadline):
+                    self._flush(pending)
+                    pending = []
+
+    def _flush(self, items):
+        """
+        在一个事务内写入一批结果
+
+        同一视频的 reset 总是先于 mark_localized 提交到队列，
+        所以先执行清除、再执行本地化，结果与逐条提交一致
+        """
+        if not items:
+            return
+        started = time.time()
+        resets = []
+        localized = []
+        mappings = []
+        logs = []
+        for kind, key, value in items:
+            if kind == 'localized':
+                localized.append({'_id': key, '_pic': value})
+            elif kind == 'reset':
+                resets.append({'_id': key})
+            elif kind == 'url':
+                url, blob, size = value
+                mappings.append({'url_hash': key, 'url': url, 'blob': blob, 'size': size})
+            else:
+                message, details = value
+                logs.append(SystemLog(
+                    log_type='download',
+                    level=key,
+                    module='ImageDownloader',
+                    message=message,
+                    details=details
+                ))
+
+        table = Video.__table__
+        try:
+            if resets:
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('_id')).values(local_pic='', is_localized=False),
+                    resets
+                )
+            if localized:
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('_id')).values(
+                        local_pic=bindparam('_pic'), is_localized=True
+                    ),
+                    localized
+                )
+            save_url_mappings(mappings)
+            db.session.add_all(logs)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"批量写入本地化结果失败: {str(e)}")
+            with self.stats_lock:
+                self.failed_rows += len(items)
+                self.errors.append(f"批量写入本地化结果失败 ({len(items)} 条): {str(e)}")
+            return
+        with self.stats_lock:
+            self.batches += 1
+            self.rows_written += len(items)
+            self.last_batch_seconds = time.time() - started
@@ -1,4 +1,5 @@
 from app.models.video import Video
 from app.models.system_log import SystemLog
+from app.models.poster_url import PosterUrl
 
-__all__ = ['Video', 'SystemLog']
+__all__ = ['Video', 'SystemLog', 'PosterUrl']
@@ -30,10 +30,101 @@ class CollectSource(db.Model):
     # 附加信息
     note = db.Column(db.Text, default='', comment='备注说明信息')
     
+    # 增量采集高水位
+    last_collect_at = db.Column(db.DateTime, nullable=True, comment='最近一次成功采集的开始时间')
+    max_vod_time = db.Column(db.String(50), default='', comment='已采集到的最大vod_time')
+    
+    # 按主机限速（同一主机的所有采集任务共用）
+    rate_limit = db.Column(db.Float, default=0, comment='每秒最多请求数，0表示不限速')
+    rate_burst = db.Column(db.Integer, default=0, comment='允许的瞬时突发请求数，0表示与每秒请求数相同')
+    
+    # 镜像接口地址（每行一个），与主接口地址一起按延迟和健康状况选择
+    mirrors = db.Column(db.Text, default='', comment='镜像接口地址，每行一个')
+    
+    # 自适应并发
+    learned_concurrency = db.Column(db.Integer, default=0, comment='自适应并发学到的并发数，0表示未学习')
+    
+    # 熔断与健康状况（连续失败达到阈值后熔断，冷却后放行一个探测请求）
+    circuit_state = db.Column(db.String(20), default='closed', comment='熔断状态：closed | open | half_open')
+    circuit_opened_at = db.Column(db.DateTime, nullable=True, comment='最近一次熔断的时间')
+    consecutive_failures = db.Column(db.Integer, default=0, comment='连续失败请求数')
+    health_score = db.Column(db.Float, default=1.0, comment='健康分（请求成功率的加权平均，0~1）')
+    last_failure = db.Column(db.String(500), default='', comment='最近一次失败原因')
+    last_failure_at = db.Column(db.DateTime, nullable=True, comment='最近一次失败时间')
+    
     # 时间戳
     created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='最后更新时间')
     
+    def get_incremental_hours(self, now=None, margin=1):
+        """
+        根据高水位计算增量采集的 h 参数（最近N小时）
+        
+        Args:
+            now: 当前时间，默认 datetime.now()
+            margin: 额外多取的小时数，覆盖采集期间的更新和时钟误差
+        
+        Returns:
+            int: 小时数；没有高水位时返回None，表示需要全量采集
+        """
+        since = self.last_collect_at
+        if since is None and self.max_vod_time:
+            try:
+                since = datetime.strptime(self.max_vod_time[:19], '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                since = None
+        if since is None:
+            return None
+        seconds = ((now or datetime.now()) - since).total_seconds()
+        return max(1, int(-(-seconds // 3600)) + margin)
+    
+    def is_circuit_open(self, cooldown, now=None):
+        """
+        是否处于熔断冷却期内（按已保存的熔断状态判断）
+        
+        Args:
+            cooldown: 冷却时间（秒）
+            now: 当前时间，默认 datetime.now()
+        
+        Returns:
+            bool: 熔断中返回True
+        """
+        if self.circuit_state != 'open' or self.circuit_opened_at is None:
+            return False
+        return ((now or datetime.now()) - self.circuit_opened_at).total_seconds() < cooldown
+    
+    def reset_circuit(self):
+        """重置熔断状态（调用方负责提交）"""
+        self.circuit_state = 'closed'
+        self.circuit_opened_at = None
+        self.consecutive_failures = 0
+    
+    def get_mirror_urls(self):
+        """
+        获取全部接口地址（主接口地址在前，去掉末尾的/并去重）
+        
+        Returns:
+            list: 接口地址列表
+        """
+        urls = []
+        for url in [self.url] + (self.mirrors or '').splitlines():
+            url = url.strip().rstrip('/')
+            if url and url not in urls:
+                urls.append(url)
+        return urls
+    
+    def update_high_water_mark(self, started_at, max_vod_time=''):
+        """
+        记录一次成功采集的高水位（调用方负责提交）
+        
+        Args:
+            started_at: 本次采集的开始时间
+            max_vod_time: 本次采集看到的最大vod_time
+        """
+        self.last_collect_at = started_at
+        if max_vod_time and max_vod_time > (self.max_vod_time or ''):
+            self.max_vod_time = max_vod_time
+    
     def __repr__(self):
         """字符串表示形式"""
         return f'<CollectSource {self.name}>'
@@ -0,0 +1,123 @@
+"""
+采集任务数据模型
+
+持久化采集任务的参数和已完成页码，
+进程重启（如gunicorn回收worker、发布）后可以从断点继续采集
+"""
+
+import json
+from app import db
+from datetime import datetime
+
+class CollectTask(db.Model):
+    """
+    采集任务模型
+
+    任务ID即主键ID，与采集管理器中的任务ID一致
+    已完成页码以区间形式保存，如 "1-120,125,130-140"
+    """
+    __tablename__ = 'collect_tasks'
+
+    # 基本字段
+    id = db.Column(db.Integer, primary_key=True, comment='任务ID')
+    source_id = db.Column(db.Integer, nullable=True, comment='采集源ID')
+    url = db.Column(db.String(500), nullable=False, comment='采集接口URL')
+    params = db.Column(db.Text, default='{}', comment='采集参数JSON')
+    max_workers = db.Column(db.Integer, default=3, comment='并发线程数')
+    timeout = db.Column(db.Integer, default=30, comment='超时时间(秒)')
+    max_retries = db.Column(db.Integer, default=3, comment='最大重试次数')
+
+    # 任务状态：running | finished | stopped | failed
+    status = db.Column(db.String(20), default='running', comment='任务状态')
+
+    # 断点信息
+    total_pages = db.Column(db.Integer, default=0, comment='总页数')
+    completed_pages = db.Column(db.Text, default='', comment='已完成页码区间')
+    success_count = db.Column(db.Integer, default=0, comment='新增数')
+    skip_count = db.Column(db.Integer, default=0, comment='跳过数')
+    failed_count = db.Column(db.Integer, default=0, comment='失败数')
+
+    # 时间戳
+    started_at = db.Column(db.DateTime, nullable=True, comment='首次开始采集时间（增量高水位使用）')
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='最后更新时间')
+
+    def get_params(self):
+        """获取采集参数字典"""
+        try:
+            return json.loads(self.params or '{}')
+        except ValueError:
+            return {}
+
+    def set_params(self, params):
+        """保存采集参数字典"""
+        self.params = json.dumps(params, ensure_ascii=False)
+
+    def get_completed_pages(self):
+        """
+        解析已完成页码
+
+        Returns:
+            set: 页码集合
+        """
+        pages = set()
+        for part in (self.completed_pages or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                start, end = part.split('-', 1)
+                pages.update(range(int(start), int(end) + 1))
+            else:
+                pages.add(int(part))
+        return pages
+
+    def set_completed_pages(self, pages):
+        """
+        以区间形式保存已完成页码
+
+        Args:
+            pages: 页码集合
+        """
+        ranges = []
+        for page in sorted(pages):
+            if ranges and page == ranges[-1][1] + 1:
+                ranges[-1][1] = page
+            else:
+                ranges.append([page, page])
+        self.completed_pages = ','.join(
+            str(start) if start == end else f'{start}-{end}' for start, end in ranges
+        )
+
+    def get_resume_page(self):
+        """
+        断点游标：起始页之后第一个未完成的页码
+
+        Returns:
+            int: 页码
+        """
+        page = int(self.get_params().get('start') or 1)
+        completed = self.get_completed_pages()
+        while page in completed:
+            page += 1
+        return page
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'source_id': self.source_id,
+            'url': self.url,
+            'status': self.status,
+            'total_pages': self.total_pages,
+            'completed_count': len(self.get_completed_pages()),
+            'resume_page': self.get_resume_page(),
+            'success_count': self.success_count,
+            'skip_count': self.skip_count,
+            'failed_count': self.failed_count,
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else ''
+        }
+
+    def __repr__(self):
+        """字符串表示形式"""
+        return f'<CollectTask {self.id} {self.status}>'
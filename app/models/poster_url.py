@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+封面URL映射模型
+记录每个图片URL已下载到的内容寻址文件，相同URL只下载一次
+"""
+
+import hashlib
+from datetime import datetime
+from app import db
+
+
+class PosterUrl(db.Model):
+    """
+    封面URL映射表
+    url_hash -> blob（海报目录下按内容摘要分片存放的相对路径）
+    """
+    __tablename__ = 'poster_urls'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+
+    # URL的SHA1，URL可能超过索引长度限制，按摘要查找
+    url_hash = db.Column(db.String(40), nullable=False, unique=True, comment='URL摘要')
+
+    url = db.Column(db.Text, nullable=False, comment='图片URL')
+
+    # 相对海报目录的路径，如 ab/cd/abcd...ef.jpg；多个URL可以指向同一文件
+    blob = db.Column(db.String(200), nullable=False, index=True, comment='内容寻址文件路径')
+
+    size = db.Column(db.Integer, default=0, comment='文件大小（字节）')
+
+    created_at = db.Column(db.DateTime, default=datetime.now, comment='创建时间')
+
+    @staticmethod
+    def hash_url(url):
+        """计算URL摘要"""
+        return hashlib.sha1((url or '').encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        """对象字符串表示"""
+        return f'<PosterUrl {self.url_hash[:8]} -> {self.blob}>'
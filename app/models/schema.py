@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+数据库结构补齐
+
+db.create_all() 只创建不存在的表，不会为已存在的表添加新字段和索引。
+本模块对比模型定义与数据库中的实际结构：
+- create_indexes(): 补建索引（只处理字段已存在的索引，应用启动时调用）
+- missing_columns(): 列出模型中有、数据库中没有的字段
+- upgrade_schema(): 用 ALTER TABLE ... ADD COLUMN 补齐字段并补建索引（db_manager.py upgrade 调用）
+"""
+
+from sqlalchemy import inspect, literal
+from app import db
+
+
+def _existing_columns(inspector, table):
+    """数据库中已有的字段名"""
+    return {column['name'] for column in inspector.get_columns(table.name)}
+
+
+def _existing_indexes(inspector, table):
+    """数据库中已有的索引名和唯一约束名"""
+    names = {index['name'] for index in inspector.get_indexes(table.name)}
+    names.update(constraint['name'] for constraint in inspector.get_unique_constraints(table.name))
+    return names
+
+
+def _table_indexes(table):
+    """
+    模型定义的索引，命名的多字段唯一约束按同名唯一索引处理
+
+    SQLite 不支持 ALTER TABLE ADD CONSTRAINT，唯一索引的约束效果相同
+
+    Returns:
+        list: [(索引名, 字段名列表, 是否唯一), ...]
+    """
+    indexes = [
+        (index.name, [column.name for column in index.columns], bool(index.unique))
+        for index in table.indexes
+    ]
+    for constraint in table.constraints:
+        if isinstance(constraint, db.UniqueConstraint) and constraint.name and len(constraint.columns) > 1:
+            indexes.append((constraint.name, [column.name for column in constraint.columns], True))
+    return indexes
+
+
+def missing_columns(engine=None):
+    """
+    列出模型中有、数据库中没有的字段（表不存在时不列出，由 create_all 创建）
+
+    Returns:
+        list: [(表名, 字段名), ...]
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = _existing_columns(inspector, table)
+        missing.extend((table.name, column.name) for column in table.columns if column.name not in existing)
+    return missing
+
+
+def create_indexes(engine=None):
+    """
+    补建模型中定义、数据库中缺少的索引
+
+    索引涉及的字段尚未添加时跳过，待执行 db_manager.py upgrade 补齐字段后再创建
+
+    Returns:
+        tuple: (新建的索引名列表, 因缺少字段跳过的索引名列表)
+    """
+    engine = engine or db.engine
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    tables = set(inspector.get_table_names())
+    created = []
+    skipped = []
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            columns = _existing_columns(inspector, table)
+            indexes = _existing_indexes(inspector, table)
+            for name, column_names, unique in _table_indexes(table):
+                if name in indexes:
+                    continue
+                if any(column_name not in columns for column_name in column_names):
+                    skipped.append(name)
+                    continue
+                conn.exec_driver_sql(
+                    f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {preparer.quote(name)} '
+                    f'ON {preparer.quote(table.name)} ({", ".join(preparer.quote(c) for c in column_names)})'
+                )
+                created.append(name)
+    return created, skipped
+
+
+def _column_ddl(column, dialect):
+    """
+    ADD COLUMN 的字段定义
+
+    不加 NOT NULL（已有行没有值）；默认值为常量时写入 DEFAULT，已有行取默认值
+    """
+    preparer = dialect.identifier_preparer
+    ddl = f'{preparer.quote(column.name)} {column.type.compile(dialect=dialect)}'
+    default = column.default
+    if default is not None and default.is_scalar and default.arg is not None:
+        value = literal(default.arg, type_=column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f' DEFAULT {value}'
+    return ddl
+
+
+def upgrade_schema(engine=None):
+    """
+    为已存在的表补齐新增字段，并创建新表和缺少的索引（可重复执行）
+
+    Returns:
+        dict: {'columns': [(表名, 字段名), ...], 'indexes': [...], 'skipped': [...]}
+    """
+    engine = engine or db.engine
+    db.create_all()
+    missing = missing_columns(engine)
+    if missing:
+        preparer = engine.dialect.identifier_preparer
+        with engine.begin() as conn:
+            for table_name, column_name in missing:
+                column = db.metadata.tables[table_name].columns[column_name]
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {_column_ddl(column, engine.dialect)}'
+                )
+    created, skipped = create_indexes(engine)
+    return {'columns': missing, 'indexes': created, 'skipped': skipped}
@@ -5,8 +5,14 @@
 支持完整的视频信息存储和管理
 """
 
+import re
+import unicodedata
 from app import db
 from datetime import datetime
+from sqlalchemy.orm import validates
+
+# 标准化名称时去掉的空白、标点和符号
+TITLE_KEY_STRIP = re.compile(r'[\W_]+')
 
 class Video(db.Model):
     """
@@ -20,6 +26,10 @@ class Video(db.Model):
     """
     
     __tablename__ = 'videos'
+    __table_args__ = (
+        # 采集身份：同一采集源的同一远程视频只对应一条记录
+        db.UniqueConstraint('source_id', 'remote_vod_id', name='uq_videos_source_remote'),
+    )
     
     # 主键和唯一标识
     id = db.Column(db.Integer, primary_key=True, comment='自增主键')
@@ -27,7 +37,7 @@ class Video(db.Model):
     type_id = db.Column(db.Integer, default=0)
     type_id_1 = db.Column(db.Integer, default=0)
     group_id = db.Column(db.Integer, default=0)
-    vod_name = db.Column(db.String(200), nullable=False)
+    vod_name = db.Column(db.String(200), nullable=False, index=True, comment='视频名称，采集去重键')
     vod_sub = db.Column(db.String(200), default='')
     vod_en = db.Column(db.String(200), default='')
     vod_status = db.Column(db.Integer, default=1)
@@ -108,11 +118,42 @@ class Video(db.Model):
     
     # 图片本地化字段
     local_pic = db.Column(db.String(200), default='', comment='本地化图片文件名')
-    is_localized = db.Column(db.Boolean, default=False, comment='图片是否已本地化')
+    is_localized = db.Column(db.Boolean, default=False, index=True, comment='图片是否已本地化')
+    
+    # 采集变更检测字段
+    content_hash = db.Column(db.String(40), default='', comment='最近一次采集数据的摘要，未变化时跳过更新')
+    
+    # 采集身份字段
+    source_id = db.Column(db.Integer, nullable=True, comment='首次采集的采集源ID，与remote_vod_id组成采集身份')
+    remote_vod_id = db.Column(db.String(64), nullable=True, comment='视频在该采集源中的ID')
+    title_key = db.Column(db.String(200), default='', index=True, comment='标准化名称，跨采集源去重键')
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @staticmethod
+    def make_title_key(name):
+        """
+        生成标准化名称（跨采集源去重键）
+        
+        全角转半角、忽略大小写，并去掉空白和标点，
+        使"速度与激情 8"、"速度与激情8"、"速度与激情８"得到相同的键
+        
+        Args:
+            name: 视频名称
+            
+        Returns:
+            str: 标准化名称
+        """
+        key = unicodedata.normalize('NFKC', name or '').casefold()
+        return (TITLE_KEY_STRIP.sub('', key) or key.strip())[:200]
+    
+    @validates('vod_name')
+    def _sync_title_key(self, key, value):
+        """通过ORM设置名称时同步标准化名称"""
+        self.title_key = self.make_title_key(value)
+        return value
+    
     def __repr__(self):
         """
         模型的字符串表示形式
@@ -122,17 +163,49 @@ class Video(db.Model):
         """
         return f'<Video {self.vod_name}>'
     
-    def get_picture_url(self):
+    def get_picture_url(self, variant=None):
         """
         获取图片URL，优先返回本地化图片
         
+        Args:
+            variant: 派生图规格（grid/detail/retina），派生图已生成时返回按浏览器选择格式的派生图地址
+        
         Returns:
             str: 图片URL路径
         """
         if self.is_localized and self.local_pic:
+            if variant and self._read_picture_variants():
+                return f'/poster/{variant}/{self.local_pic}'
             return f'/static/uploads/posters/{self.local_pic}'
         return self.vod_pic or 'https://via.placeholder.com/300x400'
     
+    def _read_picture_variants(self):
+        """读取本地图片各规格派生图的实际宽度，未生成时为None（需在应用上下文中调用）"""
+        from app.downloaders.poster_store import poster_folder
+        from app.downloaders.poster_variants import read_variants
+        if not (self.is_localized and self.local_pic and '/' in self.local_pic):
+            return None
+        return read_variants(poster_folder(), self.local_pic)
+    
+    def get_picture_variants(self, variant='grid'):
+        """
+        获取本地图片派生图的 src 和 srcset（每张卡片只读取一次派生图信息）
+        
+        Args:
+            variant: src 使用的规格
+        
+        Returns:
+            dict: {'src': 派生图地址, 'srcset': 按实际宽度生成的srcset}，派生图未生成时为None
+        """
+        from app.downloaders.poster_variants import build_srcset
+        widths = self._read_picture_variants()
+        if not widths:
+            return None
+        return {
+            'src': f'/poster/{variant}/{self.local_pic}',
+            'srcset': build_srcset('/poster', self.local_pic, widths),
+        }
+    
     def delete_local_image(self):
         """
         删除本地化的图片文件
@@ -141,8 +214,16 @@ class Video(db.Model):
         """
         import os
         if self.is_localized and self.local_pic:
-            upload_folder = 'app/static/uploads/posters'
+            # 内容寻址存储中多个视频可能共用同一文件，还有其他视频引用时保留
+            if '/' in self.local_pic and Video.query.filter(
+                Video.local_pic == self.local_pic, Video.id != self.id
+            ).first() is not None:
+                return False
+            from app.downloaders.poster_store import PosterStore, poster_folder
+            upload_folder = poster_folder()
             file_path = os.path.join(upload_folder, self.local_pic)
+            if '/' in self.local_pic:
+                PosterStore(upload_folder).remove_variants(self.local_pic)
             if os.path.exists(file_path):
                 try:
                     os.remove(file_path)
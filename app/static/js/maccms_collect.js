@@ -228,6 +228,33 @@ document.getElementById('collectForm')?.addEventListener('submit', function(e) {
     });
 });
 
+// 启动多源采集（使用采集表单中的参数）
+function startCollectAll() {
+    const form = document.getElementById('collectForm');
+    const formData = new FormData(form);
+    formData.delete('source_id');
+    
+    fetch('/admin/collect/start_all', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage('多源采集任务已启动', 'success');
+            if (data.task_id) {
+                startStatusPolling(data.task_id);
+                addTaskCard(data.task_id);
+            }
+        } else {
+            showMessage('启动失败: ' + data.message, 'error');
+        }
+    })
+    .catch(error => {
+        showMessage('启动失败: ' + error, 'error');
+    });
+}
+
 // 停止采集任务
 function stopTask(taskId) {
     if (!confirm('确定要停止这个采集任务吗？')) {
@@ -251,6 +278,25 @@ function stopTask(taskId) {
     });
 }
 
+// 从断点继续任务
+function resumeTask(taskId) {
+    fetch(`/admin/collect/resume/${taskId}`, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showMessage(data.message, 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showMessage(data.message, 'error');
+        }
+    })
+    .catch(error => {
+        showMessage('继续失败: ' + error, 'error');
+    });
+}
+
 // 清理已完成任务
 function cleanupTasks() {
     if (!confirm('确定要清理所有已完成的任务吗？')) {
@@ -348,6 +394,19 @@ function updateTaskDisplay(taskId, status) {
     if (infoElement) {
         infoElement.textContent = `重复: ${status.consecutive_duplicates}/20`;
     }
+    
+    // 多源采集/分类分片：各分片的进度
+    if (status.shards) {
+        taskElement.querySelectorAll('.task-shard').forEach(el => el.remove());
+        status.shards.forEach(shard => {
+            const line = document.createElement('div');
+            line.className = 'task-info task-shard';
+            line.textContent = `${shard.name}: 第 ${shard.current_page}/${shard.total_pages || '?'} 页，` +
+                `成功 ${shard.success_count}，跳过 ${shard.skip_count}，失败 ${shard.failed_count}` +
+                (shard.is_running ? '' : '（已结束）');
+            taskElement.appendChild(line);
+        });
+    }
 }
 
 // 添加任务卡片
@@ -46,3 +46,25 @@ class Config:
     COLLECTOR_MAX_RETRIES = 3
     # 是否验证SSL证书，设为False避免证书错误
     COLLECTOR_VERIFY_SSL = False
+    # 采集源熔断：连续失败多少次后熔断该采集源
+    COLLECTOR_BREAKER_THRESHOLD = 10
+    # 熔断后多少秒放行一个探测请求（5分钟）
+    COLLECTOR_BREAKER_COOLDOWN = 300
+    # 原始响应暂存目录（勾选"暂存原始响应"时使用，可用 db_manager.py replay 离线入库）
+    COLLECTOR_SPOOL_DIR = 'instance/spool'
+    # 是否启用采集接口响应缓存（ETag/Last-Modified 条件请求、分类列表缓存）
+    COLLECTOR_HTTP_CACHE = True
+    # 响应缓存目录
+    COLLECTOR_HTTP_CACHE_DIR = 'instance/http_cache'
+    # 响应缓存大小上限（200MB），超过时淘汰最久未使用的缓存
+    COLLECTOR_HTTP_CACHE_SIZE = 200 * 1024 * 1024
+    # 分类列表（接口测试、获取分类）的缓存有效期（10分钟），0表示每次都请求
+    COLLECTOR_CATEGORY_CACHE_TTL = 600
+    
+    # 图片本地化配置
+    # 持续模式下两轮扫描之间的间隔（5分钟），新采集的视频在下一轮即可本地化
+    IMAGE_LOCALIZE_INTERVAL = 300
+    # 增量模式每次从数据库读取的视频数
+    IMAGE_LOCALIZE_CHUNK_SIZE = 500
+    # 生成封面派生图（多规格 AVIF/WebP/JPEG）的进程数，0表示不生成；未安装 Pillow 时不生成
+    IMAGE_VARIANT_WORKERS = 2
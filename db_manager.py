@@ -7,13 +7,17 @@
 
 使用方法:
     python3 db_manager.py init          # 初始化数据库
-    python3 db_manager.py upgrade       # 升级数据库到最新版本
+    python3 db_manager.py upgrade       # 升级数据库到最新版本(补齐新增字段和索引，并补全title_key)
     python3 db_manager.py downgrade     # 降级数据库版本
     python3 db_manager.py reset         # 重置数据库(危险操作)
     python3 db_manager.py backup        # 备份数据库
     python3 db_manager.py restore FILE  # 从备份恢复数据库
     python3 db_manager.py admin         # 查看管理员配置
     python3 db_manager.py status        # 查看数据库状态
+    python3 db_manager.py replay PATH   # 把暂存的原始响应离线入库(文件或目录)
+    python3 db_manager.py replay PATH --no-update  # 离线入库时不更新已存在的视频
+    python3 db_manager.py rebuild-keys  # 补全视频的标准化名称(title_key)
+    python3 db_manager.py migrate-posters  # 把平铺的封面目录转换为内容寻址分片存储
 """
 
 import os
@@ -81,13 +85,33 @@ class DatabaseManager:
         
         with self.app.app_context():
             try:
-                print("[执行] 执行数据库升级...")
-                upgrade()
+                self._upgrade_schema()
+                if os.path.exists('migrations'):
+                    print("[执行] 执行数据库迁移脚本...")
+                    upgrade()
                 print("[完成] 数据库升级完成！")
-                self._print_database_info()
             except Exception as e:
                 print(f"[错误] 升级失败: {str(e)}")
                 sys.exit(1)
+        
+        # 新增的 title_key 字段需要为已有视频补全
+        self.rebuild_title_keys()
+        self._print_database_info()
+    
+    def _upgrade_schema(self):
+        """为已存在的表补齐新增字段和索引（需在应用上下文中调用）"""
+        from app.models.schema import upgrade_schema
+        
+        print("[执行] 补齐新增字段和索引...")
+        result = upgrade_schema(db.engine)
+        for table_name, column_name in result['columns']:
+            print(f"  添加字段: {table_name}.{column_name}")
+        for index_name in result['indexes']:
+            print(f"  创建索引: {index_name}")
+        for index_name in result['skipped']:
+            print(f"  [警告] 索引 {index_name} 的字段不存在，未创建")
+        if not result['columns'] and not result['indexes']:
+            print("  数据库结构已是最新")
     
     def downgrade_database(self):
         """降级数据库版本"""
@@ -274,6 +298,98 @@ class DatabaseManager:
     
 
     
+    def replay_spool(self, path, update_existing=True):
+        """把暂存的原始响应离线入库"""
+        print("=" * 60)
+        print("重放原始响应")
+        print("=" * 60)
+        
+        if not os.path.exists(path):
+            print(f"[错误] 暂存文件或目录不存在: {path}")
+            sys.exit(1)
+        
+        from app.collectors.page_spool import replay
+        
+        with self.app.app_context():
+            result = replay(path, update_existing=update_existing)
+        
+        print("\n重放结果:")
+        print("-" * 60)
+        print(f"  暂存文件: {result['files']} 个")
+        print(f"  页数: {result['pages']} (解析失败 {result['parse_failed']})")
+        print(f"  视频数: {result['videos']}")
+        print(f"  新增: {result.get('success_count', 0)}")
+        print(f"  跳过: {result.get('skip_count', 0)} (其中未变化 {result.get('unchanged_count', 0)})")
+        print(f"  失败: {result.get('failed_count', 0)}")
+        elapsed = result['elapsed']
+        speed = result['videos'] / elapsed if elapsed else 0
+        print(f"  耗时: {elapsed:.2f} 秒 ({speed:.0f} 个视频/秒)")
+        for error in result.get('errors', []):
+            print(f"  [错误] {error}")
+    
+    def rebuild_title_keys(self, batch_size=1000):
+        """为升级前入库的视频补全标准化名称(title_key)"""
+        print("=" * 60)
+        print("补全标准化名称")
+        print("=" * 60)
+        
+        from sqlalchemy import bindparam, or_
+        
+        table = Video.__table__
+        stmt = table.update().where(table.c.id == bindparam('_id')).values(title_key=bindparam('_key'))
+        
+        with self.app.app_context():
+            from app.models.schema import missing_columns
+            if missing_columns(db.engine):
+                self._upgrade_schema()
+            
+            total = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(Video.id, Video.vod_name).filter(
+                    Video.id > last_id,
+                    or_(Video.title_key.is_(None), Video.title_key == '')
+                ).order_by(Video.id).limit(batch_size).all()
+                if not rows:
+                    break
+                db.session.execute(stmt, [
+                    {'_id': video_id, '_key': Video.make_title_key(vod_name)} for video_id, vod_name in rows
+                ])
+                db.session.commit()
+                total += len(rows)
+                last_id = rows[-1][0]
+                print(f"  已处理: {total}")
+        
+        print(f"[成功] 共补全 {total} 个视频的标准化名称")
+    
+    def migrate_posters(self):
+        """把平铺的封面目录转换为内容寻址分片存储"""
+        print("=" * 60)
+        print("迁移封面存储")
+        print("=" * 60)
+        
+        from app.downloaders.poster_store import migrate_flat, poster_folder
+        
+        # 封面目录按应用的 static 目录计算，不依赖执行命令时的工作目录
+        folder = poster_folder(self.app)
+        print(f"封面目录: {folder}")
+        
+        try:
+            with self.app.app_context():
+                result = migrate_flat(folder)
+        except FileNotFoundError as e:
+            print(f"[错误] {str(e)}")
+            sys.exit(1)
+        
+        print("\n迁移结果:")
+        print("-" * 60)
+        print(f"  已迁移: {result['migrated']} 个视频")
+        print(f"  内容重复合并: {result['deduped']} 个文件")
+        print(f"  写入URL映射: {result['mapped']} 条")
+        print(f"  文件丢失(已清除本地化标记): {result['missing']} 个视频")
+        if result['unreferenced']:
+            print(f"  [提示] 目录中还有 {result['unreferenced']} 个没有视频引用的平铺文件，确认无用后可手动删除")
+    
     def _print_database_info(self):
         """打印数据库信息"""
         db_uri = self.app.config.get('SQLALCHEMY_DATABASE_URI', '')
@@ -337,6 +453,8 @@ def main():
         'backup': manager.backup_database,
         'admin': manager.show_admin_config,
         'status': manager.show_status,
+        'rebuild-keys': manager.rebuild_title_keys,
+        'migrate-posters': manager.migrate_posters,
     }
     
     if command == 'restore':
@@ -345,6 +463,12 @@ def main():
             print("用法: python3 db_manager.py restore <备份文件路径>")
             sys.exit(1)
         manager.restore_database(sys.argv[2])
+    elif command == 'replay':
+        if len(sys.argv) < 3:
+            print("[错误] 请指定暂存文件或目录")
+            print("用法: python3 db_manager.py replay <暂存文件或目录> [--no-update]")
+            sys.exit(1)
+        manager.replay_spool(sys.argv[2], update_existing='--no-update' not in sys.argv[3:])
     elif command in commands:
         commands[command]()
     else: